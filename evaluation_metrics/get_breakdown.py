@@ -1,8 +1,13 @@
 from collections import defaultdict
 import json
+import sys
+from pathlib import Path
 
 import numpy as np
 
+sys.path.append(str(Path(__file__).parent.parent / "simulation"))
+from meta_store import read_meta  # noqa: E402
+
 
 #############################
 # Group function definitions
@@ -91,12 +96,9 @@ def main(args):
                 uid = "fileid" + uid.split("fileid", maxsplit=1)[1]
             result_dic[uid] = score
 
-    meta_dic = {}
-    with open(args.meta_tsv, "r") as f:
-        headers = next(f).strip().split("\t")
-        for line in f:
-            tup = line.strip().split("\t")
-            meta_dic[tup[0]] = dict(zip(headers, tup))
+    # only load the columns used for grouping (effective for meta.parquet)
+    columns = ["id", "fs", "snr_dB", "length", "speech_sid", "rir_uid", "augmentation"]
+    meta_dic = {meta["id"]: meta for meta in read_meta(args.meta_tsv, columns=columns)}
 
     for group_func in (
         group_by_fs,
@@ -149,7 +151,8 @@ if __name__ == "__main__":
         "--meta_tsv",
         type=str,
         required=True,
-        help="Path to the tsv file containing meta information about each sample",
+        help="Path to the meta file (meta.tsv or meta.parquet) containing "
+        "meta information about each sample",
     )
     args = parser.parse_args()
 
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing.util import Finalize
+
+
+class AsyncWriter:
+    """Write-behind queue that saves audio in background threads.
+
+    The worker process hands each output over with `submit` and continues with
+    the next sample, while a small thread pool encodes and writes the audio
+    (libsndfile releases the GIL). The memory of the queued audio is bounded by
+    `max_pending_mb`; `submit` blocks until enough pending writes have finished.
+    Every file is fsynced once written. Callers must `flush` before reporting
+    the outputs as written, which re-raises the exception of any failed write;
+    writes still pending when the worker process exits are flushed as well, but
+    their errors can only be printed.
+    """
+
+    def __init__(self, num_threads=2, max_pending_mb=256.0, fsync=True):
+        self.executor = ThreadPoolExecutor(max_workers=num_threads)
+        self.max_bytes = int(max_pending_mb * 1024 * 1024)
+        self.fsync = fsync
+        self.pending_bytes = 0
+        self.cond = threading.Condition()
+        self.futures = set()
+        self.num_writes = 0
+        self.blocked_sec = 0.0
+        Finalize(self, self.close, exitpriority=10)
+
+    def write(self, save_func, audio, filename, *args):
+        save_func(audio, filename, *args)
+        if self.fsync:
+            fd = os.open(filename, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def release(self, nbytes, future):
+        with self.cond:
+            self.pending_bytes -= nbytes
+            self.cond.notify_all()
+
+    def raise_errors(self):
+        """Re-raise the exception of any failed write in the worker process."""
+        done = {future for future in self.futures if future.done()}
+        self.futures -= done
+        for future in done:
+            future.result()
+
+    def submit(self, save_func, audio, filename, *args):
+        """Queue `save_func(audio, filename, *args)` for writing in the background.
+
+        Args:
+            save_func (callable): function that writes `audio` to `filename`
+            audio (np.ndarray): audio signal, which must not be modified afterwards
+            filename (str): path to the output file
+            args: additional arguments passed to `save_func` (e.g., fs)
+        """
+        nbytes = audio.nbytes
+        start = time.perf_counter()
+        with self.cond:
+            # a single item larger than the budget is admitted when the queue is empty
+            self.cond.wait_for(
+                lambda: self.pending_bytes == 0
+                or self.pending_bytes + nbytes <= self.max_bytes
+            )
+            self.pending_bytes += nbytes
+        self.blocked_sec += time.perf_counter() - start
+        self.raise_errors()
+
+        future = self.executor.submit(self.write, save_func, audio, filename, *args)
+        future.add_done_callback(partial(self.release, nbytes))
+        self.futures.add(future)
+        self.num_writes += 1
+
+    def flush(self):
+        """Wait until all queued writes have finished.
+
+        Raises:
+            Exception: the exception of the first failed write, if any
+        """
+        start = time.perf_counter()
+        for future in list(self.futures):
+            future.result()
+        self.futures.clear()
+        self.blocked_sec += time.perf_counter() - start
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "writes": self.num_writes,
+            "blocked_sec": self.blocked_sec,
+            "pending_mb": self.pending_bytes / 1024 / 1024,
+        }
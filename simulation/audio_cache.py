@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class AudioCache:
+    """Memory-bounded LRU cache of decoded (and resampled) audio arrays.
+
+    Each worker process holds its own instance, which may be shared by its
+    reader threads. Cached arrays are marked as read-only so that callers cannot
+    accidentally modify them in place.
+    """
+
+    def __init__(self, max_size_mb=0.0):
+        """Initialize the cache.
+
+        Args:
+            max_size_mb (float): memory budget of the cached arrays in MB
+                (0 disables caching)
+        """
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.cache = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None if not cached."""
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, audio, fs):
+        """Insert an audio array into the cache, evicting the least recently used.
+
+        Args:
+            key (tuple): cache key, e.g. (path, target_fs, force_1ch)
+            audio (np.ndarray): decoded audio (Channel, Time)
+            fs (int): sampling rate of `audio` in Hz
+        """
+        if audio.nbytes > self.max_bytes:
+            return
+        audio.flags.writeable = False
+        with self.lock:
+            if key in self.cache:
+                return
+            self.cache[key] = (audio, fs)
+            self.nbytes += audio.nbytes
+            while self.nbytes > self.max_bytes:
+                _, (old_audio, _) = self.cache.popitem(last=False)
+                self.nbytes -= old_audio.nbytes
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "nbytes": self.nbytes}
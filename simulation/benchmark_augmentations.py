@@ -0,0 +1,415 @@
+"""Benchmark the augmentations of the simulation on synthetic audio.
+
+Synthetic speech, noise and RIRs are generated at every rate in SAMPLE_RATES,
+and each augmentation is timed for several durations. The results are written
+as JSON, so that two runs (e.g., before and after an optimization) can be
+compared with `--compare`.
+
+Golden outputs of every augmentation on short inputs can be stored with
+`--golden golden.npz --update_golden` and checked later with `--golden golden.npz`,
+so that faster implementations do not silently change the simulated data.
+
+`--compare_dtypes` runs every augmentation in float32 and float64 (see
+`--dtype` of simulate_data_from_param.py) and reports the speedup and the
+SNR of the float32 output against the float64 output.
+
+Usage:
+    python simulation/benchmark_augmentations.py --output before.json \
+        --golden golden.npz --update_golden
+    # ... change the implementation ...
+    python simulation/benchmark_augmentations.py --output after.json \
+        --golden golden.npz --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+from generate_data_param import RESAMPLE_METHODS, SAMPLE_RATES
+from reverb_engine import ReverbEngine
+from rir_utils import estimate_early_rir
+from simulate_data_from_param import (
+    add_reverberation,
+    bandwidth_limitation,
+    clipping,
+    codec_compression,
+    mix_noise,
+    packet_loss,
+)
+
+CODEC_CONFIGS = (("mp3", None, 5), ("ogg", "vorbis", 5), ("ogg", "opus", 5))
+# minimum SNR in dB of float32 outputs against float64 outputs (lossy codecs may
+# take different encoding decisions for slightly different inputs)
+DTYPE_MIN_SNR = {"codec_compression": 20.0}
+
+
+#############################
+# Synthetic inputs
+#############################
+def synth_speech(fs, duration, rng):
+    """Harmonic signal with a varying pitch, syllable-like envelope and pauses."""
+    t = np.arange(int(fs * duration)) / fs
+    f0 = 150 + 50 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 2 * np.pi))
+    phase = 2 * np.pi * np.cumsum(f0) / fs
+    harmonics = [k for k in range(1, 20) if k * 200 < fs / 2]
+    speech = sum(np.sin(k * phase) / k for k in harmonics)
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    # 0.5 s pause every 3 s
+    envelope[(t % 3.0) > 2.5] = 0
+    speech = speech * envelope + 1e-3 * rng.standard_normal(len(t))
+    return 0.3 * speech[None] / np.max(np.abs(speech))
+
+
+def synth_noise(fs, duration, rng):
+    """Pink-ish noise with a slowly varying level."""
+    n = int(fs * duration)
+    white = rng.standard_normal(n)
+    noise = np.fft.irfft(np.fft.rfft(white) / np.sqrt(np.arange(n // 2 + 1) + 1), n=n)
+    level = 1 + 0.5 * np.sin(2 * np.pi * 0.2 * np.arange(n) / fs)
+    noise = noise * level
+    return 0.3 * noise[None] / np.max(np.abs(noise))
+
+
+def synth_rir(fs, rng, t60=0.6, length=0.8, delay=0.003):
+    """Exponentially decaying noise tail following a direct path."""
+    n = int(fs * length)
+    t = np.arange(n) / fs
+    rir = rng.standard_normal(n) * np.exp(-6.9 * t / t60) * 0.3
+    rir[: int(fs * delay)] = 0
+    rir[int(fs * delay)] = 1.0
+    return rir[None]
+
+
+#############################
+# Benchmark cases
+#############################
+def get_cases(fs):
+    """Return (function, variant, callable) of all benchmarked augmentations.
+
+    Each callable takes (speech, noise, rir) and returns a single array.
+    """
+    cases = [
+        (
+            "mix_noise",
+            "",
+            lambda s, n, r: mix_noise(s, n, snr=5.0, rng=np.random.default_rng(0))[0],
+        ),
+        ("add_reverberation", "", lambda s, n, r: add_reverberation(s, r)),
+        (
+            "reverb_engine",
+            "uncached",
+            lambda s, n, r: np.stack(ReverbEngine(max_size_mb=0).apply(s, r, fs)),
+        ),
+        ("estimate_early_rir", "", lambda s, n, r: estimate_early_rir(r, fs=fs)),
+        ("clipping", "", lambda s, n, r: clipping(s, 0.05, 0.95)),
+        (
+            "packet_loss",
+            "",
+            lambda s, n, r: packet_loss(
+                s.copy(), fs, list(range(0, s.shape[-1] * 50 // fs, 10)), 20
+            ),
+        ),
+    ]
+    fs_new = max([x for x in SAMPLE_RATES if x < fs], default=None)
+    if fs_new is not None:
+        for res_type in RESAMPLE_METHODS:
+            cases.append(
+                (
+                    "bandwidth_limitation",
+                    f"{res_type}->{fs_new}",
+                    lambda s, n, r, res_type=res_type: bandwidth_limitation(
+                        s, fs, fs_new, res_type=res_type
+                    ),
+                )
+            )
+    for format, encoder, qscale in CODEC_CONFIGS:
+        cases.append(
+            (
+                "codec_compression",
+                f"{format}-{encoder}-q{qscale}",
+                lambda s, n, r, f=format, e=encoder, q=qscale: codec_compression(
+                    s, fs, format=f, encoder=e, qscale=q
+                ),
+            )
+        )
+    return cases
+
+
+def get_inputs(fs, duration, seed, dtype="float64"):
+    rng = np.random.default_rng([seed, fs, int(duration * 1000)])
+    return (
+        synth_speech(fs, duration, rng).astype(dtype),
+        synth_noise(fs, duration * 1.5, rng).astype(dtype),
+        synth_rir(fs, rng).astype(dtype),
+    )
+
+
+def time_case(func, inputs, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(*inputs)
+        times.append(time.perf_counter() - start)
+    return out, times
+
+
+def run_benchmark(args):
+    results = []
+    for fs in args.sample_rates:
+        for duration in args.durations:
+            inputs = get_inputs(fs, duration, args.seed, args.dtype)
+            for function, variant, func in get_cases(fs):
+                if args.functions and function not in args.functions:
+                    continue
+                _, times = time_case(func, inputs, args.repeat)
+                median = float(np.median(times))
+                results.append(
+                    {
+                        "function": function,
+                        "variant": variant,
+                        "fs": fs,
+                        "duration": duration,
+                        "dtype": args.dtype,
+                        "median_sec": median,
+                        "min_sec": float(np.min(times)),
+                        "rtf": median / duration,
+                    }
+                )
+                rec = results[-1]
+                print(
+                    f"{function}\t{variant or '-'}\t{fs}\t{duration}\t"
+                    f"{rec['median_sec'] * 1000:.2f}\t{rec['rtf']:.5f}",
+                    flush=True,
+                )
+    return results
+
+
+def compare_dtypes(args):
+    """Compare float32 against float64 in terms of speed and accuracy.
+
+    Returns:
+        results (list): speedup and SNR of each case
+        num_failed (int): number of cases below the minimum SNR
+    """
+    print("function\tvariant\tfs\tduration\tfloat64_ms\tfloat32_ms\tspeedup\tSNR_dB")
+    results, num_failed = [], 0
+    for fs in args.sample_rates:
+        for duration in args.durations:
+            inputs = get_inputs(fs, duration, args.seed, "float64")
+            inputs32 = tuple(x.astype(np.float32) for x in inputs)
+            for function, variant, func in get_cases(fs):
+                if args.functions and function not in args.functions:
+                    continue
+                out64, times64 = time_case(func, inputs, args.repeat)
+                out32, times32 = time_case(func, inputs32, args.repeat)
+                error = np.sum((out32.astype(np.float64) - out64) ** 2)
+                snr = 10 * np.log10(np.sum(out64**2) / max(error, 1e-300))
+                rec = {
+                    "function": function,
+                    "variant": variant,
+                    "fs": fs,
+                    "duration": duration,
+                    "float64_sec": float(np.median(times64)),
+                    "float32_sec": float(np.median(times32)),
+                    "output_dtype": str(out32.dtype),
+                    "snr_db": float(snr),
+                }
+                results.append(rec)
+                min_snr = DTYPE_MIN_SNR.get(function, args.float32_min_snr)
+                failed = snr < min_snr
+                num_failed += failed
+                time64, time32 = rec["float64_sec"], rec["float32_sec"]
+                print(
+                    f"{function}\t{variant or '-'}\t{fs}\t{duration}\t"
+                    f"{time64 * 1000:.2f}\t{time32 * 1000:.2f}\t"
+                    f"{time64 / time32:.2f}x\t{snr:.1f}"
+                    + (f" < {min_snr}" if failed else ""),
+                    flush=True,
+                )
+    print(f"[dtype] {len(results) - num_failed}/{len(results)} cases within tolerance")
+    return results, num_failed
+
+
+#############################
+# Golden-output checks
+#############################
+def compute_golden(args):
+    outputs = {}
+    for fs in args.sample_rates:
+        speech, noise, rir = get_inputs(fs, args.golden_duration, args.seed)
+        for function, variant, func in get_cases(fs):
+            if args.functions and function not in args.functions:
+                continue
+            outputs[f"{function}/{variant}/{fs}"] = func(speech, noise, rir)
+    return outputs
+
+
+def check_golden(outputs, golden_path, atol=1e-5):
+    """Compare the outputs against the stored golden outputs.
+
+    Returns:
+        num_failed (int): number of mismatching or missing outputs
+    """
+    golden = np.load(golden_path)
+    num_failed = 0
+    for key, out in outputs.items():
+        if key not in golden:
+            print(f"[golden] {key}: missing in {golden_path}")
+            num_failed += 1
+        elif golden[key].shape != out.shape:
+            print(f"[golden] {key}: shape {out.shape} != {golden[key].shape}")
+            num_failed += 1
+        elif not np.allclose(out, golden[key], rtol=0, atol=atol):
+            diff = np.max(np.abs(out - golden[key]))
+            print(f"[golden] {key}: max abs diff {diff:.3e} > {atol:.1e}")
+            num_failed += 1
+    print(f"[golden] {len(outputs) - num_failed}/{len(outputs)} outputs match")
+    return num_failed
+
+
+def compare_results(results, baseline_path):
+    """Print the speedup of each benchmark against a previous result file."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    print(f"Comparison against {baseline_path} (commit {baseline['commit']}):")
+    print("function\tvariant\tfs\tduration\tbefore_ms\tafter_ms\tspeedup")
+    before = {
+        (r["function"], r["variant"], r["fs"], r["duration"]): r["median_sec"]
+        for r in baseline["results"]
+    }
+    for r in results:
+        key = (r["function"], r["variant"], r["fs"], r["duration"])
+        if key in before:
+            print(
+                f"{r['function']}\t{r['variant'] or '-'}\t{r['fs']}\t{r['duration']}\t"
+                f"{before[key] * 1000:.2f}\t{r['median_sec'] * 1000:.2f}\t"
+                f"{before[key] / r['median_sec']:.2f}x"
+            )
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sample_rates",
+        type=int,
+        nargs="+",
+        default=list(SAMPLE_RATES),
+        help="Sampling rates to benchmark",
+    )
+    parser.add_argument(
+        "--durations",
+        type=float,
+        nargs="+",
+        default=[2.0, 10.0, 30.0, 60.0, 120.0],
+        help="Durations in seconds of the synthetic inputs",
+    )
+    parser.add_argument(
+        "--functions",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Only benchmark these functions (e.g., mix_noise clipping)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per case")
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        default="float64",
+        choices=["float64", "float32"],
+        help="Floating-point type of the synthetic inputs",
+    )
+    parser.add_argument(
+        "--compare_dtypes",
+        action="store_true",
+        help="Compare float32 against float64 instead of benchmarking --dtype only",
+    )
+    parser.add_argument(
+        "--float32_min_snr",
+        type=float,
+        default=60.0,
+        help="Minimum SNR in dB of float32 outputs against float64 outputs",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--output", type=str, default=None, help="Path to the output JSON file"
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="Path to a previous output JSON file to compare against",
+    )
+    parser.add_argument(
+        "--golden",
+        type=str,
+        default=None,
+        help="Path to the golden outputs (.npz) to check against",
+    )
+    parser.add_argument(
+        "--update_golden",
+        action="store_true",
+        help="Store the current outputs as golden outputs instead of checking",
+    )
+    parser.add_argument(
+        "--golden_duration",
+        type=float,
+        default=1.0,
+        help="Duration in seconds of the inputs used for golden outputs",
+    )
+    parser.add_argument(
+        "--golden_atol",
+        type=float,
+        default=1e-5,
+        help="Maximum absolute difference allowed from the golden outputs",
+    )
+    args = parser.parse_args()
+
+    num_failed = 0
+    if args.golden is not None:
+        outputs = compute_golden(args)
+        if args.update_golden:
+            np.savez_compressed(
+                args.golden, **{k: v.astype(np.float32) for k, v in outputs.items()}
+            )
+            print(f"[golden] {len(outputs)} outputs written to {args.golden}")
+        else:
+            num_failed = check_golden(outputs, args.golden, atol=args.golden_atol)
+
+    if args.compare_dtypes:
+        results, num_dtype_failed = compare_dtypes(args)
+        num_failed += num_dtype_failed
+    else:
+        print("function\tvariant\tfs\tduration\tmedian_ms\tRTF")
+        results = run_benchmark(args)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": get_commit(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=1,
+            )
+    if args.compare is not None and not args.compare_dtypes:
+        compare_results(results, args.compare)
+    sys.exit(1 if num_failed > 0 else 0)
@@ -0,0 +1,113 @@
+"""Benchmark the parameter generation for growing dataset sizes.
+
+Rows are generated end to end by `generate_rows` (noise/RIR selection,
+augmentation sampling and row formatting) with the settings of a simulation
+config. Speech, noise and RIR samples are synthetic entries with cached speech
+lengths, so no audio is read. The time per row should stay constant as the
+number of utterances grows, i.e., the total time should scale linearly.
+
+Usage:
+    python simulation/benchmark_sample_selection.py \
+        --config conf/simulation_validation.yaml \
+        --sizes 10000 100000 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+from generate_data_param import SAMPLE_RATES, SamplePool, generate_rows, get_parser
+
+
+def build_pool(num_samples, prefix, rng):
+    pool = SamplePool(SAMPLE_RATES)
+    fs_list = rng.choice(SAMPLE_RATES, size=num_samples)
+    for i, fs in enumerate(fs_list):
+        pool.add(int(fs), f"{prefix}_{i}", f"/path/to/{prefix}_{i}.flac")
+    return pool
+
+
+def build_utterances(num_utts, rng, min_sec=2.0, max_sec=20.0):
+    """Synthetic (index, fs, uid, audio_path, sid, text, length) tuples."""
+    fs_list = rng.choice(SAMPLE_RATES, size=num_utts)
+    durations = rng.uniform(min_sec, max_sec, size=num_utts)
+    return [
+        (
+            i,
+            int(fs),
+            f"utt_{i}",
+            f"/path/to/utt_{i}.flac",
+            f"spk_{i % 1000}",
+            "text",
+            int(fs * sec),
+        )
+        for i, (fs, sec) in enumerate(zip(fs_list, durations))
+    ]
+
+
+def benchmark(sim_args, num_utts, rng, noise_ratio=0.25, rir_ratio=0.01):
+    """Generate the rows for `num_utts` utterances and return the time.
+
+    Pools of samples that are never reused hold one sample per row, so that
+    they cannot run out.
+    """
+    num_rows = num_utts * sim_args.repeat_per_utt
+    utterances = build_utterances(num_utts, rng)
+    if not sim_args.reuse_noise:
+        noise_ratio = sim_args.repeat_per_utt
+    if not sim_args.reuse_rir:
+        rir_ratio = sim_args.repeat_per_utt
+    noise_pool = build_pool(max(int(num_utts * noise_ratio), 1), "noise", rng)
+    # wind noise is never reused
+    wind_noise_pool = build_pool(num_rows, "wind_noise", rng)
+    rir_pool = None
+    if sim_args.prob_reverberation > 0:
+        rir_pool = build_pool(max(int(num_utts * rir_ratio), 1), "rir", rng)
+
+    start = time.perf_counter()
+    rows = generate_rows(
+        sim_args, utterances, noise_pool, wind_noise_pool, rir_dic=rir_pool, rng=rng
+    )
+    for _ in rows:
+        pass
+    return num_rows, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="conf/simulation_validation.yaml",
+        help="Simulation config providing the augmentation and sampling settings",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10000, 100000, 1000000],
+        help="Numbers of utterances to benchmark",
+    )
+    parser.add_argument(
+        "--noise_ratio",
+        type=float,
+        default=0.25,
+        help="Number of noise samples per utterance (if noise is reused)",
+    )
+    parser.add_argument(
+        "--rir_ratio",
+        type=float,
+        default=0.01,
+        help="Number of RIR samples per utterance (if RIRs are reused)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    sim_args = get_parser().parse_args(["--config", args.config])
+    rng = np.random.RandomState(args.seed)
+    print("num_utts\tnum_rows\ttotal_sec\tusec_per_row")
+    for num_utts in args.sizes:
+        num_rows, elapsed = benchmark(
+            sim_args, num_utts, rng, args.noise_ratio, args.rir_ratio
+        )
+        print(f"{num_utts}\t{num_rows}\t{elapsed:.2f}\t{elapsed / num_rows * 1e6:.2f}")
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from torchaudio.io import AudioEffector, CodecConfig
+
+FORMATS = ("mp3", "ogg")
+ENCODERS = (None, "vorbis", "opus")
+
+
+class CodecError(RuntimeError):
+    """Failure of the codec simulation with the configuration that caused it."""
+
+    def __init__(self, format, encoder, qscale, fs, shape, cause):
+        self.format = format
+        self.encoder = encoder
+        self.qscale = qscale
+        self.fs = fs
+        self.shape = shape
+        self.cause = cause
+        super().__init__(
+            f"codec(format={format},encoder={encoder},qscale={qscale}) failed "
+            f"for audio of shape {shape} at {fs} Hz: "
+            f"{type(cause).__name__}: {cause}"
+        )
+
+
+class CodecEngine:
+    """Codec simulation with a per-process LRU cache of audio effectors.
+
+    Effectors are cached by (format, encoder, qscale, fs). This only saves the
+    construction of the effector objects, as torchaudio still builds an ffmpeg
+    filter graph for each call; the cache statistics mainly show how many codec
+    configurations a worker used. Failures are counted per configuration and
+    raised as `CodecError`.
+    """
+
+    def __init__(self, max_cache_size=32):
+        """Initialize the engine.
+
+        Args:
+            max_cache_size (int): maximum number of cached effectors
+        """
+        self.max_cache_size = max_cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.errors = {}
+
+    def get_effector(self, format, encoder, qscale, fs):
+        key = (format, encoder, qscale, fs)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.misses += 1
+        effector = AudioEffector(
+            format=format,
+            encoder=encoder,
+            codec_config=CodecConfig(qscale=qscale),
+            pad_end=True,
+        )
+        if self.max_cache_size > 0:
+            self.cache[key] = effector
+            if len(self.cache) > self.max_cache_size:
+                self.cache.popitem(last=False)
+        return effector
+
+    def encode(self, audio, fs, format, encoder, qscale):
+        """Run the codec on audio (Time, Channel) and return the decoded audio."""
+        assert format in FORMATS, format
+        assert encoder in ENCODERS, encoder
+        try:
+            effector = self.get_effector(format, encoder, qscale, fs)
+            return effector.apply(torch.from_numpy(audio), fs).numpy()
+        except Exception as e:
+            key = (format, encoder, qscale, fs)
+            self.errors[key] = self.errors.get(key, 0) + 1
+            raise CodecError(format, encoder, qscale, fs, audio.shape, e) from e
+
+    def apply(self, speech_sample, fs, format, encoder=None, qscale=None):
+        """Simulate the codec on a single sample.
+
+        Args:
+            speech_sample (np.ndarray): a single sample (Channel, Time) or (Time,)
+            fs (int): sampling rate in Hz
+            format (str): container format ("mp3" or "ogg")
+            encoder (str): encoder for "ogg" ("vorbis" or "opus"), or None
+            qscale (int): quality scale of the encoder
+        Returns:
+            output (np.ndarray): decoded sample with the same shape as the input
+        Raises:
+            CodecError: if ffmpeg fails to encode or decode the sample
+        """
+        encoder = None if encoder == "None" else encoder
+        # (channel, sample) -> (sample, channel)
+        x = speech_sample.T if speech_sample.ndim == 2 else speech_sample[:, None]
+        out = self.encode(np.ascontiguousarray(x), fs, format, encoder, qscale)
+        out = out[: x.shape[0]]
+        if out.shape[0] < x.shape[0]:
+            zeros = np.zeros((x.shape[0] - out.shape[0], out.shape[1]))
+            out = np.concatenate((out, zeros), axis=0)
+        assert x.shape == out.shape, (x.shape, out.shape)
+        return out.T if speech_sample.ndim == 2 else out[:, 0]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "errors": dict(self.errors)}
+
+
+if __name__ == "__main__":
+    # Throughput of each codec configuration: a new effector per sample (as
+    # before) and cached effectors
+    import argparse
+    import time
+
+    import yaml
+    from benchmark_augmentations import CODEC_CONFIGS, synth_speech
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="conf/simulation_train.yaml")
+    parser.add_argument("--fs", type=int, default=48000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--num_samples", type=int, default=16)
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        codec = yaml.safe_load(f).get("augmentations", {})
+    configs = []
+    if isinstance(codec, dict) and "codec" in codec:
+        for config in codec["codec"]["config"]:
+            encoders = config["encoder"]
+            if not isinstance(encoders, list):
+                encoders = [encoders]
+            qscales = config["qscale"]
+            if isinstance(qscales, list):
+                # both ends and the middle of the sampled range [low, high)
+                low, high = qscales
+                qscales = sorted({low, (low + high - 1) // 2, high - 1})
+            else:
+                qscales = [qscales]
+            configs += [
+                (config["format"], encoder, qscale)
+                for encoder in encoders
+                for qscale in qscales
+            ]
+    else:
+        print(f"No codec augmentation in {args.config}, using the default configs")
+        configs = list(CODEC_CONFIGS)
+
+    rng = np.random.default_rng(0)
+    samples = [
+        synth_speech(args.fs, args.duration, rng)[None] for _ in range(args.num_samples)
+    ]
+    print(f"{'config':<24}{'fresh/s':>10}{'cached/s':>10}")
+    for format, encoder, qscale in configs:
+        name = f"{format}-{encoder}-q{qscale}"
+        try:
+            start = time.perf_counter()
+            for x in samples:
+                CodecEngine(max_cache_size=0).apply(x, args.fs, format, encoder, qscale)
+            fresh = len(samples) / (time.perf_counter() - start)
+
+            engine = CodecEngine()
+            start = time.perf_counter()
+            for x in samples:
+                engine.apply(x, args.fs, format, encoder, qscale)
+            cached = len(samples) / (time.perf_counter() - start)
+        except CodecError as e:
+            print(f"{name:<24}{'failed':>10} ({e})")
+            continue
+        print(f"{name:<24}{fresh:>10.1f}{cached:>10.1f}")
@@ -0,0 +1,169 @@
+"""On-the-fly simulation (dynamic mixing) for training.
+
+Instead of materializing every simulated sample on disk with
+simulate_data_from_param.py, `DynamicMixingDataset` simulates (noisy, clean) pairs
+inside DataLoader workers, using exactly the same processing as the offline
+simulation. Rows are either read from an existing meta file or freshly sampled
+with the same logic as generate_data_param.py.
+
+Example:
+    from generate_data_param import get_parser
+
+    args = get_parser().parse_args(["--config", "conf/simulation_train.yaml"])
+    dataset = DynamicMixingDataset(args, meta_path=None, audio_cache_mb=512)
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=None, num_workers=8
+    )
+    for sample in loader:
+        noisy, clean = sample["noisy"], sample["clean"]
+"""
+
+import numpy as np
+import torch
+from generate_data_param import generate_rows, load_sources
+from meta_store import read_meta
+from simulate_data_from_param import (
+    load_path_tables,
+    resolve_wind_noise_backend,
+    simulate_one_sample,
+)
+
+
+class DynamicMixingDataset(torch.utils.data.IterableDataset):
+    def __init__(
+        self,
+        args,
+        meta_path=None,
+        shuffle=True,
+        seed=0,
+        rank=0,
+        world_size=1,
+        **simulation_kwargs,
+    ):
+        """Initialize the dataset.
+
+        Args:
+            args (argparse.Namespace): arguments parsed by the parser of
+                generate_data_param.py (e.g., loaded from a simulation config)
+            meta_path (str): path to a meta file (meta.tsv or meta.parquet).
+                If None, simulation parameters are freshly sampled every epoch
+                (and every further iteration over the dataset in the same epoch).
+            shuffle (bool): whether to shuffle the rows every epoch
+            seed (int): random seed for shuffling and parameter sampling
+            rank (int): rank of the current process in distributed training
+            world_size (int): number of processes in distributed training
+            simulation_kwargs: arguments passed to `simulate_one_sample`,
+                e.g., audio_cache_mb for the decoded-audio cache of each worker
+        """
+        super().__init__()
+        self.args = args
+        self.meta_path = meta_path
+        self.shuffle = shuffle
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.simulation_kwargs = simulation_kwargs
+        self.simulation_kwargs["wind_noise_backend"] = resolve_wind_noise_backend(
+            simulation_kwargs.get("wind_noise_backend")
+        )
+        self.epoch = 0
+        # number of iterations started by this copy of the dataset, which also
+        # changes the fresh parameters without `set_epoch` (persistent workers)
+        self.iteration = 0
+
+        self.speech_dic, self.noise_dic, self.rir_dic = load_path_tables(args)
+        if meta_path is not None:
+            self.meta = read_meta(meta_path)
+        else:
+            self.meta = None
+            self.sources = load_sources(args)
+        # noise and RIR pools of each shard, split once per worker
+        self.shard_pools = {}
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def get_shard(self):
+        """Return the index of the current shard and the total number of shards.
+
+        Each DataLoader worker of each distributed process is a separate shard.
+        """
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is None:
+            num_workers, worker_id = 1, 0
+        else:
+            num_workers, worker_id = worker_info.num_workers, worker_info.id
+        return self.rank * num_workers + worker_id, self.world_size * num_workers
+
+    def iter_rows(self, shard_idx, num_shards, iteration=0):
+        if self.meta is not None:
+            indices = np.arange(len(self.meta))
+            if self.shuffle:
+                np.random.default_rng([self.seed, self.epoch]).shuffle(indices)
+            for i in indices[shard_idx::num_shards]:
+                yield self.meta[i]
+        else:
+            utterances = self.sources[0][shard_idx::num_shards]
+            rng = np.random.RandomState([self.seed, self.epoch, iteration, shard_idx])
+            if self.shuffle:
+                utterances = [utterances[i] for i in rng.permutation(len(utterances))]
+            noise_dic, wind_noise_dic, rir_dic = (
+                None if pool is None else pool.copy()
+                for pool in self.get_shard_pools(shard_idx, num_shards)
+            )
+            # samples are reused once all samples of the shard are used, as a shard
+            # only holds a part of the pools and fresh rows are sampled every epoch
+            yield from generate_rows(
+                self.args,
+                utterances,
+                noise_dic,
+                wind_noise_dic,
+                rir_dic=rir_dic,
+                rng=rng,
+                force_reuse=True,
+            )
+
+    def get_shard_pools(self, shard_idx, num_shards):
+        """Return the noise, wind noise and RIR pools of the given shard.
+
+        The pools are partitioned in the same way as the offline parameter
+        generation with --nj num_shards.
+        """
+        key = (shard_idx, num_shards)
+        if key not in self.shard_pools:
+            self.shard_pools[key] = [
+                None if pool is None else pool.split(num_shards)[shard_idx]
+                for pool in self.sources[1:]
+            ]
+        return self.shard_pools[key]
+
+    def __iter__(self):
+        shard_idx, num_shards = self.get_shard()
+        iteration = self.iteration
+        self.iteration += 1
+        for info in self.iter_rows(shard_idx, num_shards, iteration):
+            # each row of a meta file is simulated with a random number generator
+            # seeded by its id as offline, while fresh rows, whose ids repeat
+            # every epoch, also take the epoch and the iteration into account
+            seed = None
+            if self.meta is None:
+                seed = [
+                    self.seed,
+                    self.epoch,
+                    iteration,
+                    int(info["id"].split("_")[-1]),
+                ]
+            speech_sample, noisy_speech, _ = simulate_one_sample(
+                info,
+                speech_dic=self.speech_dic,
+                noise_dic=self.noise_dic,
+                rir_dic=self.rir_dic,
+                seed=seed,
+                **self.simulation_kwargs,
+            )
+            yield {
+                "id": info["id"],
+                "fs": int(info["fs"]),
+                "noisy": torch.from_numpy(noisy_speech.astype(np.float32)),
+                "clean": torch.from_numpy(speech_sample.astype(np.float32)),
+            }
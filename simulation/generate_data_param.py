@@ -1,6 +1,9 @@
 import argparse
+import heapq
 import random
+import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import librosa
@@ -8,8 +11,12 @@ import numpy as np
 import soundfile as sf
 from espnet2.utils import config_argparse
 from espnet2.utils.types import str2bool
+from meta_store import write_parquet
 from tqdm import tqdm
 
+sys.path.append(str(Path(__file__).parent.parent / "utils"))
+from audio_header_cache import AudioHeaderCache  # noqa: E402
+
 # Avaiable sampling rates for bandwidth limitation
 SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
 
@@ -31,12 +38,13 @@ AUGMENTATIONS = ("bandwidth_limitation", "clipping")
 #############################
 # Augmentations per sample
 #############################
-def bandwidth_limitation(fs: int = 16000, res_type="random"):
+def bandwidth_limitation(fs: int = 16000, res_type="random", rng=np.random):
     """Apply the bandwidth limitation distortion to the input signal.
 
     Args:
         fs (int): sampling rate in Hz
         res_type (str): resampling method
+        rng (np.random.RandomState): random number generator
 
     Returns:
         res_type (str): adopted resampling method
@@ -46,8 +54,8 @@ def bandwidth_limitation(fs: int = 16000, res_type="random"):
     fs_opts = [fs_new for fs_new in SAMPLE_RATES if fs_new < fs]
     if fs_opts:
         if res_type == "random":
-            res_type = np.random.choice(RESAMPLE_METHODS)
-        fs_new = np.random.choice(fs_opts)
+            res_type = rng.choice(RESAMPLE_METHODS)
+        fs_new = rng.choice(fs_opts)
         opts = {"res_type": res_type}
     else:
         res_type = "none"
@@ -56,7 +64,12 @@ def bandwidth_limitation(fs: int = 16000, res_type="random"):
 
 
 def packet_loss(
-    speech_length, fs, packet_duration_ms, packet_loss_rate, max_continuous_packet_loss
+    speech_length,
+    fs,
+    packet_duration_ms,
+    packet_loss_rate,
+    max_continuous_packet_loss,
+    rng=np.random,
 ):
     """Returns a list of indices (of packets) that are zeroed out."""
 
@@ -65,7 +78,7 @@ def packet_loss(
     num_packets = int(speech_duration_ms // packet_duration_ms)
 
     # randomly select the packet loss rate and calculate the packet loss duration
-    packet_loss_rate = np.random.uniform(*packet_loss_rate)
+    packet_loss_rate = rng.uniform(*packet_loss_rate)
     packet_loss_duration_ms = packet_loss_rate * speech_duration_ms
 
     # calculate the number of packets to be zeroed out
@@ -74,14 +87,14 @@ def packet_loss(
     # list of length of each packet loss
     packet_loss_lengths = []
     for _ in range(num_packet_loss):
-        num_continuous_packet_loss = np.random.randint(1, max_continuous_packet_loss)
+        num_continuous_packet_loss = rng.randint(1, max_continuous_packet_loss)
         packet_loss_lengths.append(num_continuous_packet_loss)
 
         if num_packet_loss - sum(packet_loss_lengths) <= max_continuous_packet_loss:
             packet_loss_lengths.append(num_packet_loss - sum(packet_loss_lengths))
             break
 
-    packet_loss_start_indices = np.random.choice(
+    packet_loss_start_indices = rng.choice(
         range(num_packets), len(packet_loss_lengths), replace=False
     )
     packet_loss_indices = []
@@ -120,6 +133,66 @@ def save_audio(audio, filename, fs):
 # Main entry
 #############################
 def main(args):
+    utterances, noise_dic, wind_noise_dic, rir_dic = load_sources(args)
+
+    nj = max(args.nj, 1)
+    # samples that are never reused are selected from the global pools after all
+    # shards are generated, so that no sample is shared across shards; the other
+    # pools are partitioned between shards
+    deferred_pools = {}
+    if nj > 1:
+        deferred_pools["wind_noise"] = wind_noise_dic
+        if not args.reuse_noise:
+            deferred_pools["noise"] = noise_dic
+        if rir_dic is not None and not args.reuse_rir:
+            deferred_pools["rir"] = rir_dic
+
+    def split_pool(name, pool):
+        if pool is None:
+            return [None] * nj
+        if name in deferred_pools:
+            return [DeferredPool(name, pool.keys())] * nj
+        return pool.split(nj)
+
+    noise_pools = split_pool("noise", noise_dic)
+    wind_noise_pools = split_pool("wind_noise", wind_noise_dic)
+    rir_pools = split_pool("rir", rir_dic)
+    shard_args = [
+        (
+            args,
+            i,
+            utterances[i::nj],
+            noise_pools[i],
+            wind_noise_pools[i],
+            rir_pools[i],
+        )
+        for i in range(nj)
+    ]
+    if nj == 1:
+        shard_paths = [generate_shard(*shard_args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=nj) as executor:
+            futures = [executor.submit(generate_shard, *a) for a in shard_args]
+            shard_paths = [future.result() for future in futures]
+
+    # the random stream of the deferred selections is independent of the shards
+    merge_shards(
+        args, shard_paths, deferred_pools, rng=np.random.RandomState([args.seed, nj])
+    )
+
+
+def load_sources(args):
+    """Load the speech samples and the noise/RIR pools listed in the scp files.
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+    Returns:
+        utterances (list): (index, fs, uid, audio_path, sid, text, length) tuples
+            of all speech samples, where length is None if it is not cached
+        noise_dic (SamplePool): noise samples
+        wind_noise_dic (SamplePool): wind noise samples
+        rir_dic (SamplePool): RIR samples (None if reverberation is disabled)
+    """
     speech_dic = defaultdict(dict)
     # scp file of clean speech samples (three columns per line: uid, fs, audio_path)
     for scp in args.speech_scps:
@@ -129,6 +202,16 @@ def main(args):
                 assert uid not in speech_dic[int(fs)], (uid, fs)
                 speech_dic[int(fs)][uid] = audio_path
 
+    # [optional] persistent cache of audio lengths
+    header_cache = None
+    if args.audio_header_cache is not None:
+        header_cache = AudioHeaderCache(args.audio_header_cache)
+        num_updated = header_cache.update(
+            [(uid, path) for dic in speech_dic.values() for uid, path in dic.items()],
+            nj=args.nj,
+        )
+        print(f"Updated {num_updated} entries in {args.audio_header_cache}")
+
     # speaker ID of each sample (two columns per line: uid, speaker_id)
     utt2spk = {}
     for scp in args.speech_utt2spk:
@@ -155,7 +238,7 @@ def main(args):
                 uid, fs, audio_path = line.strip().split()
                 assert uid not in noise_dic[int(fs)], (uid, fs)
                 noise_dic[int(fs)][uid] = audio_path
-    used_noise_dic = {fs: {} for fs in noise_dic.keys()}
+    noise_dic = SamplePool.from_dict(noise_dic)
 
     # scp file of noise samples (three columns per line: uid, fs, audio_path)
     wind_noise_dic = defaultdict(dict)
@@ -165,7 +248,7 @@ def main(args):
                 uid, fs, audio_path = line.strip().split()
                 assert uid not in wind_noise_dic[int(fs)], (uid, fs)
                 wind_noise_dic[int(fs)][uid] = audio_path
-    used_wind_noise_dic = {fs: {} for fs in wind_noise_dic.keys()}
+    wind_noise_dic = SamplePool.from_dict(wind_noise_dic)
 
     # [optional] scp file of RIR samples (three columns per line: uid, fs, audio_path)
     rir_dic = None
@@ -177,9 +260,22 @@ def main(args):
                     uid, fs, audio_path = line.strip().split()
                     assert uid not in rir_dic[int(fs)], (uid, fs)
                     rir_dic[int(fs)][uid] = audio_path
-    used_rir_dic = {fs: {} for fs in rir_dic.keys()} if rir_dic is not None else None
+        rir_dic = SamplePool.from_dict(rir_dic)
+
+    # utterances are assigned to shards in a round-robin manner, and each utterance
+    # keeps its global index so that fileid_N is unique and independent of sharding
+    utterances = []
+    for fs in sorted(speech_dic.keys(), reverse=True):
+        for uid, audio_path in speech_dic[fs].items():
+            sid = utt2spk[uid]
+            transcript = text.get(uid, "<not-available>")  # placeholder of missing text
+            length = None if header_cache is None else header_cache[uid]["frames"]
+            idx = len(utterances)
+            utterances.append((idx, fs, uid, audio_path, sid, transcript, length))
+    return utterances, noise_dic, wind_noise_dic, rir_dic
 
-    f = open(Path(args.log_dir) / "meta.tsv", "w")
+
+def get_meta_headers(store_noise=False):
     headers = [
         "id",
         "noisy_path",
@@ -188,10 +284,150 @@ def main(args):
         "clean_path",
         "noise_uid",
     ]
-    if args.store_noise:
+    if store_noise:
         headers.append("noise_path")
     headers += ["snr_dB", "rir_uid", "augmentation", "fs", "length", "text"]
-    f.write("\t".join(headers) + "\n")
+    return headers
+
+
+def merge_shards(args, shard_paths, deferred_pools=None, rng=np.random):
+    """Merge the meta files of all shards into one meta file (sorted by fileid).
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+        shard_paths (list): paths to the meta files of the shards
+        deferred_pools (dict): {name: SamplePool} of the samples whose selection
+            was deferred by the shards (see `DeferredPool`)
+        rng (np.random.RandomState): random number generator of the deferred
+            selections
+    """
+    headers = get_meta_headers(args.store_noise)
+    files = [open(path, "r") for path in shard_paths]
+    lines = heapq.merge(
+        *files, key=lambda line: int(line.split("\t", 1)[0].split("_")[-1])
+    )
+    if deferred_pools:
+        lines = select_deferred(lines, headers, deferred_pools, rng=rng)
+    if args.meta_format == "parquet":
+        write_parquet(lines, headers, Path(args.log_dir) / "meta.parquet")
+    else:
+        with open(Path(args.log_dir) / "meta.tsv", "w") as f:
+            f.write("\t".join(headers) + "\n")
+            for line in lines:
+                f.write(line)
+    for f_shard, path in zip(files, shard_paths):
+        f_shard.close()
+        Path(path).unlink()
+
+
+def select_deferred(lines, headers, sample_pools, rng=np.random):
+    """Replace the placeholders of deferred selections in the given meta lines.
+
+    Samples are selected in the order of the lines and never reused.
+
+    Args:
+        lines (iterable): lines of the meta file (without headers)
+        headers (list): column names of the meta file
+        sample_pools (dict): {name: SamplePool} of the deferred samples
+        rng (np.random.RandomState): random number generator
+    Yields:
+        line (str): the line with the selected sample uids
+    """
+    used_pools = {name: SamplePool(pool.keys()) for name, pool in sample_pools.items()}
+    columns = (headers.index("noise_uid"), headers.index("rir_uid"))
+    for line in lines:
+        values = line.split("\t")
+        for i in columns:
+            if not values[i].startswith(DeferredPool.PREFIX):
+                continue
+            name, fs = values[i][len(DeferredPool.PREFIX) : -1].split(":")
+            uid, _ = select_sample(
+                int(fs),
+                sample_pools[name],
+                used_sample_pool=used_pools[name],
+                reuse_sample=False,
+                rng=rng,
+            )
+            if uid is None:
+                if name == "rir":
+                    uid = "none"
+                else:
+                    raise ValueError(f"Noise sample not found for fs={fs}+ Hz")
+            values[i] = uid
+        yield "\t".join(values)
+
+
+def generate_shard(
+    args,
+    shard_idx,
+    utterances,
+    noise_dic,
+    wind_noise_dic,
+    rir_dic=None,
+):
+    """Generate simulation parameters for one shard of the speech samples.
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+        shard_idx (int): index of the shard
+        utterances (list): list of (index, fs, uid, audio_path, sid, text, length)
+            tuples, where length is None if it is not cached
+        noise_dic (SamplePool or DeferredPool): noise samples reserved for this
+            shard
+        wind_noise_dic (SamplePool or DeferredPool): wind noise samples reserved
+            for this shard
+        rir_dic (SamplePool or DeferredPool): RIR samples reserved for this shard
+    Returns:
+        shard_path (Path): path to the generated meta file (without headers)
+    """
+    if args.nj > 1:
+        # independent random stream for each shard
+        rng = np.random.RandomState([args.seed, shard_idx])
+    else:
+        # same random stream as the serial generation seeded with np.random.seed
+        rng = np.random.RandomState(args.seed)
+    headers = get_meta_headers(args.store_noise)
+    shard_path = Path(args.log_dir) / f"meta.{shard_idx}.tsv"
+    with open(shard_path, "w") as f:
+        for row in generate_rows(
+            args,
+            tqdm(utterances, position=shard_idx, desc=f"shard {shard_idx}"),
+            noise_dic,
+            wind_noise_dic,
+            rir_dic=rir_dic,
+            rng=rng,
+        ):
+            f.write("\t".join(row[h] for h in headers) + "\n")
+    return shard_path
+
+
+def generate_rows(
+    args,
+    utterances,
+    noise_dic,
+    wind_noise_dic,
+    rir_dic=None,
+    rng=np.random,
+    force_reuse=False,
+):
+    """Sample simulation parameters for the given speech samples.
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+        utterances (iterable): (index, fs, uid, audio_path, sid, text, length)
+            tuples, where length is None if it is not cached
+        noise_dic (SamplePool): noise samples to select from
+        wind_noise_dic (SamplePool): wind noise samples to select from
+        rir_dic (SamplePool): RIR samples to select from
+        rng (np.random.RandomState): random number generator
+        force_reuse (bool): whether to reuse samples once all of them are used,
+            even for the pools whose samples are never reused otherwise
+    Yields:
+        row (dict): a row of the meta file (all values are strings)
+    """
+    used_noise_dic = SamplePool(noise_dic.keys())
+    used_wind_noise_dic = SamplePool(wind_noise_dic.keys())
+    used_rir_dic = SamplePool(rir_dic.keys()) if rir_dic is not None else None
 
     outdir = Path(args.output_dir)
     snr_range = (args.snr_low_bound, args.snr_high_bound)
@@ -204,12 +440,9 @@ def main(args):
     weight_augmentations = [v["weight"] for v in args.augmentations.values()]
     weight_augmentations = weight_augmentations / np.sum(weight_augmentations)
 
-    count = 0
-    for fs in sorted(speech_dic.keys(), reverse=True):
-        for uid, audio_path in tqdm(speech_dic[fs].items()):
-            sid = utt2spk[uid]
-            transcript = text.get(uid, "<not-available>")  # placeholder of missing text
-            # Load speech sample (Channel, Time)
+    for idx, fs, uid, audio_path, sid, transcript, speech_length in utterances:
+        # Load speech sample (Channel, Time) unless its length is cached
+        if speech_length is None:
             if audio_path.endswith(".wav"):
                 with sf.SoundFile(audio_path) as af:
                     speech_length = af.frames
@@ -217,71 +450,70 @@ def main(args):
                 # Sometimes the acutal loaded audio's length differs from af.frames
                 speech_length = sf.read(audio_path)[0].shape[0]
 
-            for n in range(args.repeat_per_utt):
-                use_wind_noise = np.random.random() < args.prob_wind_noise
+        for n in range(args.repeat_per_utt):
+            use_wind_noise = rng.random() < args.prob_wind_noise
 
-                num_aug = np.random.choice(
-                    list(args.num_augmentations.keys()),
-                    p=list(args.num_augmentations.values()),
+            num_aug = rng.choice(
+                list(args.num_augmentations.keys()),
+                p=list(args.num_augmentations.values()),
+            )
+            if num_aug == 0:
+                aug = "none"
+            else:
+                aug = rng.choice(
+                    augmentations,
+                    p=weight_augmentations,
+                    size=num_aug,
+                    replace=False,
                 )
-                if num_aug == 0:
-                    aug = "none"
-                else:
-                    aug = np.random.choice(
+                # As wind-noise simulation include clipping,
+                # we exclude clipping from augmentation list
+                while use_wind_noise and "clipping" in aug:
+                    aug = rng.choice(
                         augmentations,
                         p=weight_augmentations,
                         size=num_aug,
                         replace=False,
                     )
-                    # As wind-noise simulation include clipping,
-                    # we exclude clipping from augmentation list
-                    while use_wind_noise and "clipping" in aug:
-                        aug = np.random.choice(
-                            augmentations,
-                            p=weight_augmentations,
-                            size=num_aug,
-                            replace=False,
-                        )
-
-                info = process_one_sample(
-                    args,
-                    speech_length,
-                    fs,
-                    noise_dic=noise_dic,
-                    used_noise_dic=used_noise_dic,
-                    wind_noise_dic=wind_noise_dic,
-                    used_wind_noise_dic=used_wind_noise_dic,
-                    use_wind_noise=use_wind_noise,
-                    snr_range=snr_range,
-                    wind_noise_snr_range=wind_noise_snr_range,
-                    store_noise=args.store_noise,
-                    rir_dic=rir_dic,
-                    used_rir_dic=used_rir_dic,
-                    augmentations=aug,
-                    force_1ch=True,
-                )
-                count += 1
-                filename = f"fileid_{count}.{args.out_format}"
-                lst = [
-                    f"fileid_{count}",
-                    str(outdir / "noisy" / filename),
-                    uid,
-                    sid,
-                    str(outdir / "clean" / filename),
-                    info["noise_uid"],
-                ]
-                if args.store_noise:
-                    lst.append(str(outdir / "noise" / filename))
-                lst += [
-                    str(info["snr"]),
-                    info["rir_uid"],
-                    info["augmentation"],
-                    str(info["fs"]),
-                    str(info["length"]),
-                    transcript,
-                ]
-                f.write("\t".join(lst) + "\n")
-    f.close()
+
+            info = process_one_sample(
+                args,
+                speech_length,
+                fs,
+                noise_dic=noise_dic,
+                used_noise_dic=used_noise_dic,
+                wind_noise_dic=wind_noise_dic,
+                used_wind_noise_dic=used_wind_noise_dic,
+                use_wind_noise=use_wind_noise,
+                snr_range=snr_range,
+                wind_noise_snr_range=wind_noise_snr_range,
+                store_noise=args.store_noise,
+                rir_dic=rir_dic,
+                used_rir_dic=used_rir_dic,
+                augmentations=aug,
+                force_1ch=True,
+                rng=rng,
+                force_reuse=force_reuse,
+            )
+            count = idx * args.repeat_per_utt + n + 1
+            filename = f"fileid_{count}.{args.out_format}"
+            row = {
+                "id": f"fileid_{count}",
+                "noisy_path": str(outdir / "noisy" / filename),
+                "speech_uid": uid,
+                "speech_sid": sid,
+                "clean_path": str(outdir / "clean" / filename),
+                "noise_uid": info["noise_uid"],
+                "snr_dB": str(info["snr"]),
+                "rir_uid": info["rir_uid"],
+                "augmentation": info["augmentation"],
+                "fs": str(info["fs"]),
+                "length": str(info["length"]),
+                "text": transcript,
+            }
+            if args.store_noise:
+                row["noise_path"] = str(outdir / "noise" / filename)
+            yield row
 
 
 def process_one_sample(
@@ -300,22 +532,28 @@ def process_one_sample(
     used_rir_dic=None,
     augmentations="none",
     force_1ch=True,
+    rng=np.random,
+    force_reuse=False,
 ):
     # select a noise sample
     if use_wind_noise:
         noise_uid, _ = select_sample(
-            fs, wind_noise_dic, used_sample_dic=used_wind_noise_dic, reuse_sample=False
+            fs,
+            wind_noise_dic,
+            used_sample_pool=used_wind_noise_dic,
+            reuse_sample=force_reuse,
+            rng=rng,
         )
 
         # wind-noise simulation config
         wn_conf = args.wind_noise_config
-        threshold = np.random.uniform(*wn_conf["threshold"])
-        ratio = np.random.uniform(*wn_conf["ratio"])
-        attack = np.random.uniform(*wn_conf["attack"])
-        release = np.random.uniform(*wn_conf["release"])
-        sc_gain = np.random.uniform(*wn_conf["sc_gain"])
-        clipping_threshold = np.random.uniform(*wn_conf["clipping_threshold"])
-        clipping = np.random.random() < wn_conf["clipping_chance"]
+        threshold = rng.uniform(*wn_conf["threshold"])
+        ratio = rng.uniform(*wn_conf["ratio"])
+        attack = rng.uniform(*wn_conf["attack"])
+        release = rng.uniform(*wn_conf["release"])
+        sc_gain = rng.uniform(*wn_conf["sc_gain"])
+        clipping_threshold = rng.uniform(*wn_conf["clipping_threshold"])
+        clipping = rng.random() < wn_conf["clipping_chance"]
         augmentation_config = (
             "wind_noise("
             f"threshold={threshold},ratio={ratio},"
@@ -323,13 +561,17 @@ def process_one_sample(
             f"sc_gain={sc_gain},clipping={clipping},"
             f"clipping_threshold={clipping_threshold})/"
         )
-        snr = np.random.uniform(*wind_noise_snr_range)
+        snr = rng.uniform(*wind_noise_snr_range)
     else:
         noise_uid, noise = select_sample(
-            fs, noise_dic, used_sample_dic=used_noise_dic, reuse_sample=args.reuse_noise
+            fs,
+            noise_dic,
+            used_sample_pool=used_noise_dic,
+            reuse_sample=args.reuse_noise or force_reuse,
+            rng=rng,
         )
         augmentation_config = ""
-        snr = np.random.uniform(*snr_range)
+        snr = rng.uniform(*snr_range)
     if noise_uid is None:
         raise ValueError(f"Noise sample not found for fs={fs}+ Hz")
 
@@ -337,12 +579,16 @@ def process_one_sample(
     if (
         rir_dic is None
         or args.prob_reverberation <= 0.0
-        or np.random.rand() <= args.prob_reverberation
+        or rng.random() <= args.prob_reverberation
     ):
         rir_uid, rir = None, None
     else:
         rir_uid, rir = select_sample(
-            fs, rir_dic, used_sample_dic=used_rir_dic, reuse_sample=args.reuse_rir
+            fs,
+            rir_dic,
+            used_sample_pool=used_rir_dic,
+            reuse_sample=args.reuse_rir or force_reuse,
+            rng=rng,
         )
 
     # apply an additional augmentation
@@ -353,27 +599,29 @@ def process_one_sample(
         for i, augmentation in enumerate(augmentations):
             this_aug = args.augmentations[augmentation]
             if augmentation == "bandwidth_limitation":
-                res_type, fs_new = bandwidth_limitation(fs=fs, res_type="random")
+                res_type, fs_new = bandwidth_limitation(
+                    fs=fs, res_type="random", rng=rng
+                )
                 augmentation_config += f"{augmentation}-{res_type}->{fs_new}"
             elif augmentation == "clipping":
-                min_quantile = np.random.uniform(*this_aug["clipping_min_quantile"])
-                max_quantile = np.random.uniform(*this_aug["clipping_max_quantile"])
+                min_quantile = rng.uniform(*this_aug["clipping_min_quantile"])
+                max_quantile = rng.uniform(*this_aug["clipping_max_quantile"])
                 augmentation_config += (
                     f"{augmentation}(min={min_quantile},max={max_quantile})"
                 )
             elif augmentation == "codec":
-                # vbr_quality = np.random.uniform(*this_aug["vbr_quality"])
+                # vbr_quality = rng.uniform(*this_aug["vbr_quality"])
                 # augmentation_config += f"{augmentation}(vbr_quality={vbr_quality})"
-                codec_config = np.random.choice(this_aug["config"], 1)[0]
+                codec_config = rng.choice(this_aug["config"], 1)[0]
                 format, encoder, qscale = (
                     codec_config["format"],
                     codec_config["encoder"],
                     codec_config["qscale"],
                 )
                 if encoder is not None and isinstance(encoder, list):
-                    encoder = np.random.choice(encoder, 1)[0]
+                    encoder = rng.choice(encoder, 1)[0]
                 if qscale is not None and isinstance(qscale, list):
-                    qscale = np.random.randint(*qscale)
+                    qscale = rng.randint(*qscale)
                 augmentation_config += (
                     f"{augmentation}"
                     f"(format={format},encoder={encoder},qscale={qscale})"
@@ -387,6 +635,7 @@ def process_one_sample(
                     packet_duration_ms,
                     this_aug["packet_loss_rate"],
                     this_aug["max_continuous_packet_loss"],
+                    rng=rng,
                 )
                 augmentation_config += (
                     f"{augmentation}"
@@ -411,37 +660,176 @@ def process_one_sample(
     return meta
 
 
-def select_sample(fs, sample_dic, used_sample_dic=None, reuse_sample=False):
-    """Randomly select a sample from the given dictionary.
+class SamplePool:
+    """Samples grouped by sampling rate, supporting random selection in O(log n).
+
+    Samples of each sampling rate are stored in a flat list in insertion order.
+    Removed samples are only marked as such, and a Fenwick tree over the list
+    counts the remaining ones, so that the k-th remaining sample is found and
+    removed in O(log n). The remaining samples keep their order, so a pick is
+    the same as `rng.choice(list(dic.keys()))` on a dict from which the used
+    samples are popped, i.e., the picks are identical to those of the original
+    dict-based selection for the same random stream. (Removing by swapping with
+    the last sample would take O(1), but reorders the samples and changes the
+    picks.)
+    """
+
+    def __init__(self, fs_list=()):
+        self.samples = {fs: [] for fs in fs_list}
+        # Fenwick tree (1-based) of the number of remaining samples
+        self.trees = {fs: [0] for fs in fs_list}
+        self.sizes = {fs: 0 for fs in fs_list}
+
+    @classmethod
+    def from_dict(cls, sample_dic):
+        """Build a pool from a dict of {fs: {uid: sample}}."""
+        pool = cls(sample_dic.keys())
+        for fs, dic in sample_dic.items():
+            pool.samples[fs] = list(dic.items())
+            pool.sizes[fs] = len(dic)
+            # O(n) construction
+            tree = [0] + [1] * len(dic)
+            for i in range(1, len(tree)):
+                j = i + (i & -i)
+                if j < len(tree):
+                    tree[j] += tree[i]
+            pool.trees[fs] = tree
+        return pool
+
+    def keys(self):
+        return self.samples.keys()
+
+    def size(self, fs):
+        return self.sizes.get(fs, 0)
+
+    def add(self, fs, uid, sample):
+        if fs not in self.samples:
+            self.samples[fs], self.trees[fs], self.sizes[fs] = [], [0], 0
+        lst, tree = self.samples[fs], self.trees[fs]
+        lst.append((uid, sample))
+        # the new node covers itself and the nodes (i - lowbit(i), i)
+        i = len(lst)
+        tree.append(
+            1 + self.prefix_count(fs, i - 1) - self.prefix_count(fs, i - (i & -i))
+        )
+        self.sizes[fs] += 1
+
+    def prefix_count(self, fs, i):
+        """Number of remaining samples among the first `i` list entries."""
+        tree, count = self.trees[fs], 0
+        while i > 0:
+            count += tree[i]
+            i -= i & -i
+        return count
+
+    def remaining(self, fs):
+        lst = self.samples[fs]
+        return [
+            lst[i]
+            for i in range(len(lst))
+            if self.prefix_count(fs, i + 1) - self.prefix_count(fs, i) > 0
+        ]
+
+    def copy(self):
+        pool = SamplePool()
+        pool.samples = {fs: list(lst) for fs, lst in self.samples.items()}
+        pool.trees = {fs: list(tree) for fs, tree in self.trees.items()}
+        pool.sizes = dict(self.sizes)
+        return pool
+
+    def split(self, num_splits):
+        """Partition the remaining samples into `num_splits` pools (round robin)."""
+        remaining = {fs: self.remaining(fs) for fs in self.keys()}
+        return [
+            SamplePool.from_dict(
+                {fs: dict(lst[i::num_splits]) for fs, lst in remaining.items()}
+            )
+            for i in range(num_splits)
+        ]
+
+    def pick(self, fs, remove=False, rng=np.random):
+        """Randomly pick a sample with the given sampling rate.
+
+        Args:
+            fs (int): sampling rate in Hz
+            remove (bool): whether to remove the picked sample from the pool
+            rng (np.random.RandomState): random number generator
+        Returns:
+            uid (str): unique ID of the sample
+            sample (str): path to the sample
+        """
+        tree = self.trees[fs]
+        # find the (k + 1)-th remaining sample by binary lifting
+        k = rng.randint(0, self.sizes[fs]) + 1
+        pos, step = 0, 1 << (len(tree) - 1).bit_length()
+        while step > 0:
+            if pos + step < len(tree) and tree[pos + step] < k:
+                pos += step
+                k -= tree[pos]
+            step >>= 1
+        uid, sample = self.samples[fs][pos]
+        if remove:
+            i = pos + 1
+            while i < len(tree):
+                tree[i] -= 1
+                i += i & -i
+            self.sizes[fs] -= 1
+        return uid, sample
+
+
+class DeferredPool:
+    """Placeholder of a pool whose samples are selected after all shards are done.
+
+    Selecting from it returns a placeholder uid that records the pool name and the
+    sampling rate, which is replaced by `select_deferred` when merging the shards.
+    """
+
+    PREFIX = "<deferred:"
+
+    def __init__(self, name, fs_list=()):
+        self.name = name
+        self.fs_list = list(fs_list)
+
+    def keys(self):
+        return self.fs_list
+
+    def defer(self, fs):
+        return f"{self.PREFIX}{self.name}:{fs}>"
+
+
+def select_sample(
+    fs, sample_pool, used_sample_pool=None, reuse_sample=False, rng=np.random
+):
+    """Randomly select a sample from the given pool.
 
     First try to select an unused sample with the same sampling rate (= fs).
     Then try to select an unused sample with a higher sampling rate (> fs).
     If no unused sample is found and reuse_sample=True,
         try to select a used sample with the same strategy.
+    Selected samples are moved to `used_sample_pool` if it is given.
+    Selections from a DeferredPool return a placeholder uid instead.
     """
-    if fs not in sample_dic.keys() or len(sample_dic[fs]) == 0:
-        fs_opts = list(sample_dic.keys())
-        np.random.shuffle(fs_opts)
+    if isinstance(sample_pool, DeferredPool):
+        return sample_pool.defer(fs), None
+    if sample_pool.size(fs) == 0:
+        fs_opts = list(sample_pool.keys())
+        rng.shuffle(fs_opts)
         for fs2 in fs_opts:
-            if fs2 > fs and len(sample_dic[fs2]) > 0:
-                uid = np.random.choice(list(sample_dic[fs2].keys()))
-                if used_sample_dic is not None:
-                    sample = sample_dic[fs2].pop(uid)
-                    used_sample_dic[fs2][uid] = sample
-                else:
-                    sample = sample_dic[fs2][uid]
+            if fs2 > fs and sample_pool.size(fs2) > 0:
+                fs_selected = fs2
                 break
         else:
             if reuse_sample:
-                return select_sample(fs, used_sample_dic, reuse_sample=False)
+                return select_sample(fs, used_sample_pool, reuse_sample=False, rng=rng)
             return None, None
     else:
-        uid = np.random.choice(list(sample_dic[fs].keys()))
-        if used_sample_dic is not None:
-            sample = sample_dic[fs].pop(uid)
-            used_sample_dic[fs][uid] = sample
-        else:
-            sample = sample_dic[fs][uid]
+        fs_selected = fs
+
+    uid, sample = sample_pool.pick(
+        fs_selected, remove=used_sample_pool is not None, rng=rng
+    )
+    if used_sample_pool is not None:
+        used_sample_pool.add(fs_selected, uid, sample)
     return uid, sample
 
 
@@ -495,6 +883,14 @@ def get_parser(parser=None):
     group.add_argument(
         "--out_format", type=str, default="flac", help="Output audio format"
     )
+    group.add_argument(
+        "--meta_format",
+        type=str,
+        default="tsv",
+        choices=["tsv", "parquet"],
+        help="Format of the generated meta file in `log_dir`:\n"
+        "tsv (meta.tsv) or parquet (meta.parquet with typed columns)",
+    )
     group.add_argument(
         "--repeat_per_utt",
         type=int,
@@ -504,6 +900,21 @@ def get_parser(parser=None):
         "`repeat_per_utt` * size(speech_scp))",
     )
     group.add_argument("--seed", type=int, default=0, help="Random seed")
+    group.add_argument(
+        "--nj",
+        type=int,
+        default=1,
+        help="Number of parallel workers\n"
+        "(parameter generation: number of shards with independent random streams;\n"
+        "1 reproduces the serial generation, >1 requires reusable noise/RIRs)",
+    )
+    group.add_argument(
+        "--audio_header_cache",
+        type=str,
+        default=None,
+        help="Path to a persistent cache of audio lengths (TSV).\n"
+        "Only new or modified files are re-read in later runs.",
+    )
 
     group = parser.add_argument_group(description="Additive noise related")
     group.add_argument(
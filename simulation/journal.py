@@ -0,0 +1,154 @@
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """Return the CRC32 checksum of a file as a hexadecimal string."""
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return f"{crc:08x}"
+
+
+def fsync_file(path):
+    """Flush the data of the file at `path` to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only journal of the output files written by a worker process.
+
+    Each line is `id<TAB>path<TAB>size<TAB>crc32` and is appended only after the
+    file has been completely written and synced to disk, so files that were being
+    written when the job was killed (or the node crashed) have no (or an outdated)
+    entry. Each worker process appends
+    to its own file, named after its host name and process ID, so that no
+    locking is needed between processes or nodes.
+    """
+
+    def __init__(self, journal_dir):
+        journal_dir = Path(journal_dir)
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        path = journal_dir / f"{os.uname().nodename}-{os.getpid()}.tsv"
+        self.f = open(path, "a")
+        # entries may be recorded by the threads of the write-behind queue
+        self.lock = threading.Lock()
+        # closed after the write-behind queue (exitpriority=10) is flushed
+        Finalize(self, self.close, exitpriority=5)
+
+    def record(self, uid, path, size=None, crc=None):
+        """Append the entry of an output file that has been completely written.
+
+        The file is synced to disk before its entry is appended.
+
+        Args:
+            uid (str): ID of the sample
+            path (str): path to the output file
+            size (int): [optional] size of the file in bytes
+            crc (str): [optional] CRC32 checksum of the file as returned by
+                `file_checksum` (the file is read if not given)
+        """
+        fsync_file(path)
+        if size is None:
+            size = os.path.getsize(path)
+        if crc is None:
+            crc = file_checksum(path)
+        line = f"{uid}\t{path}\t{size}\t{crc}\n"
+        with self.lock:
+            self.f.write(line)
+            self.f.flush()
+
+    def write(self, uid, encode_func, audio, filename, *args):
+        """Write the bytes of `encode_func(audio, filename, *args)` and record them.
+
+        The size and checksum are computed from the encoded bytes in memory,
+        so the written file is not read back. The entry is recorded after the
+        file is flushed and synced to disk.
+        """
+        data = encode_func(audio, filename, *args)
+        with open(filename, "wb") as f:
+            f.write(data)
+        self.record(uid, filename, size=len(data), crc=f"{zlib.crc32(data):08x}")
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+
+def read_journal(journal_dir):
+    """Read all journal files in `journal_dir`.
+
+    Lines that were torn by a killed process are ignored.
+
+    Returns:
+        entries (dict): path -> (id, size, crc32) of the latest entry of each file
+    """
+    entries = {}
+    journal_dir = Path(journal_dir)
+    if not journal_dir.exists():
+        return entries
+    for path in sorted(journal_dir.glob("*.tsv")):
+        with open(path, "r") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if not line.endswith("\n") or len(fields) != 4:
+                    continue
+                uid, filename, size, crc = fields
+                entries[filename] = (uid, int(size), crc)
+    return entries
+
+
+def is_valid(entries, path, checksum=False):
+    """Whether the file at `path` matches its journal entry.
+
+    Args:
+        entries (dict): journal entries returned by `read_journal`
+        path (str): path to the output file
+        checksum (bool): whether to compare the CRC32 checksum in addition
+            to the file size
+    """
+    entry = entries.get(str(path))
+    if entry is None:
+        return False
+    try:
+        if os.path.getsize(path) != entry[1]:
+            return False
+    except OSError:
+        return False
+    return not checksum or file_checksum(path) == entry[2]
+
+
+def find_completed(rows, get_paths, journal_dir, checksum=False, num_threads=8):
+    """Find the rows whose outputs have all been written completely.
+
+    Args:
+        rows (list): list of meta dictionaries (rows of meta.tsv)
+        get_paths (callable): function returning the output paths of a row
+        journal_dir (str): directory of the journal files
+        checksum (bool): whether to verify the CRC32 checksum of each file
+            (reads all outputs) instead of only the file size
+        num_threads (int): number of threads used for verifying the files
+    Returns:
+        completed (list): bool for each row
+    """
+    entries = read_journal(journal_dir)
+    if len(entries) == 0:
+        return [False] * len(rows)
+
+    def check(row):
+        return all(is_valid(entries, path, checksum) for path in get_paths(row))
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        return list(executor.map(check, rows, chunksize=256))
@@ -0,0 +1,254 @@
+"""Reading and writing meta files of the simulation.
+
+Two formats are supported:
+    - meta.tsv: one line per sample, where the applied augmentations are encoded
+      as a single string, e.g., `wind_noise(threshold=...,...)/codec(format=...)`
+    - meta.parquet: a typed columnar file, where each augmentation parameter is
+      stored in its own column (and packet-loss indices in a list column), so that
+      no string parsing is needed and only the required columns can be loaded.
+"""
+
+import ast
+import re
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# (column name, parameter name, type) of each augmentation
+AUGMENTATION_COLUMNS = {
+    "wind_noise": (
+        ("wind_noise_threshold", "threshold", "float64"),
+        ("wind_noise_ratio", "ratio", "float64"),
+        ("wind_noise_attack", "attack", "float64"),
+        ("wind_noise_release", "release", "float64"),
+        ("wind_noise_sc_gain", "sc_gain", "float64"),
+        ("wind_noise_clipping", "clipping", "bool"),
+        ("wind_noise_clipping_threshold", "clipping_threshold", "float64"),
+    ),
+    "bandwidth_limitation": (
+        ("bandwidth_limitation_res_type", "res_type", "string"),
+        ("bandwidth_limitation_fs_new", "fs_new", "int32"),
+    ),
+    "clipping": (
+        ("clipping_min", "min", "float64"),
+        ("clipping_max", "max", "float64"),
+    ),
+    "codec": (
+        ("codec_format", "format", "string"),
+        ("codec_encoder", "encoder", "string"),
+        ("codec_qscale", "qscale", "int32"),
+    ),
+    "packet_loss": (
+        ("packet_loss_indices", "packet_loss_indices", "list<int32>"),
+        ("packet_loss_duration_ms", "packet_duration_ms", "int32"),
+    ),
+}
+
+# type of the columns shared by both formats (others are strings)
+BASE_COLUMN_TYPES = {"snr_dB": "float64", "fs": "int32", "length": "int64"}
+
+# columns read by the simulation (besides the augmentations), i.e., without the
+# speaker IDs and transcripts
+SIMULATION_COLUMNS = (
+    "id",
+    "noisy_path",
+    "clean_path",
+    "speech_uid",
+    "noise_uid",
+    "snr_dB",
+    "rir_uid",
+    "fs",
+    "length",
+)
+
+
+def parse_augmentation(augmentation):
+    """Parse a single augmentation string in meta.tsv.
+
+    Args:
+        augmentation (str): e.g., "clipping(min=0.05,max=0.95)"
+    Returns:
+        name (str): name of the augmentation
+        params (dict): typed parameters of the augmentation
+    """
+    if augmentation.startswith("wind_noise"):
+        match = re.fullmatch(
+            r"wind_noise\(threshold=(.*),ratio=(.*),attack=(.*),release=(.*),"
+            r"sc_gain=(.*),clipping=(.*),clipping_threshold=(.*)\)",
+            augmentation,
+        )
+        threshold, ratio, attack, release, sc_gain, clipping, clip_thres = (
+            match.groups()
+        )
+        return "wind_noise", {
+            "threshold": float(threshold),
+            "ratio": float(ratio),
+            "attack": float(attack),
+            "release": float(release),
+            "sc_gain": float(sc_gain),
+            "clipping": clipping == "True",
+            "clipping_threshold": float(clip_thres),
+        }
+    elif augmentation.startswith("bandwidth_limitation"):
+        match = re.fullmatch(r"bandwidth_limitation-(.*)->(\d+)", augmentation)
+        res_type, fs_new = match.groups()
+        return "bandwidth_limitation", {"res_type": res_type, "fs_new": int(fs_new)}
+    elif augmentation.startswith("clipping"):
+        match = re.fullmatch(r"clipping\(min=(.*),max=(.*)\)", augmentation)
+        min_, max_ = map(float, match.groups())
+        return "clipping", {"min": min_, "max": max_}
+    elif augmentation.startswith("codec"):
+        match = re.fullmatch(
+            r"codec\(format=(.*),encoder=(.*),qscale=(.*)\)", augmentation
+        )
+        format, encoder, qscale = match.groups()
+        return "codec", {"format": format, "encoder": encoder, "qscale": int(qscale)}
+    elif augmentation.startswith("packet_loss"):
+        match = re.fullmatch(
+            r"packet_loss\(packet_loss_indices=(.*),packet_duration_ms=(.*)\)",
+            augmentation,
+        )
+        packet_loss_indices, packet_duration_ms = match.groups()
+        return "packet_loss", {
+            # convert string to list
+            "packet_loss_indices": ast.literal_eval(packet_loss_indices),
+            "packet_duration_ms": int(packet_duration_ms),
+        }
+    raise NotImplementedError(augmentation)
+
+
+def parse_augmentations(augmentation):
+    """Parse the augmentation field of a row in meta.tsv.
+
+    Args:
+        augmentation (str): multiple augmentations separated by "/"
+    Returns:
+        augmentations (list): list of (name, params) in the order of application
+    """
+    return [
+        parse_augmentation(aug)
+        for aug in augmentation.split("/")
+        if aug not in ("none", "")
+    ]
+
+
+def get_augmentations(info):
+    """Return the parsed augmentations of a row read by `read_meta`."""
+    if "augmentations" in info:
+        return info["augmentations"]
+    return parse_augmentations(info["augmentation"])
+
+
+def get_schema(headers):
+    assert pa is not None, "pyarrow is required for the parquet meta format"
+    types = {
+        "float64": pa.float64(),
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "bool": pa.bool_(),
+        "string": pa.string(),
+        "list<int32>": pa.list_(pa.int32()),
+    }
+    fields = [pa.field(h, types[BASE_COLUMN_TYPES.get(h, "string")]) for h in headers]
+    fields.append(pa.field("augmentation_names", pa.list_(pa.string())))
+    for columns in AUGMENTATION_COLUMNS.values():
+        fields += [pa.field(col, types[typ]) for col, _, typ in columns]
+    return pa.schema(fields)
+
+
+def rows_to_table(rows, schema):
+    """Convert rows of meta.tsv (dicts of strings) into a typed table."""
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        for name, typ in BASE_COLUMN_TYPES.items():
+            if name in row:
+                row[name] = float(row[name]) if typ == "float64" else int(row[name])
+        augmentations = dict(parse_augmentations(row["augmentation"]))
+        row["augmentation_names"] = list(augmentations.keys())
+        for aug, aug_columns in AUGMENTATION_COLUMNS.items():
+            params = augmentations.get(aug, {})
+            for col, key, _ in aug_columns:
+                row[col] = params.get(key)
+        for name in schema.names:
+            columns[name].append(row[name])
+    return pa.table(columns, schema=schema)
+
+
+def write_parquet(lines, headers, parquet_path, batch_size=100000):
+    """Write rows of meta.tsv into a typed parquet file in a streaming manner.
+
+    Args:
+        lines (iterable): lines of meta.tsv (without the header line)
+        headers (list): column names of meta.tsv
+        parquet_path (str): path to the output parquet file
+        batch_size (int): number of rows converted at a time
+    """
+    assert pq is not None, "pyarrow is required for the parquet meta format"
+    schema = get_schema(headers)
+    with pq.ParquetWriter(parquet_path, schema) as writer:
+        rows = []
+        for line in lines:
+            rows.append(dict(zip(headers, line.strip().split("\t"))))
+            if len(rows) == batch_size:
+                writer.write_table(rows_to_table(rows, schema))
+                rows = []
+        if rows:
+            writer.write_table(rows_to_table(rows, schema))
+
+
+def get_simulation_columns(store_noise=False):
+    """Return the parquet columns needed to simulate the samples of a meta file."""
+    columns = list(SIMULATION_COLUMNS)
+    if store_noise:
+        columns.append("noise_path")
+    columns.append("augmentation_names")
+    columns += [col for cols in AUGMENTATION_COLUMNS.values() for col, _, _ in cols]
+    return columns
+
+
+def read_meta(path, columns=None):
+    """Read a meta file (meta.tsv or meta.parquet).
+
+    Args:
+        path (str): path to the meta file
+        columns (list): [optional] columns to load (only effective for parquet)
+    Returns:
+        meta (list): list of dicts, one per sample. For parquet files,
+            the parsed augmentations are available in the "augmentations" key
+            if all augmentation columns are loaded.
+    """
+    if not str(path).endswith(".parquet"):
+        with open(path, "r") as f:
+            headers = next(f).strip().split("\t")
+            return [dict(zip(headers, line.strip().split("\t"))) for line in f]
+
+    assert pq is not None, "pyarrow is required for the parquet meta format"
+    meta = pq.read_table(path, columns=columns).to_pylist()
+    aug_columns = [col for cols in AUGMENTATION_COLUMNS.values() for col, _, _ in cols]
+    if meta and all(col in meta[0] for col in ["augmentation_names"] + aug_columns):
+        for row in meta:
+            params = {col: row.pop(col) for col in aug_columns}
+            row["augmentations"] = [
+                (aug, {key: params[col] for col, key, _ in AUGMENTATION_COLUMNS[aug]})
+                for aug in row.pop("augmentation_names")
+            ]
+    return meta
+
+
+if __name__ == "__main__":
+    # convert an existing meta.tsv into meta.parquet
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("meta_tsv", type=str, help="Path to the input meta.tsv")
+    parser.add_argument("meta_parquet", type=str, help="Path to the output parquet")
+    args = parser.parse_args()
+
+    with open(args.meta_tsv, "r") as f:
+        headers = next(f).strip().split("\t")
+        write_parquet(f, headers, args.meta_parquet)
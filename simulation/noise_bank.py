@@ -0,0 +1,277 @@
+"""Memory-mapped noise bank.
+
+All noise samples listed in `noise_scps`/`wind_noise_scps` are decoded once and
+packed into one flat binary file per sampling rate. An index maps each noise uid
+to its (fs, offset, length) in the corresponding file. Workers memory-map the
+binary files, so random noise segments can be sliced without decoding the
+original FLAC/WAV files and the pages are shared through the OS page cache.
+
+Next to the audio, an energy index stores the energy of each hop of FRAME_SHIFT
+samples of every noise sample (one flat float64 file per sampling rate, in the
+same order as the audio), from which the non-silent power of a noise segment is
+estimated without reading its samples (`streaming.indexed_power`).
+
+Usage:
+    python simulation/noise_bank.py --config conf/simulation_train.yaml \
+        --bank_dir data/noise_bank --dtype float32 --nj 8
+    # add the energy index to a bank built without it
+    python simulation/noise_bank.py --config conf/simulation_train.yaml \
+        --bank_dir data/noise_bank --energy_index_only true
+"""
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+from streaming import FRAME_SHIFT, get_hop_energy
+from tqdm import tqdm
+
+# same scale as soundfile uses for reading int16 audio as float
+INT16_SCALE = 32768.0
+
+
+def to_float(audio, dtype="float64"):
+    """Cast (a slice of) a noise sample read from the bank to a float dtype.
+
+    Samples of int16 banks are scaled to [-1, 1), so that only the slice that
+    is actually used is converted.
+    """
+    if audio.dtype == np.int16:
+        return np.divide(audio, INT16_SCALE, dtype=dtype)
+    return audio.astype(dtype, copy=False)
+
+
+class NoiseBank:
+    def __init__(self, bank_dir):
+        """Open a noise bank built by this script.
+
+        Args:
+            bank_dir (str): directory containing `info.json`, `index.tsv`
+                and the binary files of each sampling rate
+        """
+        self.bank_dir = Path(bank_dir)
+        with open(self.bank_dir / "info.json", "r") as f:
+            info = json.load(f)
+        self.dtype = np.dtype(info["dtype"])
+        self.files = {int(fs): name for fs, name in info["files"].items()}
+        self.index = {}
+        with open(self.bank_dir / "index.tsv", "r") as f:
+            headers = next(f).strip().split("\t")
+            for line in f:
+                dic = dict(zip(headers, line.strip().split("\t")))
+                self.index[dic["uid"]] = (
+                    int(dic["fs"]),
+                    int(dic["offset"]),
+                    int(dic["length"]),
+                )
+        # the energy index is optional (banks built before it was added)
+        self.energy_files = {}
+        if info.get("frame_shift") == FRAME_SHIFT:
+            self.energy_files = {
+                int(fs): name for fs, name in info["energy_files"].items()
+            }
+        self.hop_offsets = get_hop_offsets(self.index)
+        # memory maps are opened lazily, i.e., in each worker process
+        self.arrays = {}
+        self.energy_arrays = {}
+
+    def __contains__(self, uid):
+        return uid in self.index
+
+    def get_array(self, fs):
+        if fs not in self.arrays:
+            self.arrays[fs] = np.memmap(
+                self.bank_dir / self.files[fs], dtype=self.dtype, mode="r"
+            )
+        return self.arrays[fs]
+
+    def get_energy_array(self, fs):
+        if fs not in self.energy_arrays:
+            self.energy_arrays[fs] = np.memmap(
+                self.bank_dir / self.energy_files[fs], dtype=np.float64, mode="r"
+            )
+        return self.energy_arrays[fs]
+
+    def read_energy(self, uid, fs=None):
+        """Read the energy of each hop of FRAME_SHIFT samples of a noise sample.
+
+        Args:
+            uid (str): noise uid
+            fs (int): target sampling rate in Hz (None to keep the original one)
+        Returns:
+            energy (np.ndarray): read-only view into the energy index
+                (ceil(Time / FRAME_SHIFT),), or None if the bank has no energy
+                index or the sample would be resampled to `fs`
+        """
+        fs_, _, length = self.index[uid]
+        if fs_ not in self.energy_files or (fs is not None and fs != fs_):
+            return None
+        offset = self.hop_offsets[uid]
+        return self.get_energy_array(fs_)[offset : offset + -(-length // FRAME_SHIFT)]
+
+    def read(self, uid, fs=None):
+        """Read a noise sample from the bank.
+
+        Args:
+            uid (str): noise uid
+            fs (int): target sampling rate in Hz (None to keep the original one)
+        Returns:
+            audio (np.ndarray): noise sample (1, Time). If no resampling is
+                needed, this is a read-only view into the memory map in the
+                stored dtype, which is converted with `to_float`.
+            fs (int): sampling rate in Hz
+        """
+        fs_, offset, length = self.index[uid]
+        audio = self.get_array(fs_)[None, offset : offset + length]
+        if fs is not None and fs != fs_:
+            audio = librosa.resample(
+                to_float(audio, np.float64),
+                orig_sr=fs_,
+                target_sr=fs,
+                res_type="soxr_hq",
+            )
+            return audio, fs
+        return audio, fs_
+
+
+def get_hop_offsets(index):
+    """Return the offset of each noise sample in the energy file of its fs.
+
+    Args:
+        index (dict): uid -> (fs, offset, length) of the noise bank
+    Returns:
+        hop_offsets (dict): uid -> offset in hops
+    """
+    hop_offsets, next_offsets = {}, {}
+    for uid, (fs, _, length) in sorted(index.items(), key=lambda item: item[1]):
+        hop_offsets[uid] = next_offsets.get(fs, 0)
+        next_offsets[fs] = hop_offsets[uid] + -(-length // FRAME_SHIFT)
+    return hop_offsets
+
+
+def build_energy_index(bank_dir):
+    """Compute the energy index of a noise bank and add it to `info.json`.
+
+    Args:
+        bank_dir (str): directory of the noise bank
+    """
+    bank_dir = Path(bank_dir)
+    bank = NoiseBank(bank_dir)
+    energy_files, writers = {}, {}
+    for uid in sorted(bank.index, key=lambda uid: bank.index[uid]):
+        fs = bank.index[uid][0]
+        if fs not in writers:
+            energy_files[fs] = f"energy_{fs}.float64"
+            writers[fs] = open(bank_dir / energy_files[fs], "wb")
+        audio = to_float(bank.read(uid)[0], np.float64)
+        assert writers[fs].tell() == bank.hop_offsets[uid] * 8, uid
+        writers[fs].write(get_hop_energy(audio)[0].tobytes())
+    for writer in writers.values():
+        writer.close()
+
+    with open(bank_dir / "info.json", "r") as f:
+        info = json.load(f)
+    info["frame_shift"] = FRAME_SHIFT
+    info["energy_files"] = energy_files
+    with open(bank_dir / "info.json", "w") as f:
+        json.dump(info, f, indent=2)
+
+
+def load_noise(audio_path, dtype):
+    audio, fs = sf.read(audio_path, always_2d=True)
+    # simulation always uses the first channel of noise samples
+    audio = audio[:, 0]
+    if dtype == "int16":
+        audio = np.clip(np.round(audio * INT16_SCALE), -32768, 32767)
+    return audio.astype(dtype), fs
+
+
+def build_noise_bank(scps, bank_dir, dtype="float32", nj=8):
+    """Pack all noise samples in the given scp files into a noise bank.
+
+    Args:
+        scps (list): scp files (three columns per line: uid, fs, audio_path)
+        bank_dir (str): output directory
+        dtype (str): storage data type ("float32" or "int16")
+        nj (int): number of parallel workers for decoding
+    """
+    assert dtype in ("float32", "int16"), dtype
+    bank_dir = Path(bank_dir)
+    bank_dir.mkdir(parents=True, exist_ok=True)
+
+    samples, uids = [], set()
+    for scp in scps:
+        with open(scp, "r") as f:
+            for line in f:
+                uid, fs, audio_path = line.strip().split()
+                assert uid not in uids, (uid, fs)
+                uids.add(uid)
+                samples.append((uid, int(fs), audio_path))
+
+    files, writers, offsets = {}, {}, {}
+    with open(bank_dir / "index.tsv", "w") as f_index, ProcessPoolExecutor(
+        max_workers=nj
+    ) as executor:
+        f_index.write("uid\tfs\toffset\tlength\n")
+        loaded = executor.map(
+            load_noise,
+            [audio_path for _, _, audio_path in samples],
+            [dtype] * len(samples),
+            chunksize=16,
+        )
+        for (uid, _, audio_path), (audio, fs) in tqdm(
+            zip(samples, loaded), total=len(samples)
+        ):
+            if fs not in writers:
+                files[fs] = f"noise_{fs}.{dtype}"
+                writers[fs] = open(bank_dir / files[fs], "wb")
+                offsets[fs] = 0
+            writers[fs].write(audio.tobytes())
+            f_index.write(f"{uid}\t{fs}\t{offsets[fs]}\t{len(audio)}\n")
+            offsets[fs] += len(audio)
+    for writer in writers.values():
+        writer.close()
+
+    with open(bank_dir / "info.json", "w") as f:
+        json.dump({"dtype": dtype, "files": files}, f, indent=2)
+    build_energy_index(bank_dir)
+
+
+if __name__ == "__main__":
+    from espnet2.utils.types import str2bool
+    from generate_data_param import get_parser
+
+    parser = get_parser()
+    # parallel workers by default (parameter generation defaults to --nj 1)
+    parser.set_defaults(nj=8)
+    group = parser.add_argument_group(description="Noise bank related")
+    group.add_argument(
+        "--bank_dir",
+        type=str,
+        required=True,
+        help="Output directory for storing the noise bank",
+    )
+    group.add_argument(
+        "--dtype",
+        type=str,
+        default="float32",
+        choices=["float32", "int16"],
+        help="Data type of the stored noise samples",
+    )
+    group.add_argument(
+        "--energy_index_only",
+        type=str2bool,
+        default=False,
+        help="Only add the energy index to an existing noise bank",
+    )
+    args = parser.parse_args()
+    print(args)
+
+    if args.energy_index_only:
+        build_energy_index(args.bank_dir)
+    else:
+        scps = list(args.noise_scps or []) + list(args.wind_noise_scps or [])
+        build_noise_bank(scps, args.bank_dir, dtype=args.dtype, nj=args.nj)
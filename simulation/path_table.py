@@ -0,0 +1,108 @@
+"""Memory-mapped uid -> audio path tables shared by the simulation workers.
+
+Passing plain dictionaries to `process_map` pickles the full tables again with
+every chunk of rows. Instead, each table is written once into a directory of
+.npy files and memory-mapped by the workers, so that the pages are shared
+through the OS page cache:
+    - uids.npy: sorted uids as fixed-width byte strings; the integer id of a
+      uid is its position in this array
+    - offsets.npy: start offset of the path of each id in paths.npy (N + 1)
+    - paths.npy: UTF-8 encoded paths concatenated into a flat byte array
+
+A `PathTable` is pickled as a reference to its directory, and unpickling it
+returns the instance already opened by the current process.
+"""
+
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+
+class PathTable(Mapping):
+    """Read-only mapping from uids to audio paths backed by memory maps."""
+
+    def __init__(self, table_dir):
+        """Open a table written by `write_path_table`.
+
+        Args:
+            table_dir (str): directory containing uids.npy, offsets.npy and
+                paths.npy
+        """
+        self.table_dir = Path(table_dir)
+        # memory maps are opened lazily, i.e., in each worker process
+        self.arrays = None
+
+    def get_arrays(self):
+        if self.arrays is None:
+            self.arrays = tuple(
+                np.load(self.table_dir / f"{name}.npy", mmap_mode="r")
+                for name in ("uids", "offsets", "paths")
+            )
+        return self.arrays
+
+    def index(self, uid):
+        """Return the integer id of `uid`, or -1 if it is not in the table."""
+        uids = self.get_arrays()[0]
+        key = uid.encode("utf-8")
+        if len(uids) == 0 or len(key) > uids.dtype.itemsize:
+            return -1
+        idx = int(np.searchsorted(uids, key))
+        if idx < len(uids) and uids[idx] == key:
+            return idx
+        return -1
+
+    def path(self, idx):
+        """Return the audio path of the integer id `idx`."""
+        _, offsets, paths = self.get_arrays()
+        return paths[offsets[idx] : offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def __getitem__(self, uid):
+        idx = self.index(uid)
+        if idx < 0:
+            raise KeyError(uid)
+        return self.path(idx)
+
+    def __contains__(self, uid):
+        return self.index(uid) >= 0
+
+    def __iter__(self):
+        for uid in self.get_arrays()[0]:
+            yield uid.decode("utf-8")
+
+    def __len__(self):
+        return len(self.get_arrays()[0])
+
+    def __reduce__(self):
+        return open_path_table, (str(self.table_dir),)
+
+
+@lru_cache(maxsize=None)
+def open_path_table(table_dir):
+    """Return the `PathTable` of `table_dir` opened by the current process."""
+    return PathTable(table_dir)
+
+
+def write_path_table(dic, table_dir):
+    """Write a uid -> path dictionary into `table_dir` and open it.
+
+    Args:
+        dic (dict): uid -> audio path
+        table_dir (str): output directory
+    Returns:
+        table (PathTable): the written table
+    """
+    table_dir = Path(table_dir)
+    table_dir.mkdir(parents=True, exist_ok=True)
+    uids = sorted(uid.encode("utf-8") for uid in dic)
+    paths = [dic[uid.decode("utf-8")].encode("utf-8") for uid in uids]
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum([len(path) for path in paths], out=offsets[1:])
+    np.save(table_dir / "uids.npy", np.array(uids, dtype=bytes))
+    np.save(table_dir / "offsets.npy", offsets)
+    np.save(table_dir / "paths.npy", np.frombuffer(b"".join(paths), dtype=np.uint8))
+    table = open_path_table(str(table_dir))
+    # drop the memory maps of a previous table written to the same directory
+    table.arrays = None
+    return table
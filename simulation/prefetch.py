@@ -0,0 +1,73 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_nbytes(inputs):
+    """Return the total size of the arrays in `inputs` (None entries are skipped)."""
+    return sum(x.nbytes for x in inputs if x is not None)
+
+
+def prefetch(rows, read_func, depth=4, max_mb=512.0, num_threads=2):
+    """Iterate over rows while reading the inputs of the next rows in background.
+
+    Up to `depth` rows ahead of the current one are read by `num_threads`
+    threads (soundfile releases the GIL while decoding). No further reads are
+    started while the inputs read ahead exceed `max_mb`, where each read still in
+    flight counts with the mean size of the inputs read so far.
+
+    Args:
+        rows (list): rows of the meta file assigned to the current worker
+        read_func (callable): function returning a tuple of arrays for a row
+        depth (int): maximum number of rows read ahead
+        max_mb (float): memory budget in MB of the prefetched inputs
+        num_threads (int): number of reader threads
+    Yields:
+        row (dict): the next row
+        inputs (tuple): the output of `read_func(row)`
+    """
+    max_bytes = max_mb * 1024 * 1024
+    rows = iter(rows)
+    queue = deque()
+    consumed_bytes, num_consumed = 0, 0
+
+    def fill():
+        while len(queue) < depth:
+            ready = [
+                get_nbytes(future.result()) for _, future in queue if future.done()
+            ]
+            in_flight = len(queue) - len(ready)
+            num_read = num_consumed + len(ready)
+            if num_read == 0 and in_flight >= num_threads:
+                # the size of the inputs is unknown until the first read finished
+                break
+            estimate = (consumed_bytes + sum(ready)) / max(num_read, 1)
+            if sum(ready) + in_flight * estimate > max_bytes:
+                break
+            row = next(rows, None)
+            if row is None:
+                break
+            queue.append((row, executor.submit(read_func, row)))
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        fill()
+        while queue:
+            row, future = queue.popleft()
+            fill()
+            inputs = future.result()
+            consumed_bytes += get_nbytes(inputs)
+            num_consumed += 1
+            yield row, inputs
+
+
+def process_batch_with_prefetch(
+    batch, func=None, read_func=None, depth=4, max_mb=512.0, num_threads=2
+):
+    """Process all rows in a batch sequentially, prefetching the inputs.
+
+    `func` is called as `func(row, inputs=inputs)` with the output of
+    `read_func(row)`.
+    """
+    return [
+        func(row, inputs=inputs)
+        for row, inputs in prefetch(batch, read_func, depth, max_mb, num_threads)
+    ]
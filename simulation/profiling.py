@@ -0,0 +1,104 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+# stages recorded by the simulation (augmentations are recorded by their names)
+STAGES = (
+    "decode",
+    "resample",
+    "reverberation",
+    "mix_noise",
+    "wind_noise",
+    "bandwidth_limitation",
+    "clipping",
+    "codec",
+    "packet_loss",
+    "normalization",
+    "streaming",
+    "save",
+)
+
+
+class StageTimer:
+    """Accumulate the wall time of each processing stage of a sample."""
+
+    def __init__(self):
+        self.times = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.times[stage] = self.times.get(stage, 0.0) + elapsed
+
+    def record(self, info):
+        """Return the profiling record of the sample described by `info`."""
+        fs = int(info["fs"])
+        return {
+            "id": info["id"],
+            "fs": fs,
+            "duration": int(info["length"]) / fs,
+            "total": time.perf_counter() - self.start,
+            **self.times,
+        }
+
+
+class NullTimer:
+    """No-op replacement of `StageTimer` used when profiling is disabled."""
+
+    def __call__(self, stage):
+        return nullcontext()
+
+
+NULL_TIMER = NullTimer()
+
+
+def write_profile(records, path):
+    """Write the per-sample profiling records into a TSV file.
+
+    Stages that were not run for a sample are left empty.
+    """
+    headers = ["id", "fs", "duration", "total", *STAGES]
+    with open(path, "w") as f:
+        f.write("\t".join(headers) + "\n")
+        for rec in records:
+            values = [rec["id"], str(rec["fs"]), f"{rec['duration']:.3f}"]
+            values += [f"{rec[k]:.6f}" if k in rec else "" for k in ["total", *STAGES]]
+            f.write("\t".join(values) + "\n")
+
+
+def report_profile(records, num_slowest=10):
+    """Print the real-time factor and latency of each stage and the slowest samples.
+
+    The real-time factor (RTF) of a stage is its total wall time divided by the
+    total duration of the samples it was run for.
+    """
+    print(
+        f"[profile] {'stage':<22}{'samples':>9}{'total_sec':>11}{'RTF':>9}"
+        f"{'p50_ms':>10}{'p95_ms':>10}"
+    )
+    for stage in ("total", *STAGES):
+        recs = [rec for rec in records if stage in rec]
+        if len(recs) == 0:
+            continue
+        times = np.array([rec[stage] for rec in recs])
+        duration = sum(rec["duration"] for rec in recs)
+        p50, p95 = np.percentile(times, [50, 95]) * 1000
+        print(
+            f"[profile] {stage:<22}{len(recs):>9}{times.sum():>11.1f}"
+            f"{times.sum() / max(duration, 1e-8):>9.4f}{p50:>10.1f}{p95:>10.1f}"
+        )
+
+    print(f"[profile] {num_slowest} slowest samples:")
+    for rec in sorted(records, key=lambda rec: rec["total"])[::-1][:num_slowest]:
+        slowest_stage = max(STAGES, key=lambda k: rec.get(k, 0.0))
+        print(
+            f"[profile]   {rec['id']}: {rec['total']:.3f} sec "
+            f"({rec['duration']:.1f} sec audio at {rec['fs']} Hz, "
+            f"mostly {slowest_stage}: {rec.get(slowest_stage, 0.0):.3f} sec)"
+        )
@@ -0,0 +1,294 @@
+"""Resampling with cached filters for the bandwidth limitation augmentation.
+
+`librosa.resample` designs the resampling filter again in every call, and its
+"kaiser_best"/"kaiser_fast" types evaluate the interpolated sinc filter for
+every output sample. For the rational ratios between the rates in
+SAMPLE_RATES, each resampler is a fixed polyphase FIR filter, so the
+`ResampleEngine` designs the filter of each (fs, fs_new, res_type) once per
+worker and runs it with `scipy.signal.upfirdn`:
+    - kaiser_best, kaiser_fast: the windowed-sinc tables of resampy (used by
+      librosa), linearly interpolated at the phases of the ratio
+    - polyphase: the Kaiser-window FIR designed by `scipy.signal.resample_poly`
+    - scipy, fft: FFT resampling (no filter to design), where resampling down
+      and back up is fused into a single truncation of the spectrum
+The outputs match `librosa.resample` up to floating-point rounding.
+
+Alternatively, all types can be mapped to the (much faster, but not identical)
+soxr resampler with a quality similar to that of each type.
+
+Usage (parity with librosa and throughput of each resampling type):
+    python simulation/resample_engine.py --fs 48000 16000 --duration 5
+"""
+
+import math
+from collections import OrderedDict
+
+import librosa
+import numpy as np
+import scipy.fft
+import scipy.signal
+import soxr
+
+# quality of soxr used in place of each resampling type
+SOXR_QUALITIES = {
+    "kaiser_best": "VHQ",
+    "kaiser_fast": "HQ",
+    "scipy": "VHQ",
+    "fft": "VHQ",
+    "polyphase": "HQ",
+}
+
+
+def get_output_length(length, fs, fs_new):
+    """Return the number of samples returned by `librosa.resample`."""
+    return int(np.ceil(length * (float(fs_new) / fs)))
+
+
+def fix_length(x, length):
+    """Truncate or zero-pad the last axis of `x` to `length` samples."""
+    if x.shape[-1] >= length:
+        return x[..., :length]
+    pad = [(0, 0)] * (x.ndim - 1) + [(0, length - x.shape[-1])]
+    return np.pad(x, pad)
+
+
+def design_polyphase_filter(up, down):
+    """Design the FIR filter of `scipy.signal.resample_poly` (default window)."""
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return scipy.signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+
+
+def design_kaiser_filter(up, down, res_type):
+    """Build the upfirdn filter equivalent to `resampy.resample`.
+
+    resampy weights the input sample j for the output sample t with the
+    windowed-sinc table at the distance t * down / up - j, so the weight only
+    depends on q = t * down - j * up. The left (q >= 0) and right (q < 0) wings
+    are read from the table in the same way as in resampy.
+
+    Returns:
+        h (np.ndarray): filter for `scipy.signal.upfirdn(h, x, up, down)`
+        delay (int): number of leading output samples to discard
+    """
+    # optional dependency (only needed for the kaiser_* types, as in librosa)
+    import resampy
+
+    interp_win, num_table, _ = resampy.filters.get_filter(res_type)
+    num_table = int(num_table)
+    ratio = up / down
+    if ratio < 1:
+        interp_win = ratio * interp_win
+    interp_delta = np.diff(interp_win, append=interp_win[-1])
+    scale = min(1.0, ratio)
+    index_step = int(scale * num_table)
+    nwin = len(interp_win)
+
+    def wing(frac):
+        # weights of the samples on one side of each phase
+        index_frac = frac * num_table
+        offset = int(index_frac)
+        eta = index_frac - offset
+        idx = offset + index_step * np.arange((nwin - offset) // index_step)
+        return interp_win[idx] + eta * interp_delta[idx]
+
+    taps = {}
+    for r in range(up):
+        frac = scale * r / up
+        for i, w in enumerate(wing(frac)):
+            taps[i * up + r] = w
+        for k, w in enumerate(wing(scale - frac)):
+            taps[r - (k + 1) * up] = w
+    q_min, q_max = min(taps), max(taps)
+    # put the output samples at multiples of `down` in the filter
+    delay = -(q_min // down)
+    h = np.zeros(delay * down + q_max + 1)
+    q = np.fromiter(taps.keys(), dtype=np.int64, count=len(taps))
+    h[q + delay * down] = np.fromiter(taps.values(), dtype=np.float64, count=len(taps))
+    return h, delay
+
+
+def upfirdn_length(len_h, len_x, up, down):
+    return ((len_x - 1) * up + len_h - 1) // down + 1
+
+
+class ResampleEngine:
+    """Resampling with a per-process LRU cache of designed filters."""
+
+    def __init__(self, max_cache_size=128):
+        """Initialize the engine.
+
+        Args:
+            max_cache_size (int): maximum number of cached filters
+        """
+        self.max_cache_size = max_cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_filter(self, fs, fs_new, res_type, dtype):
+        key = (fs, fs_new, res_type, np.dtype(dtype).str)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.misses += 1
+        g = math.gcd(fs, fs_new)
+        up, down = fs_new // g, fs // g
+        if res_type == "polyphase":
+            # cast as in resample_poly, which scales a copy by `up`
+            filt = design_polyphase_filter(up, down).astype(dtype)
+        else:
+            h, delay = design_kaiser_filter(up, down, res_type)
+            filt = (h.astype(dtype), delay)
+        if self.max_cache_size > 0:
+            self.cache[key] = filt
+            if len(self.cache) > self.max_cache_size:
+                self.cache.popitem(last=False)
+        return filt
+
+    def resample_kaiser(self, x, fs, fs_new, res_type):
+        h, delay = self.get_filter(fs, fs_new, res_type, x.dtype)
+        g = math.gcd(fs, fs_new)
+        up, down = fs_new // g, fs // g
+        # resampy truncates the output length
+        length = int(x.shape[-1] * (float(fs_new) / fs))
+        # the input is implicitly zero-padded on both sides
+        missing = delay + length - upfirdn_length(len(h), x.shape[-1], up, down)
+        if missing > 0:
+            h = np.pad(h, (0, missing * down))
+        y = scipy.signal.upfirdn(h, x, up, down, axis=-1)
+        return y[..., delay : delay + length]
+
+    def resample(self, x, fs, fs_new, res_type="kaiser_best", use_soxr=False):
+        """Resample the last axis of `x` in the same way as `librosa.resample`.
+
+        Args:
+            x (np.ndarray): input signal (..., Time)
+            fs (int): sampling rate of the input in Hz
+            fs_new (int): sampling rate of the output in Hz
+            res_type (str): resampling type of librosa
+            use_soxr (bool): whether to use soxr with the quality in
+                SOXR_QUALITIES instead of the filters of `res_type`
+        Returns:
+            y (np.ndarray): resampled signal (..., ceil(Time * fs_new / fs))
+        """
+        if fs == fs_new:
+            return x
+        length = get_output_length(x.shape[-1], fs, fs_new)
+        if use_soxr and res_type in SOXR_QUALITIES:
+            y = soxr.resample(x.T, fs, fs_new, quality=SOXR_QUALITIES[res_type]).T
+        elif res_type in ("scipy", "fft"):
+            y = scipy.signal.resample(x, length, axis=-1)
+        elif res_type == "polyphase":
+            g = math.gcd(fs, fs_new)
+            h = self.get_filter(fs, fs_new, res_type, x.dtype)
+            y = scipy.signal.resample_poly(x, fs_new // g, fs // g, axis=-1, window=h)
+        elif res_type in ("kaiser_best", "kaiser_fast"):
+            y = self.resample_kaiser(x, fs, fs_new, res_type)
+        else:
+            return librosa.resample(x, orig_sr=fs, target_sr=fs_new, res_type=res_type)
+        return np.asarray(fix_length(y, length), dtype=x.dtype)
+
+    def resample_fft_down_up(self, x, fs, fs_new):
+        """Resample down to `fs_new` and back to `fs` with a single FFT pair.
+
+        Equivalent to two calls of `scipy.signal.resample`: the spectrum of the
+        intermediate signal is the truncated input spectrum (with real DC and
+        Nyquist bins), so only the bins below fs_new / 2 are kept.
+        """
+        length_new = get_output_length(x.shape[-1], fs, fs_new)
+        length_back = get_output_length(length_new, fs_new, fs)
+        X = scipy.fft.rfft(x, axis=-1)
+        Y = np.zeros(x.shape[:-1] + (length_back // 2 + 1,), dtype=X.dtype)
+        Y[..., : length_new // 2 + 1] = X[..., : length_new // 2 + 1]
+        Y[..., 0] = Y[..., 0].real
+        if length_new % 2 == 0:
+            Y[..., length_new // 2] = Y[..., length_new // 2].real
+        Y *= length_back / x.shape[-1]
+        y = scipy.fft.irfft(Y, n=length_back, axis=-1)
+        return np.asarray(y[..., : x.shape[-1]], dtype=x.dtype)
+
+    def down_up(self, x, fs, fs_new, res_type="kaiser_best", use_soxr=False):
+        """Resample down to `fs_new` and back to `fs` (bandwidth limitation).
+
+        Args:
+            x (np.ndarray): input signal (..., Time)
+            fs (int): sampling rate of the input in Hz
+            fs_new (int): effective sampling rate in Hz
+            Other arguments are the same as in `resample`.
+        Returns:
+            y (np.ndarray): bandwidth-limited signal with the same shape as `x`
+        """
+        if fs == fs_new:
+            return x
+        if not use_soxr and res_type in ("scipy", "fft"):
+            return self.resample_fft_down_up(x, fs, fs_new)
+        y = self.resample(x, fs, fs_new, res_type, use_soxr=use_soxr)
+        y = self.resample(y, fs_new, fs, res_type, use_soxr=use_soxr)
+        return y[..., : x.shape[-1]]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+if __name__ == "__main__":
+    # Parity with librosa and throughput of each resampling type
+    import argparse
+    import sys
+    import time
+
+    from benchmark_augmentations import synth_speech
+    from generate_data_param import RESAMPLE_METHODS, SAMPLE_RATES
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fs", type=int, nargs="+", default=[48000, 16000])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    args = parser.parse_args()
+
+    def run(func, x):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            y = func(x)
+        return y, args.repeat * args.duration / (time.perf_counter() - start)
+
+    def librosa_down_up(x, fs, fs_new, res_type):
+        y = librosa.resample(x, orig_sr=fs, target_sr=fs_new, res_type=res_type)
+        y = librosa.resample(y, orig_sr=fs_new, target_sr=fs, res_type=res_type)
+        return y[..., : x.shape[-1]]
+
+    rng = np.random.default_rng(0)
+    engine = ResampleEngine()
+    num_failed = 0
+    print(
+        f"{'case':<28}{'librosa x':>11}{'cached x':>10}{'soxr x':>10}"
+        f"{'max_err':>11}{'soxr_err':>11}"
+    )
+    for fs in args.fs:
+        x = synth_speech(fs, args.duration, rng)[None]
+        for fs_new in [f for f in SAMPLE_RATES if f < fs]:
+            for res_type in RESAMPLE_METHODS:
+                name = f"{res_type}-{fs}-{fs_new}"
+                ref, ref_speed = run(
+                    lambda x: librosa_down_up(x, fs, fs_new, res_type), x
+                )
+                # the first call designs the filter
+                engine.down_up(x, fs, fs_new, res_type)
+                y, speed = run(lambda x: engine.down_up(x, fs, fs_new, res_type), x)
+                y_soxr, soxr_speed = run(
+                    lambda x: engine.down_up(x, fs, fs_new, res_type, use_soxr=True),
+                    x,
+                )
+                err = np.max(np.abs(y - ref))
+                soxr_err = np.max(np.abs(y_soxr - ref))
+                failed = y.shape != ref.shape or err > args.atol
+                num_failed += failed
+                print(
+                    f"{name:<28}{ref_speed:>11.1f}{speed:>10.1f}{soxr_speed:>10.1f}"
+                    f"{err:>11.2e}{soxr_err:>11.2e}" + (" FAILED" if failed else "")
+                )
+    print("(speed in seconds of audio per second, i.e., x real time)")
+    sys.exit(1 if num_failed else 0)
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+import numpy as np
+import scipy.fft
+from rir_utils import estimate_early_rir, get_early_rir
+
+
+class ReverbEngine:
+    """Frequency-domain reverberation with a per-process LRU cache of RIR spectra.
+
+    The speech spectrum is computed once and multiplied with the spectra of both
+    the full RIR and the early RIR, so that the reverberant speech and the
+    (early-reverberant) reference speech are obtained in a single inverse FFT.
+    RIR spectra are cached by (rir_uid, fs, fft_size, dtype), which pays off when the
+    same RIRs are reused many times (`reuse_rir: true`). The cache is bounded by
+    the memory of the spectra, which grows with the FFT size (i.e., with the
+    length of the speech).
+
+    FFT sizes are rounded up to powers of two so that utterances of similar
+    lengths share the same cache entries. scipy.fft keeps float32 inputs in
+    single precision.
+    """
+
+    def __init__(self, max_size_mb=256.0, early_rir_sec: float = 0.05):
+        """Initialize the engine.
+
+        Args:
+            max_size_mb (float): memory budget of the cached RIR spectra in MB
+                (0 disables caching)
+            early_rir_sec (float): the duration in seconds that we count as early RIR
+        """
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.early_rir_sec = early_rir_sec
+        self.cache = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_fft_size(len_speech, len_rir):
+        len_full = len_speech + len_rir - 1
+        return 1 << int(np.ceil(np.log2(len_full)))
+
+    def get_rir_spectra(
+        self, rir_sample, fs, fft_size, rir_uid=None, rir_stop_sample=None
+    ):
+        """Return the stacked spectra of the full and early RIRs.
+
+        Args:
+            rir_sample (np.ndarray): a room impulse response (RIR) (Channel, Time)
+            fs (int): sampling rate in Hz
+            fft_size (int): FFT size
+            rir_uid (str): unique ID of the RIR used as the cache key
+                (if None, the result is not cached)
+            rir_stop_sample (np.ndarray): [optional] precomputed end of the early
+                RIR of each channel (Channel,), estimated from the RIR if None
+        Returns:
+            spectra (np.ndarray): spectra of the full and early RIRs
+                (2, Channel, fft_size // 2 + 1)
+        """
+        key = (rir_uid, fs, fft_size, rir_sample.dtype)
+        if rir_uid is not None and key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.misses += 1
+        if rir_stop_sample is None:
+            early_rir_sample = estimate_early_rir(
+                rir_sample, early_rir_sec=self.early_rir_sec, fs=fs
+            )
+        else:
+            early_rir_sample = get_early_rir(rir_sample, rir_stop_sample)
+        spectra = scipy.fft.rfft(np.stack([rir_sample, early_rir_sample]), n=fft_size)
+        if rir_uid is not None and spectra.nbytes <= self.max_bytes:
+            self.cache[key] = spectra
+            self.nbytes += spectra.nbytes
+            while self.nbytes > self.max_bytes:
+                _, old_spectra = self.cache.popitem(last=False)
+                self.nbytes -= old_spectra.nbytes
+        return spectra
+
+    def apply(self, speech_sample, rir_sample, fs, rir_uid=None, rir_stop_sample=None):
+        """Convolve the speech sample with the full RIR and the early RIR.
+
+        Args:
+            speech_sample (np.ndarray): a single speech sample (1, Time)
+            rir_sample (np.ndarray): a room impulse response (RIR) (Channel, Time)
+            fs (int): sampling rate in Hz
+            rir_uid (str): unique ID of the RIR used as the cache key
+            rir_stop_sample (np.ndarray): [optional] precomputed end of the early
+                RIR of each channel (Channel,)
+        Returns:
+            reverberant_sample (np.ndarray): reverberant speech (Channel, Time)
+            early_reverberant_sample (np.ndarray): speech convolved with the
+                early RIR, aligned with `reverberant_sample` (Channel, Time)
+        """
+        len_speech = speech_sample.shape[-1]
+        fft_size = self.get_fft_size(len_speech, rir_sample.shape[-1])
+        spectra = self.get_rir_spectra(
+            rir_sample, fs, fft_size, rir_uid=rir_uid, rir_stop_sample=rir_stop_sample
+        )
+        speech_spec = scipy.fft.rfft(speech_sample, n=fft_size)
+        out = scipy.fft.irfft(speech_spec * spectra, n=fft_size)[..., :len_speech]
+        return out[0], out[1]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "nbytes": self.nbytes}
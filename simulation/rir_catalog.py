@@ -0,0 +1,269 @@
+"""Precomputed catalog of room impulse responses (RIRs).
+
+For each RIR listed in `rir_scps`, the catalog stores the start sample and the
+end of the early RIR at each supported sampling rate, so that the simulation
+does not have to estimate them for every reverberant sample, as well as
+acoustic descriptors for filtering RIRs and breaking down simulated data:
+    - start_sample: first sample above 10% of the peak (`get_rir_start_samples`)
+    - early_stop_{fs}: end of the early RIR after resampling to `fs`, i.e., the
+      cut point used by `estimate_early_rir` in the simulation
+    - t60: reverberation time in seconds (Schroeder integration, extrapolated
+      from the decay between -5 and -25 dB)
+    - drr: direct-to-reverberant ratio in dB (direct path: +-2.5 ms around the peak)
+    - energy: sum of squares of the RIR
+
+Per-channel values are stored in (num_rirs, max_channels) arrays padded with -1
+(integers) or NaN (floats), together with the sorted uids, in a single .npz file.
+
+Usage:
+    python simulation/rir_catalog.py --config conf/simulation_train.yaml \
+        --catalog data/rir_catalog.npz --nj 8
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+import soundfile as sf
+from generate_data_param import SAMPLE_RATES
+from rir_utils import get_rir_start_samples
+from tqdm import tqdm
+
+DIRECT_PATH_MS = 2.5
+
+
+class RirCatalog:
+    def __init__(self, path):
+        """Open a RIR catalog built by this script.
+
+        Args:
+            path (str): path to the .npz file of the catalog
+        """
+        with np.load(path) as data:
+            self.data = {key: data[key] for key in data.files}
+        self.early_rir_sec = float(self.data["early_rir_sec"])
+        self.sample_rates = [int(fs) for fs in self.data["sample_rates"]]
+        self.index = {uid.decode("utf-8"): i for i, uid in enumerate(self.data["uids"])}
+
+    def __contains__(self, uid):
+        return uid in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_rir_stop_sample(self, uid, fs, num_channels):
+        """Return the end of the early RIR of each channel at `fs`.
+
+        Args:
+            uid (str): RIR uid
+            fs (int): sampling rate of the resampled RIR in Hz
+            num_channels (int): number of channels used in the simulation
+                (the first channels of the RIR)
+        Returns:
+            rir_stop_sample (np.ndarray): index of the first discarded sample of
+                each channel (num_channels,), or None if not in the catalog
+        """
+        key = f"early_stop_{fs}"
+        if uid not in self.index or key not in self.data:
+            return None
+        i = self.index[uid]
+        if num_channels > self.data["num_channels"][i]:
+            return None
+        return self.data[key][i, :num_channels]
+
+    def descriptors(self, channel=0):
+        """Return the descriptors of all RIRs for filtering and breakdowns.
+
+        Returns:
+            descriptors (dict): uid, fs, length and the start sample, T60, DRR
+                and energy of the given channel (NaN/-1 if the RIR has fewer
+                channels) as arrays aligned with each other
+        """
+        ret = {"uid": np.array(list(self.index.keys()))}
+        for key in ("fs", "length", "num_channels"):
+            ret[key] = self.data[key]
+        for key in ("start_sample", "t60", "drr", "energy"):
+            ret[key] = self.data[key][:, channel]
+        return ret
+
+
+def get_t60(h, fs, decay_db=(-5.0, -25.0)):
+    """Estimate the reverberation time by Schroeder backward integration.
+
+    The energy decay curve is fitted linearly between `decay_db` and
+    extrapolated to a decay of 60 dB.
+
+    Args:
+        h (np.ndarray): room impulse response (Time,)
+        fs (int): sampling rate in Hz
+        decay_db (tuple): range of the energy decay curve used for the fit in dB
+    Returns:
+        t60 (float): reverberation time in seconds (NaN if the decay is too short)
+    """
+    edc = np.cumsum(h[::-1] ** 2)[::-1]
+    if edc[0] <= 0:
+        return np.nan
+    edc_db = 10 * np.log10(np.maximum(edc / edc[0], 1e-300))
+    upper, lower = decay_db
+    idx = np.nonzero((edc_db <= upper) & (edc_db >= lower))[0]
+    if len(idx) < 2 or edc_db[-1] > lower:
+        return np.nan
+    slope = np.polyfit(idx / fs, edc_db[idx], 1)[0]
+    return -60.0 / slope if slope < 0 else np.nan
+
+
+def get_drr(h, fs):
+    """Estimate the direct-to-reverberant ratio in dB.
+
+    The direct path is the part within +-DIRECT_PATH_MS around the peak.
+    """
+    peak = np.argmax(np.abs(h))
+    width = int(DIRECT_PATH_MS * fs / 1000)
+    lo, hi = max(peak - width, 0), peak + width + 1
+    direct = np.sum(h[lo:hi] ** 2)
+    reverberant = np.sum(h[:lo] ** 2) + np.sum(h[hi:] ** 2)
+    return 10 * np.log10(max(direct, 1e-300) / max(reverberant, 1e-300))
+
+
+def analyze_rir(audio_path, sample_rates, early_rir_sec=0.05):
+    """Compute the catalog entries of a single RIR file.
+
+    The RIR is read and resampled in the same way as in the simulation
+    (`read_audio` in simulate_data_from_param.py), so that the stored cut points
+    match the ones estimated on the fly.
+
+    Returns:
+        entry (dict): fs, length, num_channels, and per-channel arrays of
+            start_sample, t60, drr, energy and early_stop_{fs} for each fs
+    """
+    audio, fs = sf.read(audio_path, always_2d=True)
+    audio = audio.T
+    entry = {
+        "fs": fs,
+        "length": audio.shape[-1],
+        "num_channels": audio.shape[0],
+        "start_sample": get_rir_start_samples(audio),
+        "t60": np.array([get_t60(h, fs) for h in audio]),
+        "drr": np.array([get_drr(h, fs) for h in audio]),
+        "energy": np.sum(audio**2, axis=-1),
+    }
+    for fs_new in sample_rates:
+        if fs_new == fs:
+            start = entry["start_sample"]
+        else:
+            resampled = librosa.resample(
+                audio, orig_sr=fs, target_sr=fs_new, res_type="soxr_hq"
+            )
+            start = get_rir_start_samples(resampled)
+        entry[f"early_stop_{fs_new}"] = start + int(early_rir_sec * fs_new)
+    return entry
+
+
+def build_rir_catalog(scps, path, sample_rates=SAMPLE_RATES, early_rir_sec=0.05, nj=8):
+    """Analyze all RIRs in the given scp files and save the catalog.
+
+    Args:
+        scps (list): scp files (three columns per line: uid, fs, audio_path)
+        path (str): output .npz file
+        sample_rates (tuple): sampling rates at which the early RIR is cut
+        early_rir_sec (float): the duration in seconds that we count as early RIR
+        nj (int): number of parallel workers
+    """
+    samples = {}
+    for scp in scps:
+        with open(scp, "r") as f:
+            for line in f:
+                uid, fs, audio_path = line.strip().split()
+                assert uid not in samples, (uid, fs)
+                samples[uid] = audio_path
+    uids = sorted(samples.keys())
+
+    with ProcessPoolExecutor(max_workers=nj) as executor:
+        entries = list(
+            tqdm(
+                executor.map(
+                    analyze_rir,
+                    [samples[uid] for uid in uids],
+                    [sample_rates] * len(uids),
+                    [early_rir_sec] * len(uids),
+                    chunksize=16,
+                ),
+                total=len(uids),
+            )
+        )
+
+    max_channels = max((entry["num_channels"] for entry in entries), default=1)
+    data = {
+        "uids": np.array([uid.encode("utf-8") for uid in uids], dtype=bytes),
+        "sample_rates": np.array(sample_rates, dtype=np.int32),
+        "early_rir_sec": np.array(early_rir_sec),
+    }
+    for key, dtype in (("fs", np.int32), ("length", np.int64)):
+        data[key] = np.array([entry[key] for entry in entries], dtype=dtype)
+    data["num_channels"] = np.array(
+        [entry["num_channels"] for entry in entries], dtype=np.int16
+    )
+    per_channel = [("start_sample", np.int32, -1)]
+    per_channel += [(f"early_stop_{fs}", np.int32, -1) for fs in sample_rates]
+    per_channel += [(key, np.float32, np.nan) for key in ("t60", "drr", "energy")]
+    for key, dtype, pad in per_channel:
+        data[key] = np.full((len(entries), max_channels), pad, dtype=dtype)
+        for i, entry in enumerate(entries):
+            data[key][i, : entry["num_channels"]] = entry[key]
+    np.savez(path, **data)
+
+
+def summarize(catalog):
+    """Print the distribution of the descriptors of the first channel."""
+    desc = catalog.descriptors()
+    print(f"{len(catalog)} RIRs")
+    for key in ("t60", "drr", "energy"):
+        values = desc[key][~np.isnan(desc[key])]
+        if len(values) == 0:
+            continue
+        p5, p50, p95 = np.percentile(values, [5, 50, 95])
+        print(
+            f"  {key}: p5={p5:.3f} median={p50:.3f} p95={p95:.3f} "
+            f"({len(desc[key]) - len(values)} undefined)"
+        )
+    for fs, count in zip(*np.unique(desc["fs"], return_counts=True)):
+        print(f"  fs={fs}: {count} RIRs")
+
+
+if __name__ == "__main__":
+    from generate_data_param import get_parser
+
+    parser = get_parser()
+    # parallel workers by default (parameter generation defaults to --nj 1)
+    parser.set_defaults(nj=8)
+    group = parser.add_argument_group(description="RIR catalog related")
+    group.add_argument(
+        "--catalog",
+        type=str,
+        required=True,
+        help="Output path of the RIR catalog (.npz)",
+    )
+    group.add_argument(
+        "--sample_rates",
+        type=int,
+        nargs="+",
+        default=list(SAMPLE_RATES),
+        help="Sampling rates at which the end of the early RIR is precomputed",
+    )
+    group.add_argument(
+        "--early_rir_sec",
+        type=float,
+        default=0.05,
+        help="The duration in seconds that we count as early RIR",
+    )
+    args = parser.parse_args()
+    print(args)
+
+    build_rir_catalog(
+        args.rir_scps,
+        args.catalog,
+        sample_rates=tuple(args.sample_rates),
+        early_rir_sec=args.early_rir_sec,
+        nj=args.nj,
+    )
+    summarize(RirCatalog(args.catalog))
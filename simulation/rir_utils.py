@@ -11,12 +11,48 @@ def estimate_early_rir(rir_sample, early_rir_sec: float = 0.05, fs: int = 48000)
     Returns:
         early_rir_sample (np.ndarray): estimated RIR (Channel, Time)
     """
-    rir_start_sample = np.array([get_rir_start_sample(h) for h in rir_sample])
-    early_rir_samples = int(early_rir_sec * fs)
-    rir_stop_sample = rir_start_sample + early_rir_samples
-    rir_early = rir_sample.copy()
-    for i in range(rir_sample.shape[0]):
-        rir_early[i, rir_stop_sample[i]:] = 0
+    _, rir_early = estimate_early_rirs(
+        rir_sample[None], early_rir_sec=early_rir_sec, fs=fs
+    )
+    return rir_early[0]
+
+
+def estimate_early_rirs(
+    rirs, lengths=None, early_rir_sec: float = 0.05, fs: int = 48000
+):
+    """Batched version of `estimate_early_rir` for a padded stack of RIRs.
+
+    Args:
+        rirs (np.ndarray): room impulse responses zero-padded to the same
+            length (N, Channel, Time)
+        lengths (np.ndarray): [optional] valid length of each RIR (N,)
+        early_rir_sec (float): the duration in seconds that we count as early RIR
+        fs (int): sampling frequency in Hz
+    Returns:
+        rir_start_sample (np.ndarray): start sample of each channel (N, Channel)
+        early_rir_samples (np.ndarray): estimated early RIRs (N, Channel, Time)
+    """
+    rir_start_sample = get_rir_start_samples(rirs, lengths=lengths)
+    rir_stop_sample = rir_start_sample + int(early_rir_sec * fs)
+    return rir_start_sample, get_early_rir(rirs, rir_stop_sample)
+
+
+def get_early_rir(rir_sample, rir_stop_sample):
+    """Keep the part of RIR before the given stop sample of each channel.
+
+    Args:
+        rir_sample (np.ndarray): room impulse responses (..., Channel, Time)
+        rir_stop_sample (np.ndarray): index of the first discarded sample of
+            each channel (..., Channel), e.g., precomputed in the RIR catalog
+    Returns:
+        early_rir_sample (np.ndarray): early RIR (..., Channel, Time)
+    """
+    rir_stop_sample = np.asarray(rir_stop_sample)
+    # only the samples before the latest stop sample need to be copied
+    stop = min(int(np.max(rir_stop_sample, initial=0)), rir_sample.shape[-1])
+    keep = np.arange(stop) < rir_stop_sample[..., None]
+    rir_early = np.zeros_like(rir_sample)
+    rir_early[..., :stop] = np.where(keep, rir_sample[..., :stop], 0)
     return rir_early
 
 
@@ -46,16 +82,46 @@ def get_rir_start_sample(h, level_ratio=1e-1):
     if h.ndim > 1:
         assert h.shape[0] < 20, h.shape
         h = np.reshape(h, (-1, h.shape[-1]))
-        return np.min(
-            [get_rir_start_sample(h_, level_ratio=level_ratio) for h_ in h]
-        )
-
-    abs_h = np.abs(h)
-    max_index = np.argmax(abs_h)
-    max_abs_value = abs_h[max_index]
-    # +1 because python excludes the last value
-    larger_than_threshold = abs_h[:max_index + 1] > level_ratio * max_abs_value
-
-    # Finds first occurrence of max
-    rir_start_sample = np.argmax(larger_than_threshold)
-    return rir_start_sample
+        return int(np.min(get_rir_start_samples(h, level_ratio=level_ratio)))
+    return int(get_rir_start_samples(h, level_ratio=level_ratio))
+
+
+def get_rir_start_samples(h, lengths=None, level_ratio=1e-1):
+    """Vectorized `get_rir_start_sample` for each channel of a stack of RIRs.
+
+    Params:
+        h: Room impulse responses zero-padded to the same length with Shape
+            (..., num_samples), e.g., (N, Channel, num_samples)
+        lengths: Optional valid length of each RIR with Shape (N,), beyond
+            which samples are ignored
+        level_ratio: Ratio between start value and max value.
+    Returns:
+        Start sample of each RIR with Shape h.shape[:-1]
+
+    >>> get_rir_start_samples(np.array([[0, 0, 1, 0.5], [0.2, 1, 0, 0]]))
+    array([2, 0])
+    """
+    assert level_ratio < 1, level_ratio
+    if lengths is not None:
+        lengths = np.asarray(lengths).reshape((-1,) + (1,) * (h.ndim - 1))
+        h = np.where(np.arange(h.shape[-1]) < lengths, h, 0)
+    shape = h.shape[:-1]
+    h = h.reshape(-1, h.shape[-1])
+    rows = np.arange(h.shape[0])
+    # first occurrence of the max absolute value without materializing abs(h):
+    # the earlier of the first positive and the first negative peak
+    pos_index = np.argmax(h, axis=-1)
+    neg_index = np.argmin(h, axis=-1)
+    pos_value = h[rows, pos_index]
+    neg_value = -h[rows, neg_index]
+    max_index = np.where(pos_value > neg_value, pos_index, neg_index)
+    max_index = np.where(
+        pos_value == neg_value, np.minimum(pos_index, neg_index), max_index
+    )
+    max_abs_value = np.maximum(pos_value, neg_value)
+    # only the samples up to (and including) the first occurrence of max
+    stop = np.max(max_index, initial=0) + 1
+    larger_than_threshold = (
+        np.abs(h[:, :stop]) > level_ratio * max_abs_value[:, None]
+    ) & (np.arange(stop) <= max_index[:, None])
+    return np.argmax(larger_than_threshold, axis=-1).reshape(shape)
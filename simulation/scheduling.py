@@ -0,0 +1,178 @@
+import hashlib
+import heapq
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from meta_store import get_augmentations
+
+# rough processing time per second of audio relative to mixing additive noise,
+# e.g., as measured with --profile_tsv or benchmark_augmentations.py
+BASE_COST = 1.0
+REVERBERATION_COST = 1.0
+AUGMENTATION_COSTS = {
+    "wind_noise": 8.0,
+    "bandwidth_limitation": 2.0,
+    "clipping": 0.2,
+    "codec": 10.0,
+    "packet_loss": 0.1,
+}
+
+
+def count_source_reads(meta, field):
+    """Count the reads of files referenced by `field` and the unique files among them.
+
+    Args:
+        meta (list): list of meta dictionaries (rows of meta.tsv)
+        field (str): "noise_uid" or "rir_uid"
+    Returns:
+        num_reads (int): number of rows reading a file referenced by `field`
+        num_unique (int): number of unique (uid, fs) pairs among them
+    """
+    keys = [(row[field], row["fs"]) for row in meta if row[field] != "none"]
+    return len(keys), len(set(keys))
+
+
+def group_rows_by_source(meta, batch_size):
+    """Group rows sharing the same noise/RIR into batches for the workers.
+
+    Rows are grouped by (fs, noise_uid, rir_uid). The groups are ordered by
+    whichever of noise or RIR is reused more often, so that consecutive
+    groups also tend to share the other one. Each batch is processed by a
+    single worker, so that its per-worker caches can be hit.
+
+    Args:
+        meta (list): list of meta dictionaries (rows of meta.tsv)
+        batch_size (int): maximum number of rows per batch
+    Returns:
+        batches (list): list of lists of meta dictionaries
+    """
+    noise_reads, noise_unique = count_source_reads(meta, "noise_uid")
+    rir_reads, rir_unique = count_source_reads(meta, "rir_uid")
+    rir_first = rir_reads - rir_unique > noise_reads - noise_unique
+
+    groups = defaultdict(list)
+    for row in meta:
+        groups[(row["fs"], row["noise_uid"], row["rir_uid"])].append(row)
+    if rir_first:
+        keys = sorted(groups.keys(), key=lambda k: (k[0], k[2], k[1]))
+    else:
+        keys = sorted(groups.keys())
+
+    rows = [row for key in keys for row in groups[key]]
+    return [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+
+
+def process_batch(batch, func=None):
+    """Process all rows in a batch sequentially in the same worker."""
+    return [func(row) for row in batch]
+
+
+def estimate_row_cost(row):
+    """Estimate the relative processing time of a row.
+
+    The cost is the duration in seconds weighted by the cost of reverberation
+    and of each augmentation (wind noise and codecs are much more expensive).
+    """
+    duration = int(row["length"]) / int(row["fs"])
+    cost = BASE_COST
+    if row["rir_uid"] != "none":
+        cost += REVERBERATION_COST
+    for aug, _ in get_augmentations(row):
+        cost += AUGMENTATION_COSTS.get(aug, 0.0)
+    return duration * cost
+
+
+def split_rows_by_cost(meta, nsplits):
+    """Deterministically split rows into `nsplits` shards of similar total cost.
+
+    Rows are assigned greedily in decreasing order of their estimated cost to the
+    shard with the lowest total cost so far (ties are broken by id and shard
+    index), so that every job computes the same split from the same meta file.
+
+    Args:
+        meta (list): list of meta dictionaries (rows of meta.tsv)
+        nsplits (int): number of shards
+    Returns:
+        shards (list): `nsplits` lists of rows, each in the original order
+    """
+    costs = [estimate_row_cost(row) for row in meta]
+    order = sorted(range(len(meta)), key=lambda i: (-costs[i], meta[i]["id"]))
+    heap = [(0.0, job) for job in range(nsplits)]
+    assignment = [None] * len(meta)
+    for i in order:
+        total, job = heapq.heappop(heap)
+        assignment[i] = job
+        heapq.heappush(heap, (total + costs[i], job))
+    shards = [[] for _ in range(nsplits)]
+    for row, job in zip(meta, assignment):
+        shards[job].append(row)
+    return shards
+
+
+def get_manifest_path(output_dir, job, nsplits):
+    return Path(output_dir) / "manifests" / f"manifest.{job}of{nsplits}.json"
+
+
+def hash_ids(rows):
+    """Return a digest of the ids of the rows (independent of their order)."""
+    digest = hashlib.sha1()
+    for uid in sorted(row["id"] for row in rows):
+        digest.update(uid.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def write_manifest(output_dir, job, nsplits, rows):
+    """Record that all rows of a shard have been simulated.
+
+    The manifest is written atomically after all outputs of the shard are
+    written, so its existence marks the shard as complete.
+
+    Args:
+        output_dir (str): output directory of the simulation
+        job (int): index of the shard (starting from 1)
+        nsplits (int): total number of shards
+        rows (list): rows simulated by this shard
+    """
+    path = get_manifest_path(output_dir, job, nsplits)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "job": job,
+        "nsplits": nsplits,
+        "num_samples": len(rows),
+        "duration_sec": sum(int(row["length"]) / int(row["fs"]) for row in rows),
+        "cost": sum(estimate_row_cost(row) for row in rows),
+        "ids_sha1": hash_ids(rows),
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def verify_manifests(output_dir, meta, nsplits):
+    """Check the manifests of all shards against the split of the meta file.
+
+    Args:
+        output_dir (str): output directory of the simulation
+        meta (list): list of meta dictionaries (all rows of meta.tsv)
+        nsplits (int): total number of shards
+    Returns:
+        failed (list): indices (starting from 1) of the missing or inconsistent
+            shards
+    """
+    failed = []
+    for job, rows in enumerate(split_rows_by_cost(meta, nsplits), 1):
+        path = get_manifest_path(output_dir, job, nsplits)
+        if not path.exists():
+            print(f"[Job {job}/{nsplits}] missing manifest {path}")
+            failed.append(job)
+            continue
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        expected = (len(rows), hash_ids(rows))
+        if (manifest["num_samples"], manifest["ids_sha1"]) != expected:
+            print(f"[Job {job}/{nsplits}] manifest {path} does not match the meta file")
+            failed.append(job)
+    return failed
@@ -0,0 +1,208 @@
+"""Native re-implementation of ffmpeg's `sidechaincompress` and `amix` filters.
+
+The wind-noise simulation originally shelled out to ffmpeg with the filter graph
+
+    [1:a]asplit=2[sc][mix];[0:a][sc]sidechaincompress=...[compr];[compr][mix]amix
+
+This module reproduces the same processing in-process so that no temporary files
+or subprocesses are needed. The compressor follows libavfilter/af_sidechaincompress.c
+(downward mode, RMS detection, average link, soft knee) and `amix` follows the
+default behavior of libavfilter/af_amix.c for two inputs of equal length.
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# without numba, the envelope follower runs as a (slow) Python loop
+HAS_NUMBA = njit is not None
+
+
+# Default values of the remaining ffmpeg sidechaincompress options
+DEFAULT_KNEE = 2.82843
+DEFAULT_MAKEUP = 1.0
+DEFAULT_LEVEL_IN = 1.0
+
+
+def _envelope(detector, attack_coeff, release_coeff):
+    """Run the attack/release envelope follower of the compressor.
+
+    Args:
+        detector (np.ndarray): squared side-chain level per sample (Time,)
+        attack_coeff (float): smoothing coefficient when the level is rising
+        release_coeff (float): smoothing coefficient when the level is falling
+    Returns:
+        lin_slope (np.ndarray): smoothed side-chain level per sample (Time,)
+    """
+    lin_slope = np.empty_like(detector)
+    slope = 0.0
+    for i in range(detector.shape[0]):
+        x = detector[i]
+        if x > slope:
+            slope += (x - slope) * attack_coeff
+        else:
+            slope += (x - slope) * release_coeff
+        lin_slope[i] = slope
+    return lin_slope
+
+
+if HAS_NUMBA:
+    _envelope = njit(cache=True, nogil=True)(_envelope)
+
+
+def _hermite_interpolation(x, x0, x1, p0, p1, m0, m1):
+    width = x1 - x0
+    t = (x - x0) / width
+    m0 = m0 * width
+    m1 = m1 * width
+    t2 = t * t
+    t3 = t2 * t
+    ct2 = -3 * p0 - 2 * m0 + 3 * p1 - m1
+    ct3 = 2 * p0 + m0 - 2 * p1 + m1
+    return ct3 * t3 + ct2 * t2 + m0 * t + p0
+
+
+def sidechain_compress(
+    sample,
+    sidechain,
+    fs,
+    threshold=0.125,
+    ratio=2.0,
+    attack=20.0,
+    release=250.0,
+    level_sc=1.0,
+    knee=DEFAULT_KNEE,
+    makeup=DEFAULT_MAKEUP,
+    level_in=DEFAULT_LEVEL_IN,
+):
+    """Compress `sample` with a gain driven by the level of `sidechain`.
+
+    Args:
+        sample (np.ndarray): signal to be compressed (Channel, Time)
+        sidechain (np.ndarray): side-chain signal (Channel, Time)
+        fs (int): sampling rate in Hz
+        threshold (float): linear level above which compression starts
+        ratio (float): compression ratio
+        attack (float): attack time in ms
+        release (float): release time in ms
+        level_sc (float): side-chain gain
+        knee (float): soft knee width (linear ratio)
+        makeup (float): makeup gain applied after compression
+        level_in (float): input gain
+    Returns:
+        compressed (np.ndarray): compressed signal (Channel, Time)
+    """
+    assert sample.shape[-1] == sidechain.shape[-1], (sample.shape, sidechain.shape)
+    thres = math.log(threshold)
+    lin_knee_start = threshold / math.sqrt(knee)
+    lin_knee_stop = threshold * math.sqrt(knee)
+    # RMS detection compares the squared level against the knee
+    adj_knee_start = lin_knee_start**2
+    knee_start = math.log(lin_knee_start)
+    knee_stop = math.log(lin_knee_stop)
+    compressed_knee_stop = (knee_stop - thres) / ratio + thres
+    attack_coeff = min(1.0, 1.0 / (attack * fs / 4000.0))
+    release_coeff = min(1.0, 1.0 / (release * fs / 4000.0))
+
+    # average link over side-chain channels, then RMS detection
+    detector = np.mean(np.abs(sidechain * level_sc), axis=0) ** 2
+    lin_slope = _envelope(
+        np.ascontiguousarray(detector, dtype=np.float64), attack_coeff, release_coeff
+    )
+
+    gain = np.ones_like(lin_slope)
+    active = (lin_slope > 0.0) & (lin_slope > adj_knee_start)
+    slope = 0.5 * np.log(lin_slope[active])
+    out = (slope - thres) / ratio + thres
+    if knee > 1.0:
+        in_knee = slope < knee_stop
+        out[in_knee] = _hermite_interpolation(
+            slope[in_knee],
+            knee_start,
+            knee_stop,
+            knee_start,
+            compressed_knee_stop,
+            1.0,
+            1.0 / ratio,
+        )
+    gain[active] = np.exp(out - slope)
+    return sample * level_in * gain * makeup
+
+
+def amix(*samples):
+    """Mix equally long signals like ffmpeg's `amix` filter with default options.
+
+    Args:
+        samples (np.ndarray): signals to be mixed (Channel, Time)
+    Returns:
+        mix (np.ndarray): the average of all input signals (Channel, Time)
+    """
+    return sum(samples) / len(samples)
+
+
+if __name__ == "__main__":
+    # Compare the native implementation against ffmpeg (parity and throughput)
+    import argparse
+    import subprocess
+    import tempfile
+    import time
+    from pathlib import Path
+
+    import soundfile as sf
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fs", type=int, default=16000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = int(args.fs * args.duration)
+    t = np.arange(n) / args.fs
+    speech = 0.5 * np.sin(2 * np.pi * 220 * t)[None] * (np.sin(2 * np.pi * t) > 0)
+    noise = 0.3 * rng.standard_normal((1, n)) * (1 + np.sin(2 * np.pi * 0.5 * t))
+    noise = np.clip(noise, -0.9, 0.9)
+    params = dict(threshold=0.2, ratio=10.0, attack=20.0, release=50.0, level_sc=1.0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        sf.write(tmp / "speech.wav", speech[0], args.fs, subtype="FLOAT")
+        sf.write(tmp / "noise.wav", noise[0], args.fs, subtype="FLOAT")
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "quiet",
+            "-i",
+            str(tmp / "speech.wav"),
+            "-i",
+            str(tmp / "noise.wav"),
+            "-filter_complex",
+            "[1:a]asplit=2[sc][mix];[0:a][sc]sidechaincompress="
+            + ":".join(f"{k}={v}" for k, v in params.items())
+            + "[compr];[compr][mix]amix",
+            "-c:a",
+            "pcm_f32le",
+            str(tmp / "mix.wav"),
+        ]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            subprocess.run(cmd, check=True)
+        time_ffmpeg = (time.perf_counter() - start) / args.repeat
+        ref = sf.read(tmp / "mix.wav")[0]
+
+    # the first call includes numba compilation
+    amix(sidechain_compress(speech, noise, args.fs, **params), noise)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        mix = amix(sidechain_compress(speech, noise, args.fs, **params), noise)[0]
+    time_native = (time.perf_counter() - start) / args.repeat
+
+    print(f"max abs diff: {np.max(np.abs(mix - ref)):.3e}")
+    print(f"ffmpeg: {time_ffmpeg * 1000:.1f} ms/sample")
+    print(f"native: {time_native * 1000:.1f} ms/sample (numba={HAS_NUMBA})")
@@ -1,6 +1,10 @@
-import ast
-import re
+import io
+import os
+import shutil
 import subprocess
+import threading
+import time
+from contextlib import ExitStack
 from copy import deepcopy
 from functools import partial
 from pathlib import Path
@@ -9,15 +13,61 @@ import librosa
 import numpy as np
 import scipy
 import soundfile as sf
-import torch
+from async_writer import AsyncWriter
+from audio_cache import AudioCache
+from codec_engine import CodecEngine
 from espnet2.train.preprocessor import detect_non_silence
+from espnet2.utils.types import str2bool
 from generate_data_param import get_parser
-from rir_utils import estimate_early_rir
-from torchaudio.io import AudioEffector, CodecConfig
+from meta_store import get_augmentations, get_simulation_columns, read_meta
+from noise_bank import NoiseBank, to_float
+from journal import Journal, find_completed
+from path_table import write_path_table
+from prefetch import process_batch_with_prefetch
+from profiling import NULL_TIMER, StageTimer, report_profile, write_profile
+from resample_engine import ResampleEngine
+from reverb_engine import ReverbEngine
+from rir_catalog import RirCatalog
+from scheduling import (
+    count_source_reads,
+    group_rows_by_source,
+    process_batch,
+    split_rows_by_cost,
+    verify_manifests,
+    write_manifest,
+)
+from sidechain_compressor import HAS_NUMBA, amix, sidechain_compress
+from streaming import (
+    NonSilencePower,
+    get_block_size,
+    indexed_power,
+    noise_offset,
+    noise_segment,
+    stream_reverberation,
+)
 from tqdm.contrib.concurrent import process_map
+from wds_writer import ShardWriter, write_shard_index
 
 ffmpeg = "/path/to/ffmpeg"
 
+# per-worker states (each process in process_map holds its own copy), which are
+# created lazily under `state_lock` as the prefetch threads read concurrently
+state_lock = threading.Lock()
+reverb_engine = None
+audio_cache = None
+noise_bank = None
+shard_writer = None
+async_writer = None
+journal = None
+rir_catalog = None
+codec_engine = None
+resample_engine = None
+
+# augmentations supported by the block-streaming simulation of long samples
+STREAMABLE_AUGMENTATIONS = ("packet_loss",)
+# rough number of full-length float64 copies made by the in-memory simulation
+IN_MEMORY_COPIES = 12
+
 
 def buildFFmpegCommand(params):
 
@@ -54,7 +104,7 @@ def buildFFmpegCommand(params):
 #############################
 # Augmentations per sample
 #############################
-def mix_noise(speech_sample, noise_sample, snr=5.0, rng=None):
+def mix_noise(speech_sample, noise_sample, snr=5.0, rng=None, noise_energy=None):
     """Mix the speech sample with an additive noise sample at a given SNR.
 
     Args:
@@ -62,12 +112,16 @@ def mix_noise(speech_sample, noise_sample, snr=5.0, rng=None):
         noise_sample (np.ndarray): a single noise sample (Channel, Time)
         snr (float): signal-to-nosie ratio (SNR) in dB
         rng (np.random.Generator): random number generator
+        noise_energy (np.ndarray): [optional] hop energies of the noise sample
+            (Channel, Hops) from the energy index of the noise bank, from which
+            the power of the noise segment is estimated instead of scanning it
     Returns:
         noisy_sample (np.ndarray): output noisy sample (Channel, Time)
         noise (np.ndarray): scaled noise sample (Channel, Time)
     """
     len_speech = speech_sample.shape[-1]
     len_noise = noise_sample.shape[-1]
+    offset = 0
     if len_noise < len_speech:
         offset = rng.integers(0, len_speech - len_noise)
         # Repeat noise
@@ -79,10 +133,17 @@ def mix_noise(speech_sample, noise_sample, snr=5.0, rng=None):
     elif len_noise > len_speech:
         offset = rng.integers(0, len_noise - len_speech)
         noise_sample = noise_sample[:, offset : offset + len_speech]
+    # noise from the noise bank is only cast (and scaled if int16) after cropping
+    noise_sample = to_float(noise_sample, speech_sample.dtype)
 
     power_speech = (speech_sample[detect_non_silence(speech_sample)] ** 2).mean()
-    power_noise = (noise_sample[detect_non_silence(noise_sample)] ** 2).mean()
+    if noise_energy is not None and len_noise >= len_speech:
+        power_noise = indexed_power(noise_energy, offset, len_speech)
+    else:
+        power_noise = (noise_sample[detect_non_silence(noise_sample)] ** 2).mean()
     scale = 10 ** (-snr / 20) * np.sqrt(power_speech) / np.sqrt(max(power_noise, 1e-10))
+    # the indexed power (and the 1e-10 floor) would upcast float32 noise to float64
+    scale = noise_sample.dtype.type(scale)
     noise = scale * noise_sample
     noisy_speech = speech_sample + noise
     return noisy_speech, noise
@@ -102,9 +163,33 @@ def wind_noise(
     clipping_threshold,
     snr,
     rng=None,
+    backend="native",
+    noise_energy=None,
 ):
+    """Mix the speech sample with a wind noise sample via sidechain compression.
+
+    Args:
+        speech_sample (np.ndarray): a single speech sample (Channel, Time)
+        noise_sample (np.ndarray): a single wind noise sample (Channel, Time)
+        fs (int): sampling rate in Hz
+        uid (str): unique ID of the sample (used for naming temporary files)
+        threshold, ratio, attack, release, sc_gain: sidechain compressor options
+        clipping (bool): whether to clip the mixture
+        clipping_threshold (float): relative clipping level
+        snr (float): signal-to-nosie ratio (SNR) in dB
+        rng (np.random.Generator): random number generator
+        backend (str): "native" for the in-process sidechain compressor
+            or "ffmpeg" for running the original ffmpeg filter graph
+        noise_energy (np.ndarray): [optional] hop energies of the noise sample
+            (see `mix_noise`)
+    Returns:
+        noisy_sample (np.ndarray): output noisy sample (Channel, Time)
+        noise (np.ndarray): scaled noise sample (Channel, Time)
+    """
+    assert backend in ("native", "ffmpeg"), backend
     len_speech = speech_sample.shape[-1]
     len_noise = noise_sample.shape[-1]
+    offset = 0
     if len_noise < len_speech:
         offset = rng.integers(0, len_speech - len_noise)
         # Repeat noise
@@ -116,19 +201,19 @@ def wind_noise(
     elif len_noise > len_speech:
         offset = rng.integers(0, len_noise - len_speech)
         noise_sample = noise_sample[:, offset : offset + len_speech]
+    # noise from the noise bank is only cast (and scaled if int16) after cropping
+    noise_sample = to_float(noise_sample, speech_sample.dtype)
 
     power_speech = (speech_sample[detect_non_silence(speech_sample)] ** 2).mean()
-    power_noise = (noise_sample[detect_non_silence(noise_sample)] ** 2).mean()
+    if noise_energy is not None and len_noise >= len_speech:
+        power_noise = indexed_power(noise_energy, offset, len_speech)
+    else:
+        power_noise = (noise_sample[detect_non_silence(noise_sample)] ** 2).mean()
     scale = 10 ** (-snr / 20) * np.sqrt(power_speech) / np.sqrt(max(power_noise, 1e-10))
+    # the indexed power (and the 1e-10 floor) would upcast float32 noise to float64
+    scale = noise_sample.dtype.type(scale)
     noise = scale * noise_sample
 
-    # to use ffmpeg for simulation, speech and noise have to be saved once
-    tmp_dir = Path("./simulation_tmp")
-    tmp_dir.mkdir(exist_ok=True)
-    speech_tmp_path = tmp_dir / f"speech_{uid}.wav"
-    noise_tmp_path = tmp_dir / f"noise_{uid}.wav"
-    mix_tmp_path = tmp_dir / f"mix_{uid}.wav"
-
     scale = 0.9 / max(
         np.max(np.abs(speech_sample)),
         np.max(np.abs(noise)),
@@ -136,6 +221,52 @@ def wind_noise(
     speech_sample *= scale
     noise *= scale
 
+    if backend == "native":
+        compressed = sidechain_compress(
+            speech_sample,
+            noise,
+            fs,
+            threshold=threshold,
+            ratio=ratio,
+            attack=attack,
+            release=release,
+            level_sc=sc_gain,
+        )
+        mix = amix(compressed, noise)
+    else:
+        mix, noise = wind_noise_ffmpeg(
+            speech_sample,
+            noise,
+            fs,
+            uid,
+            threshold,
+            ratio,
+            attack,
+            release,
+            sc_gain,
+        )
+
+    # Clipper
+    mix /= scale
+    noise /= scale
+
+    if clipping:
+        mix = np.maximum(clipping_threshold * np.min(mix) * np.ones_like(mix), mix)
+        mix = np.minimum(clipping_threshold * np.max(mix) * np.ones_like(mix), mix)
+
+    return mix, noise
+
+
+def wind_noise_ffmpeg(
+    speech_sample, noise, fs, uid, threshold, ratio, attack, release, sc_gain
+):
+    # to use ffmpeg for simulation, speech and noise have to be saved once
+    tmp_dir = Path("./simulation_tmp")
+    tmp_dir.mkdir(exist_ok=True)
+    speech_tmp_path = tmp_dir / f"speech_{uid}.wav"
+    noise_tmp_path = tmp_dir / f"noise_{uid}.wav"
+    mix_tmp_path = tmp_dir / f"mix_{uid}.wav"
+
     save_audio(speech_sample, speech_tmp_path, fs)
     save_audio(noise, noise_tmp_path, fs)
 
@@ -155,18 +286,17 @@ def wind_noise(
     if subprocess.run(commands).returncode != 0:
         print("There was an error running your FFmpeg script")
 
-    # Clipper
     mix, sr = sf.read(mix_tmp_path)
     noise, sr = sf.read(noise_tmp_path)
+    return mix[None], noise[None]
 
-    mix /= scale
-    noise /= scale
-
-    if clipping:
-        mix = np.maximum(clipping_threshold * np.min(mix) * np.ones_like(mix), mix)
-        mix = np.minimum(clipping_threshold * np.max(mix) * np.ones_like(mix), mix)
 
-    return mix[None], noise[None]
+def resolve_wind_noise_backend(backend=None):
+    """Return the given wind-noise backend, or the default one if it is None."""
+    if backend is None:
+        # the native compressor is only faster than ffmpeg when compiled by numba
+        return "native" if HAS_NUMBA else "ffmpeg"
+    return backend
 
 
 def add_reverberation(speech_sample, rir_sample):
@@ -182,7 +312,36 @@ def add_reverberation(speech_sample, rir_sample):
     return reverberant_sample[:, : speech_sample.shape[1]]
 
 
-def bandwidth_limitation(speech_sample, fs: int, fs_new: int, res_type="kaiser_best"):
+def get_reverb_engine(rir_cache_mb=256.0):
+    """Return the reverberation engine of the current worker process."""
+    global reverb_engine
+    with state_lock:
+        if reverb_engine is None:
+            reverb_engine = ReverbEngine(max_size_mb=rir_cache_mb)
+    return reverb_engine
+
+
+def get_codec_engine():
+    """Return the codec engine of the current worker."""
+    global codec_engine
+    with state_lock:
+        if codec_engine is None:
+            codec_engine = CodecEngine()
+    return codec_engine
+
+
+def get_resample_engine():
+    """Return the resampling engine (with cached filters) of the current worker."""
+    global resample_engine
+    with state_lock:
+        if resample_engine is None:
+            resample_engine = ResampleEngine()
+    return resample_engine
+
+
+def bandwidth_limitation(
+    speech_sample, fs: int, fs_new: int, res_type="kaiser_best", backend="librosa"
+):
     """Apply the bandwidth limitation distortion to the input signal.
 
     Args:
@@ -190,6 +349,9 @@ def bandwidth_limitation(speech_sample, fs: int, fs_new: int, res_type="kaiser_b
         fs (int): sampling rate in Hz
         fs_new (int): effective sampling rate in Hz
         res_type (str): resampling method
+        backend (str): "librosa" to call `librosa.resample`, "cached" for the
+            same filters designed once per worker, or "soxr" for the faster
+            soxr resampler with a quality similar to that of `res_type`
 
     Returns:
         ret (np.ndarray): bandwidth-limited speech sample (1, Time)
@@ -198,6 +360,11 @@ def bandwidth_limitation(speech_sample, fs: int, fs_new: int, res_type="kaiser_b
     if fs == fs_new:
         return speech_sample
     assert fs > fs_new, (fs, fs_new)
+    if backend != "librosa":
+        assert backend in ("cached", "soxr"), backend
+        return get_resample_engine().down_up(
+            speech_sample, fs, fs_new, res_type, use_soxr=backend == "soxr"
+        )
     ret = librosa.resample(speech_sample, orig_sr=fs, target_sr=fs_new, **opts)
     # resample back to the original sampling rate
     ret = librosa.resample(ret, orig_sr=fs_new, target_sr=fs, **opts)
@@ -252,34 +419,24 @@ def codec_compression(
     encoder: str = None,
     qscale: int = None,
 ):
+    """Simulate lossy compression with the per-worker codec engine.
+
+    Args:
+        speech_sample (np.ndarray): a single speech sample (Channel, Time)
+        fs (int): sampling rate in Hz
+        format (str): container format ("mp3" or "ogg")
+        encoder (str): encoder for "ogg" ("vorbis" or "opus"), or None
+        qscale (int): quality scale of the encoder
+    Returns:
+        output (np.ndarray): decoded speech sample (Channel, Time)
+    Raises:
+        CodecError: with the codec configuration if ffmpeg fails
+    """
     assert format in ["mp3", "ogg"], format
     assert encoder in [None, "None", "vorbis", "opus"], encoder
-
-    encoder = None if encoder == "None" else encoder
-    if speech_sample.ndim == 2:
-        speech_sample = speech_sample.T  # (channel, sample) -> (sample, channel)
-    try:
-        module = AudioEffector(
-            format=format,
-            encoder=encoder,
-            codec_config=CodecConfig(qscale=qscale),
-            pad_end=True,
-        )
-        output = module.apply(torch.from_numpy(speech_sample), fs).numpy()
-    except Exception as e:
-        print(format, encoder, qscale, flush=True)
-        print(e, flush=True)
-
-    if output.shape[0] < speech_sample.shape[0]:
-        zeros = np.zeros((speech_sample.shape[0] - output.shape[0], output.shape[1]))
-        output = np.concatenate((output, zeros), axis=0)
-    elif output.shape[0] > speech_sample.shape[0]:
-        output = output[: speech_sample.shape[0]]
-
-    assert speech_sample.shape == output.shape, (speech_sample.shape, output.shape)
-    return (
-        output.T if output.ndim == 2 else output
-    )  # (sample, channel) -> (channel, sample)
+    return get_codec_engine().apply(
+        speech_sample, fs, format, encoder=encoder, qscale=qscale
+    )
 
 
 def packet_loss(
@@ -296,26 +453,336 @@ def packet_loss(
 #############################
 # Audio utilities
 #############################
-def read_audio(filename, force_1ch=False, fs=None):
-    audio, fs_ = sf.read(filename, always_2d=True)
+def read_audio(filename, force_1ch=False, fs=None, timer=NULL_TIMER, dtype="float64"):
+    with timer("decode"):
+        audio, fs_ = sf.read(filename, always_2d=True, dtype=dtype)
     audio = audio[:, :1].T if force_1ch else audio.T
     if fs is not None and fs != fs_:
-        audio = librosa.resample(audio, orig_sr=fs_, target_sr=fs, res_type="soxr_hq")
+        with timer("resample"):
+            audio = librosa.resample(
+                audio, orig_sr=fs_, target_sr=fs, res_type="soxr_hq"
+            ).astype(dtype, copy=False)
         return audio, fs
     return audio, fs_
 
 
+def get_audio_cache(audio_cache_mb=0.0):
+    """Return the decoded-audio cache of the current worker process."""
+    global audio_cache
+    with state_lock:
+        if audio_cache is None:
+            audio_cache = AudioCache(max_size_mb=audio_cache_mb)
+    return audio_cache
+
+
+def read_audio_cached(
+    filename, force_1ch=False, fs=None, cache=None, timer=NULL_TIMER, dtype="float64"
+):
+    """Same as `read_audio`, but reuse decoded audio from `cache` if possible.
+
+    The returned array may be shared with the cache and must not be modified
+    in place.
+    """
+    kwargs = dict(force_1ch=force_1ch, fs=fs, timer=timer, dtype=dtype)
+    if cache is None or cache.max_bytes <= 0:
+        return read_audio(filename, **kwargs)
+    key = (filename, fs, force_1ch, dtype)
+    ret = cache.get(key)
+    if ret is None:
+        ret = read_audio(filename, **kwargs)
+        cache.put(key, *ret)
+    return ret
+
+
+def get_noise_bank(noise_bank_dir):
+    """Return the memory-mapped noise bank of the current worker process."""
+    global noise_bank
+    with state_lock:
+        if noise_bank is None:
+            noise_bank = NoiseBank(noise_bank_dir)
+    return noise_bank
+
+
+def read_noise_bank(bank, uid, fs, cache=None, timer=NULL_TIMER, dtype="float64"):
+    """Read a noise sample from the noise bank at the sampling rate `fs`.
+
+    Samples stored at `fs` are returned as read-only views into the memory map,
+    in the dtype of the bank, so that only the segment used for mixing is cast
+    to `dtype` later. Samples that have to be resampled are decoded like the
+    noise files, i.e., resampled once and reused from `cache`.
+
+    Returns:
+        audio (np.ndarray): noise sample (1, Time)
+    """
+    if bank.index[uid][0] == fs:
+        with timer("decode"):
+            return bank.read(uid)[0]
+    key = (("noise_bank", uid), fs, True, dtype)
+    use_cache = cache is not None and cache.max_bytes > 0
+    ret = cache.get(key) if use_cache else None
+    if ret is not None:
+        return ret[0]
+    with timer("resample"):
+        audio = bank.read(uid, fs=fs)[0].astype(dtype, copy=False)
+    if use_cache:
+        cache.put(key, audio, fs)
+    return audio
+
+
+def get_noise_energy(noise_bank_dir, noise_uid, fs):
+    """Return the hop energies of a noise sample from the noise bank.
+
+    Returns:
+        noise_energy (np.ndarray): read-only view (1, Hops) into the energy index,
+            or None if the noise sample has no entry at `fs`
+    """
+    if noise_bank_dir is None:
+        return None
+    bank = get_noise_bank(noise_bank_dir)
+    if noise_uid not in bank:
+        return None
+    energy = bank.read_energy(noise_uid, fs=fs)
+    return None if energy is None else energy[None]
+
+
+def get_rir_stop_sample(catalog_path, rir_uid, fs, num_channels, early_rir_sec):
+    """Return the precomputed end of the early RIR, or None to estimate it.
+
+    The catalog is only used if it was built with the same `early_rir_sec` as
+    the reverberation engine.
+    """
+    global rir_catalog
+    if catalog_path is None:
+        return None
+    with state_lock:
+        if rir_catalog is None:
+            rir_catalog = RirCatalog(catalog_path)
+            if rir_catalog.early_rir_sec != early_rir_sec:
+                print(
+                    f"{catalog_path} was built with early_rir_sec="
+                    f"{rir_catalog.early_rir_sec} instead of {early_rir_sec}, "
+                    "estimating the early RIRs instead"
+                )
+    if rir_catalog.early_rir_sec != early_rir_sec:
+        return None
+    return rir_catalog.get_rir_stop_sample(rir_uid, fs, num_channels)
+
+
+def get_shard_writer(output_dir, shard_size_mb=1000.0, run_id=None):
+    """Return the tar shard writer of the current worker process."""
+    global shard_writer
+    with state_lock:
+        if shard_writer is None:
+            shard_writer = ShardWriter(
+                output_dir, shard_size_mb=shard_size_mb, run_id=run_id
+            )
+    return shard_writer
+
+
+def get_async_writer(num_threads=0, max_pending_mb=256.0):
+    """Return the write-behind queue of the current worker process.
+
+    None is returned if asynchronous writing is disabled (num_threads=0).
+    """
+    global async_writer
+    with state_lock:
+        if async_writer is None and num_threads > 0:
+            async_writer = AsyncWriter(num_threads, max_pending_mb=max_pending_mb)
+    return async_writer
+
+
+def get_journal(journal_dir):
+    """Return the completion journal of the current worker process."""
+    global journal
+    with state_lock:
+        if journal is None:
+            journal = Journal(journal_dir)
+    return journal
+
+
+def get_output_paths(info, store_noise=False):
+    """Return the paths of the clean, noisy and (optionally) noise outputs."""
+    paths = [info["clean_path"], info["noisy_path"]]
+    if store_noise:
+        paths.append(info["noise_path"])
+    return paths
+
+
 def save_audio(audio, filename, fs):
     if audio.ndim != 1:
         audio = audio[0] if audio.shape[0] == 1 else audio.T
     sf.write(filename, audio, samplerate=fs)
 
 
+def encode_audio(audio, filename, fs):
+    """Encode the audio in memory in the format of `save_audio(audio, filename, fs)`.
+
+    Returns:
+        data (bytes): content of the audio file
+    """
+    if audio.ndim != 1:
+        audio = audio[0] if audio.shape[0] == 1 else audio.T
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, samplerate=fs, format=Path(filename).suffix[1:].upper())
+    return buffer.getvalue()
+
+
 #############################
 # Main entry
 #############################
 def main(args):
+    columns = None
+    if args.output_format == "files":
+        # parquet rows are only converted for the used columns ("wds" stores
+        # complete rows as `{key}.meta.json`)
+        columns = get_simulation_columns(args.store_noise)
+    meta = read_meta(args.meta_tsv, columns=columns)
+    if args.verify_manifests:
+        failed = verify_manifests(args.output_dir, meta, args.nsplits)
+        if failed:
+            raise SystemExit(f"{len(failed)}/{args.nsplits} jobs are incomplete")
+        print(f"All {args.nsplits} jobs are complete")
+        return
+
+    size = len(meta)
+    assert 1 <= args.job <= args.nsplits <= size
+    if args.nsplits > 1:
+        # shards are balanced by the estimated cost rather than the number of rows
+        meta = split_rows_by_cost(meta, args.nsplits)[args.job - 1]
+    duration = sum(int(row["length"]) / int(row["fs"]) for row in meta)
+    print(
+        f"[Job {args.job}/{args.nsplits}] Processing ({len(meta)}/{size}) samples "
+        f"({duration / 3600:.1f} hours)",
+        flush=True,
+    )
+    suffix = "" if args.nsplits == args.job == 1 else f".{args.job}"
+    shard_rows = meta
+
+    journal_dir = None
+    if args.output_format == "files":
+        journal_dir = Path(args.output_dir) / f"journal{suffix}"
+        if args.resume:
+            # the journal is only kept (and extended) by runs with --resume
+            completed = find_completed(
+                meta,
+                partial(get_output_paths, store_noise=args.store_noise),
+                journal_dir,
+                checksum=args.resume_checksum,
+                num_threads=args.nj,
+            )
+            meta = [row for row, done in zip(meta, completed) if not done]
+            print(
+                f"[resume] {len(shard_rows) - len(meta)}/{len(shard_rows)} samples "
+                "are already complete and skipped",
+                flush=True,
+            )
+        else:
+            # entries of a previous run may refer to files that are overwritten
+            shutil.rmtree(journal_dir, ignore_errors=True)
+            journal_dir = None
+    else:
+        assert not args.resume, "--resume is only supported with --output_format files"
+
+    # the path tables are memory-mapped by the workers instead of being pickled
+    # into every chunk of rows sent by process_map
+    speech_dic, noise_dic, rir_dic = share_path_tables(
+        load_path_tables(args), Path(args.output_dir) / f"path_tables{suffix}"
+    )
+
+    wind_noise_backend = resolve_wind_noise_backend(args.wind_noise_backend)
+    if args.wind_noise_backend is None and not HAS_NUMBA:
+        print("numba is not installed, using the ffmpeg wind-noise backend")
+
+    read_kwargs = dict(
+        audio_cache_mb=args.audio_cache_mb,
+        noise_bank_dir=args.noise_bank,
+        dtype=args.dtype,
+        speech_dic=speech_dic,
+        noise_dic=noise_dic,
+        rir_dic=rir_dic,
+    )
+    func = partial(
+        process_one_sample,
+        store_noise=args.store_noise,
+        wind_noise_backend=wind_noise_backend,
+        resample_backend=args.resample_backend,
+        noise_power=args.noise_power,
+        rir_cache_mb=args.rir_cache_mb,
+        output_format=args.output_format,
+        wds_dir=Path(args.output_dir) / "wds",
+        wds_shard_size_mb=args.wds_shard_size_mb,
+        # shards of different runs/jobs writing to the same directory never collide
+        wds_run_id=f"{time.strftime('%Y%m%d%H%M%S')}-job{args.job}",
+        audio_format=args.out_format,
+        async_write_threads=args.async_write_threads,
+        async_write_mb=args.async_write_mb,
+        profile=args.profile_tsv is not None,
+        stream_memory_mb=args.stream_memory_mb,
+        journal_dir=journal_dir,
+        rir_catalog_path=args.rir_catalog,
+        **read_kwargs,
+    )
+    if args.schedule == "grouped":
+        # rows sharing the same noise/RIR are processed by the same worker
+        batches = group_rows_by_source(meta, args.chunksize)
+    elif args.prefetch_depth > 0 or args.async_write_threads > 0:
+        # the rows of each worker must be known in advance to read ahead, and the
+        # queued writes are flushed at the end of each batch
+        batches = [
+            meta[i : i + args.chunksize] for i in range(0, len(meta), args.chunksize)
+        ]
+    else:
+        batches = None
+
+    if batches is None:
+        results = process_map(
+            func,
+            meta,
+            max_workers=args.nj,
+            chunksize=args.chunksize,
+        )
+    else:
+        if args.prefetch_depth > 0:
+            batch_func = partial(
+                process_batch_with_prefetch,
+                func=func,
+                read_func=partial(read_inputs, **read_kwargs),
+                depth=args.prefetch_depth,
+                max_mb=args.prefetch_mb,
+                num_threads=args.prefetch_threads,
+            )
+        else:
+            batch_func = partial(process_batch, func=func)
+        if args.async_write_threads > 0:
+            batch_func = partial(process_batch_and_flush, batch_func=batch_func)
+        results = process_map(batch_func, batches, max_workers=args.nj, chunksize=1)
+        results = [ret for batch in results for ret in batch]
+    report_cache_stats(results, meta)
+    if args.profile_tsv is not None:
+        records = [ret["profile"] for ret in results]
+        write_profile(records, args.profile_tsv + suffix)
+        report_profile(records)
+    if args.async_write_threads > 0 and args.output_format == "files":
+        report_writer_stats(results)
+    if args.output_format == "wds":
+        index_path = Path(args.output_dir) / "wds" / f"index{suffix}.tsv"
+        write_shard_index([ret["wds"] for ret in results], index_path)
+        print(f"Shard index written to {index_path}")
+    write_manifest(args.output_dir, args.job, args.nsplits, shard_rows)
+
+
+def load_path_tables(args):
+    """Load the uid -> audio path tables of speech, noise and RIR samples.
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+    Returns:
+        speech_dic (dict): speech uid -> audio path
+        noise_dic (dict): noise (incl. wind noise) uid -> audio path
+        rir_dic (dict): RIR uid -> audio path
+    """
     speech_dic = {}
+
     for scp in args.speech_scps:
         with open(scp, "r") as f:
             for line in f:
@@ -353,176 +820,670 @@ def main(args):
                     rir_dic[uid] = audio_path
     rir_dic = dict(rir_dic)
 
-    meta = []
-    with open(Path(args.log_dir) / "meta.tsv", "r") as f:
-        headers = next(f).strip().split("\t")
-        for line in f:
-            meta.append(dict(zip(headers, line.strip().split("\t"))))
-    process_map(
-        partial(
-            process_one_sample,
-            store_noise=args.store_noise,
-            speech_dic=speech_dic,
-            noise_dic=noise_dic,
-            rir_dic=rir_dic,
-        ),
-        meta,
-        max_workers=args.nj,
-        chunksize=args.chunksize,
+    return speech_dic, noise_dic, rir_dic
+
+
+def share_path_tables(tables, table_dir):
+    """Write the path tables into `table_dir` to be shared by the workers.
+
+    Args:
+        tables (tuple): (speech_dic, noise_dic, rir_dic) from `load_path_tables`
+        table_dir (Path): output directory of the memory-mapped tables
+    Returns:
+        tables (tuple): `PathTable` of each input table (None is kept as is),
+            which is pickled as a reference to its directory
+    """
+    return tuple(
+        None if dic is None else write_path_table(dic, table_dir / name)
+        for name, dic in zip(("speech", "noise", "rir"), tables)
+    )
+
+
+def report_cache_stats(results, meta):
+    """Print the hit/miss counters of the per-worker caches.
+
+    The expected reuse ratio is the upper bound of the decoded-audio cache hit
+    rate, i.e., the fraction of noise/RIR reads that refer to an already read file.
+
+    Each result holds the cumulative counters of the worker that produced it,
+    so only the latest snapshot per worker is summed up.
+    """
+    for name in (
+        "audio_cache",
+        "rir_spectra_cache",
+        "codec_effector_cache",
+        "resample_filter_cache",
+    ):
+        per_worker = {}
+        for ret in results:
+            stats = ret[name]
+            prev = per_worker.get(ret["pid"])
+            if prev is None or (
+                stats["hits"] + stats["misses"] > prev["hits"] + prev["misses"]
+            ):
+                per_worker[ret["pid"]] = stats
+        hits = sum(stats["hits"] for stats in per_worker.values())
+        misses = sum(stats["misses"] for stats in per_worker.values())
+        total = max(hits + misses, 1)
+        print(
+            f"[{name}] hits: {hits}, misses: {misses}, "
+            f"hit rate: {hits / total * 100:.1f}% ({len(per_worker)} workers)"
+        )
+
+    num_reads, num_unique = 0, 0
+    for field in ("noise_uid", "rir_uid"):
+        reads, unique = count_source_reads(meta, field)
+        num_reads += reads
+        num_unique += unique
+    expected = (num_reads - num_unique) / max(num_reads, 1)
+    print(f"[audio_cache] expected reuse ratio: {expected * 100:.1f}%")
+
+
+def process_batch_and_flush(batch, batch_func=None):
+    """Process a batch with `batch_func` and wait for its queued writes.
+
+    The results are only returned to the main process once all outputs of the
+    batch are written, so that a failed write fails the job before its manifest
+    marks the shard as complete.
+    """
+    results = batch_func(batch)
+    if async_writer is not None:
+        # re-raises the exception of any failed write
+        async_writer.flush()
+        if results:
+            results[-1]["async_writer"] = async_writer.stats()
+    return results
+
+
+def report_writer_stats(results):
+    """Print the number of writes and the time workers were blocked on I/O."""
+    per_worker = {}
+    for ret in results:
+        if "async_writer" not in ret:
+            continue
+        stats = ret["async_writer"]
+        prev = per_worker.get(ret["pid"])
+        if prev is None or (stats["writes"], stats["blocked_sec"]) > (
+            prev["writes"],
+            prev["blocked_sec"],
+        ):
+            per_worker[ret["pid"]] = stats
+    writes = sum(stats["writes"] for stats in per_worker.values())
+    blocked = sum(stats["blocked_sec"] for stats in per_worker.values())
+    print(
+        f"[async_writer] writes: {writes}, time blocked on I/O: {blocked:.1f} sec "
+        f"({blocked / max(len(per_worker), 1):.1f} sec per worker)"
     )
 
 
 def process_one_sample(
     info,
-    force_1ch=True,
     store_noise=False,
+    output_format="files",
+    wds_dir=None,
+    wds_shard_size_mb=1000.0,
+    wds_run_id=None,
+    audio_format="flac",
+    async_write_threads=0,
+    async_write_mb=256.0,
+    profile=False,
+    stream_memory_mb=0.0,
+    journal_dir=None,
+    **kwargs,
+):
+    """Simulate a single sample and save it.
+
+    Args:
+        info (dict): meta information of the sample (a row of the meta file)
+        store_noise (bool): whether to save the scaled noise sample as well
+        output_format (str): "files" to save each audio to the paths given in
+            `info`, or "wds" to append the sample to the tar shard of the worker
+        wds_dir (str): directory of the tar shards (only used for "wds")
+        wds_shard_size_mb (float): target size of each tar shard in MB
+        wds_run_id (str): [optional] ID of the run prepended to the shard names
+        audio_format (str): audio format of the members in the tar shards
+        async_write_threads (int): number of background threads per worker for
+            writing audio files (0 to write synchronously; only used for "files")
+        async_write_mb (float): memory budget in MB of the queued audio per worker
+        profile (bool): whether to record the wall time of each processing stage
+        stream_memory_mb (float): peak memory in MB for simulating a sample
+            (besides the inputs), above which supported samples are simulated
+            block by block (0 to always simulate in memory; only used for "files")
+        journal_dir (str): [optional] directory of the journal recording the
+            completely written output files (only used for "files")
+        kwargs: arguments passed to `simulate_one_sample`
+    Returns:
+        stats (dict): cumulative cache counters of the current worker process,
+            for "wds", the (id, shard, offset) of the sample and, if `profile`
+            is True, the profiling record of the sample
+    """
+    timer = StageTimer() if profile else NULL_TIMER
+    fs = int(info["fs"])
+    ret = {}
+    journal = None if journal_dir is None else get_journal(journal_dir)
+    if output_format == "files" and needs_streaming(info, stream_memory_mb):
+        paths = get_output_paths(info, store_noise)
+        stream_one_sample(
+            info, paths, memory_mb=stream_memory_mb, timer=timer, **kwargs
+        )
+        if journal is not None:
+            for path in paths:
+                journal.record(info["id"], path)
+        ret["streamed"] = True
+    elif output_format == "wds":
+        speech_sample, noisy_speech, noise_sample = simulate_one_sample(
+            info, timer=timer, **kwargs
+        )
+        audios = {"noisy": noisy_speech, "clean": speech_sample}
+        if store_noise:
+            audios["noise"] = noise_sample
+        writer = get_shard_writer(wds_dir, wds_shard_size_mb, run_id=wds_run_id)
+        with timer("save"):
+            shard_name, offset = writer.write(
+                info["id"], audios, fs, info, audio_format=audio_format
+            )
+        ret["wds"] = (info["id"], shard_name, offset)
+    else:
+        speech_sample, noisy_speech, noise_sample = simulate_one_sample(
+            info, timer=timer, **kwargs
+        )
+        outputs = zip(
+            (speech_sample, noisy_speech, noise_sample),
+            get_output_paths(info, store_noise),
+        )
+        save_func = save_audio
+        if journal is not None:
+            # each file is recorded in the journal once it is completely written
+            save_func = partial(journal.write, info["id"], encode_audio)
+        writer = get_async_writer(async_write_threads, async_write_mb)
+        with timer("save"):
+            for audio, path in outputs:
+                if writer is None:
+                    save_func(audio, path, fs)
+                else:
+                    writer.submit(save_func, audio, path, fs)
+        if writer is not None:
+            ret["async_writer"] = writer.stats()
+
+    ret["pid"] = os.getpid()
+    ret["audio_cache"] = get_audio_cache().stats()
+    ret["rir_spectra_cache"] = get_reverb_engine().stats()
+    ret["codec_effector_cache"] = get_codec_engine().stats()
+    ret["resample_filter_cache"] = get_resample_engine().stats()
+    if profile:
+        ret["profile"] = timer.record(info)
+    return ret
+
+
+def read_inputs(
+    info,
+    force_1ch=True,
+    audio_cache_mb=0.0,
+    noise_bank_dir=None,
     speech_dic=None,
     noise_dic=None,
     rir_dic=None,
+    timer=NULL_TIMER,
+    dtype="float64",
 ):
+    """Read the speech, noise and RIR samples of a row of the meta file.
+
+    Noise and RIR samples may be shared with the per-worker cache or the noise
+    bank and must not be modified in place. Noise samples read from the noise
+    bank may be in its storage dtype (segments are cast to `dtype` after cropping).
+
+    Args:
+        info (dict): meta information of the sample (a row of the meta file)
+        force_1ch (bool): whether to only use the first channel of the inputs
+        audio_cache_mb (float): memory budget of the decoded-audio cache per worker
+        noise_bank_dir (str): [optional] directory of the memory-mapped noise bank
+        speech_dic (dict or PathTable): speech uid -> audio path
+        noise_dic (dict or PathTable): noise uid -> audio path
+        rir_dic (dict or PathTable): RIR uid -> audio path
+        timer (StageTimer): [optional] timer recording the decoding/resampling time
+        dtype (str): floating-point type of the returned samples
+    Returns:
+        speech_sample (np.ndarray): speech sample (Channel, Time)
+        noise_sample (np.ndarray): noise sample (Channel, Time)
+        rir_sample (np.ndarray): RIR sample (Channel, Time), or None without RIR
+    """
+    fs = int(info["fs"])
+    cache = get_audio_cache(audio_cache_mb)
+    speech = speech_dic[info["speech_uid"]]
+    kwargs = dict(force_1ch=force_1ch, fs=fs, timer=timer, dtype=dtype)
+    speech_sample = read_audio(speech, **kwargs)[0]
+
+    bank = None if noise_bank_dir is None else get_noise_bank(noise_bank_dir)
+    if bank is not None and info["noise_uid"] in bank:
+        # the noise bank is always 1ch
+        noise_sample = read_noise_bank(
+            bank, info["noise_uid"], fs, cache=cache, timer=timer, dtype=dtype
+        )
+    else:
+        noise = noise_dic[info["noise_uid"]]
+        noise_sample = read_audio_cached(noise, cache=cache, **kwargs)[0]
+
+    rir_sample = None
+    if info["rir_uid"] != "none":
+        rir = rir_dic[info["rir_uid"]]
+        rir_sample = read_audio_cached(rir, cache=cache, **kwargs)[0]
+    return speech_sample, noise_sample, rir_sample
+
+
+def simulate_one_sample(
+    info,
+    force_1ch=True,
+    wind_noise_backend="native",
+    resample_backend="librosa",
+    noise_power="exact",
+    rir_cache_mb=256.0,
+    audio_cache_mb=0.0,
+    noise_bank_dir=None,
+    speech_dic=None,
+    noise_dic=None,
+    rir_dic=None,
+    inputs=None,
+    timer=NULL_TIMER,
+    dtype="float64",
+    rir_catalog_path=None,
+    seed=None,
+):
+    """Simulate a single noisy sample described by a row of the meta file.
+
+    Args:
+        info (dict): meta information of the sample (a row of the meta file)
+        force_1ch (bool): whether to only use the first channel of the inputs
+        wind_noise_backend (str): backend of the wind-noise simulation
+        resample_backend (str): backend of the bandwidth limitation
+            ("librosa", "cached" or "soxr")
+        noise_power (str): "exact" to detect the non-silent part of the noise
+            segment, or "index" to estimate its power from the energy index of
+            the noise bank (if available; the segment is aligned to hops)
+        rir_cache_mb (float): memory budget of the RIR spectra cache per worker
+        audio_cache_mb (float): memory budget of the decoded-audio cache per worker
+        noise_bank_dir (str): [optional] directory of the memory-mapped noise bank
+        speech_dic (dict or PathTable): speech uid -> audio path
+        noise_dic (dict or PathTable): noise uid -> audio path
+        rir_dic (dict or PathTable): RIR uid -> audio path
+        inputs (tuple): [optional] (speech, noise, RIR) samples already read by
+            `read_inputs`, e.g., by the prefetching reader threads
+        timer (StageTimer): [optional] timer recording the time of each stage
+            (reading prefetched inputs is not recorded)
+        dtype (str): floating-point type used throughout the simulation
+            ("float32" halves the memory traffic at a slight loss of precision)
+        rir_catalog_path (str): [optional] RIR catalog built by rir_catalog.py,
+            from which the end of the early RIR is read instead of estimated
+        seed (int or list): [optional] seed of the random number generator
+            (the number in the sample ID by default)
+    Returns:
+        speech_sample (np.ndarray): clean reference speech (Channel, Time)
+        noisy_speech (np.ndarray): simulated noisy speech (Channel, Time)
+        noise_sample (np.ndarray): scaled noise (Channel, Time)
+        All outputs are normalized with the same scale to avoid clipping.
+    """
     uid = info["id"]
     fs = int(info["fs"])
     snr = float(info["snr_dB"])
 
-    speech = speech_dic[info["speech_uid"]]
-    noise = noise_dic[info["noise_uid"]]
-    speech_sample = read_audio(speech, force_1ch=force_1ch, fs=fs)[0]
-    noise_sample = read_audio(noise, force_1ch=force_1ch, fs=fs)[0]
+    if inputs is None:
+        inputs = read_inputs(
+            info,
+            force_1ch=force_1ch,
+            audio_cache_mb=audio_cache_mb,
+            noise_bank_dir=noise_bank_dir,
+            speech_dic=speech_dic,
+            noise_dic=noise_dic,
+            rir_dic=rir_dic,
+            timer=timer,
+            dtype=dtype,
+        )
+    speech_sample, noise_sample, rir_sample = inputs
 
     noisy_speech = deepcopy(speech_sample)
 
-    # augmentation information, split by /
-    augmentations = info["augmentation"].split("/")
+    # augmentation information: list of (name, params)
+    augmentations = get_augmentations(info)
 
     rir_uid = info["rir_uid"]
     if rir_uid != "none":
-        rir = rir_dic[rir_uid]
-        rir_sample = read_audio(rir, force_1ch=force_1ch, fs=fs)[0]
-        noisy_speech = add_reverberation(speech_sample, rir_sample)
         # make sure the clean speech is aligned with the input noisy speech
-        early_rir_sample = estimate_early_rir(rir_sample, fs=fs)
-        speech_sample = add_reverberation(speech_sample, early_rir_sample)
+        # (convolved with the early RIR)
+        with timer("reverberation"):
+            engine = get_reverb_engine(rir_cache_mb)
+            rir_stop_sample = get_rir_stop_sample(
+                rir_catalog_path,
+                rir_uid,
+                fs,
+                len(rir_sample),
+                engine.early_rir_sec,
+            )
+            noisy_speech, speech_sample = engine.apply(
+                speech_sample,
+                rir_sample,
+                fs,
+                rir_uid=rir_uid,
+                rir_stop_sample=rir_stop_sample,
+            )
     else:
         noisy_speech = speech_sample
 
-    rng = np.random.default_rng(int(uid.split("_")[-1]))
+    if seed is None:
+        seed = int(uid.split("_")[-1])
+    rng = np.random.default_rng(seed)
+    noise_energy = None
+    if noise_power == "index":
+        noise_energy = get_noise_energy(noise_bank_dir, info["noise_uid"], fs)
 
     # simulation with non-linear wind-noise mixing
     if info["noise_uid"].startswith("wind_noise"):
         nuid = info["noise_uid"]
-        augmentation = [a for a in augmentations if a.startswith("wind_noise")]
+        augmentation = [params for a, params in augmentations if a == "wind_noise"]
         assert (
             len(augmentation) == 1
         ), f"Configuration for the wind-noise simulation is necessary: {augmentation} {nuid}"
 
-        # threshold, ratio, attack, release, sc_gain, snr, clipping, clipping_threshold
-        match = re.fullmatch(
-            f"wind_noise\(threshold=(.*),ratio=(.*),attack=(.*),release=(.*),sc_gain=(.*),clipping=(.*),clipping_threshold=(.*)\)",
-            augmentation[0],
-        )
-        (
-            threshold_,
-            ratio_,
-            attack_,
-            release_,
-            sc_gain_,
-            clipping_,
-            clipping_threshold_,
-        ) = match.groups()
-        noisy_speech, noise_sample = wind_noise(
-            noisy_speech,
-            noise_sample,
-            fs,
-            uid,
-            float(threshold_),
-            float(ratio_),
-            float(attack_),
-            float(release_),
-            float(sc_gain_),
-            bool(clipping_),
-            float(clipping_threshold_),
-            float(snr),
-            rng=rng,
-        )
+        params = augmentation[0]
+        with timer("wind_noise"):
+            noisy_speech, noise_sample = wind_noise(
+                noisy_speech,
+                noise_sample,
+                fs,
+                uid,
+                params["threshold"],
+                params["ratio"],
+                params["attack"],
+                params["release"],
+                params["sc_gain"],
+                # the original simulation parsed the flag with bool(str), which
+                # is also True for "False" (kept for identical outputs)
+                bool(str(params["clipping"])),
+                params["clipping_threshold"],
+                float(snr),
+                rng=rng,
+                backend=wind_noise_backend,
+                noise_energy=noise_energy,
+            )
+            noisy_speech = noisy_speech.astype(dtype, copy=False)
+            noise_sample = noise_sample.astype(dtype, copy=False)
     # just an additive noise
     else:
-        noisy_speech, noise_sample = mix_noise(
-            noisy_speech, noise_sample, snr=snr, rng=rng
-        )
-
-    # apply an additional augmentation
-    for augmentation in augmentations:
-        if augmentation == "none" or augmentation == "":
-            pass
-        elif augmentation.startswith("wind_noise"):
-            pass
-        elif augmentation.startswith("bandwidth_limitation"):
-            match = re.fullmatch(f"bandwidth_limitation-(.*)->(\d+)", augmentation)
-            res_type, fs_new = match.groups()
-            noisy_speech = bandwidth_limitation(
-                noisy_speech, fs=fs, fs_new=int(fs_new), res_type=res_type
-            )
-        elif augmentation.startswith("clipping"):
-            match = re.fullmatch(f"clipping\(min=(.*),max=(.*)\)", augmentation)
-            min_, max_ = map(float, match.groups())
-            noisy_speech = clipping(noisy_speech, min_quantile=min_, max_quantile=max_)
-        elif augmentation.startswith("codec"):
-            # match = re.fullmatch(f"codec\(vbr_quality=(.*)\)", augmentation)
-            # vbr_quality_ = match.groups()[0]
-            # noisy_speech = codec_compression(noisy_speech, fs, float(vbr_quality_))
-            match = re.fullmatch(
-                f"codec\(format=(.*),encoder=(.*),qscale=(.*)\)", augmentation
-            )
-            format, encoder, qscale = match.groups()
-            noisy_speech = codec_compression(
-                noisy_speech, fs, format=format, encoder=encoder, qscale=int(qscale)
+        with timer("mix_noise"):
+            noisy_speech, noise_sample = mix_noise(
+                noisy_speech, noise_sample, snr=snr, rng=rng, noise_energy=noise_energy
             )
 
-        elif augmentation.startswith("packet_loss"):
-            match = re.fullmatch(
-                f"packet_loss\(packet_loss_indices=(.*),packet_duration_ms=(.*)\)",
-                augmentation,
-            )
-            packet_loss_indices_, packet_duration_ms_ = match.groups()
-            packet_loss_indices_ = ast.literal_eval(
-                packet_loss_indices_
-            )  # convert string to list
-            noisy_speech = packet_loss(
-                noisy_speech, fs, packet_loss_indices_, int(packet_duration_ms_)
-            )
-        else:
-            raise NotImplementedError(augmentation)
+    # apply an additional augmentation
+    for augmentation, params in augmentations:
+        if augmentation == "wind_noise":
+            # already applied above
+            continue
+        with timer(augmentation):
+            if augmentation == "bandwidth_limitation":
+                noisy_speech = bandwidth_limitation(
+                    noisy_speech,
+                    fs=fs,
+                    fs_new=params["fs_new"],
+                    res_type=params["res_type"],
+                    backend=resample_backend,
+                )
+            elif augmentation == "clipping":
+                noisy_speech = clipping(
+                    noisy_speech, min_quantile=params["min"], max_quantile=params["max"]
+                )
+            elif augmentation == "codec":
+                noisy_speech = codec_compression(
+                    noisy_speech,
+                    fs,
+                    format=params["format"],
+                    encoder=params["encoder"],
+                    qscale=params["qscale"],
+                )
+            elif augmentation == "packet_loss":
+                noisy_speech = packet_loss(
+                    noisy_speech,
+                    fs,
+                    params["packet_loss_indices"],
+                    params["packet_duration_ms"],
+                )
+            else:
+                raise NotImplementedError(augmentation)
+            # e.g., np.quantile in clipping returns float64 thresholds
+            noisy_speech = noisy_speech.astype(dtype, copy=False)
 
     length = int(info["length"])
     assert noisy_speech.shape[-1] == length, (info, noisy_speech.shape)
 
     # normalization
-    scale = 0.9 / max(
-        np.max(np.abs(noisy_speech)),
-        np.max(np.abs(speech_sample)),
-        np.max(np.abs(noise_sample)),
-    )
+    with timer("normalization"):
+        scale = 0.9 / max(
+            np.max(np.abs(noisy_speech)),
+            np.max(np.abs(speech_sample)),
+            np.max(np.abs(noise_sample)),
+        )
+        speech_sample = speech_sample * scale
+        noisy_speech = noisy_speech * scale
+        noise_sample = noise_sample * scale
 
-    save_audio(speech_sample * scale, info["clean_path"], fs)
-    save_audio(noisy_speech * scale, info["noisy_path"], fs)
-    if store_noise:
-        save_audio(noise_sample * scale, info["noise_path"], fs)
+    return speech_sample, noisy_speech, noise_sample
+
+
+def needs_streaming(info, memory_mb):
+    """Whether the sample should be simulated block by block within `memory_mb`.
+
+    Only samples with additive (non-wind) noise, optional reverberation and
+    packet loss can be streamed; other long samples are simulated in memory.
+    """
+    if memory_mb <= 0:
+        return False
+    if IN_MEMORY_COPIES * int(info["length"]) * 8 <= memory_mb * 1024 * 1024:
+        return False
+    if info["noise_uid"].startswith("wind_noise"):
+        return False
+    augmentations = get_augmentations(info)
+    return all(aug in STREAMABLE_AUGMENTATIONS for aug, _ in augmentations)
+
+
+def stream_one_sample(
+    info,
+    output_paths,
+    memory_mb=256.0,
+    force_1ch=True,
+    wind_noise_backend="native",
+    resample_backend="librosa",
+    noise_power="exact",
+    rir_cache_mb=256.0,
+    audio_cache_mb=0.0,
+    noise_bank_dir=None,
+    speech_dic=None,
+    noise_dic=None,
+    rir_dic=None,
+    inputs=None,
+    timer=NULL_TIMER,
+    dtype="float64",
+    rir_catalog_path=None,
+):
+    """Simulate a sample block by block and write the outputs while streaming.
+
+    Equivalent to `simulate_one_sample` followed by `save_audio` for the samples
+    accepted by `needs_streaming`, but no full-length copy of the signals is
+    made besides the inputs. The blocks are computed three times: for the
+    speech/noise power, for the normalization peak and for writing.
+
+    Args:
+        info (dict): meta information of the sample (a row of the meta file)
+        output_paths (list): paths to the clean, noisy and (optionally) noise outputs
+        memory_mb (float): memory budget in MB of the processed blocks
+        wind_noise_backend (str): unused (wind noise is not streamed)
+        resample_backend (str): unused (bandwidth limitation is not streamed)
+        noise_power (str): "exact" or "index" (see `simulate_one_sample`)
+        inputs (tuple): [optional] (speech, noise, RIR) samples already read
+        timer (StageTimer): [optional] timer recording the time of each stage
+        dtype (str): floating-point type used throughout the simulation
+        rir_catalog_path (str): [optional] RIR catalog built by rir_catalog.py
+        Other arguments are the same as in `simulate_one_sample`.
+    """
+    uid = info["id"]
+    fs = int(info["fs"])
+    snr = float(info["snr_dB"])
+    if inputs is None:
+        inputs = read_inputs(
+            info,
+            force_1ch=force_1ch,
+            audio_cache_mb=audio_cache_mb,
+            noise_bank_dir=noise_bank_dir,
+            speech_dic=speech_dic,
+            noise_dic=noise_dic,
+            rir_dic=rir_dic,
+            timer=timer,
+            dtype=dtype,
+        )
+    speech_sample, noise_sample, rir_sample = inputs
+    len_speech = speech_sample.shape[-1]
+    assert len_speech == int(info["length"]), (info, speech_sample.shape)
+
+    with timer("streaming"):
+        rev_channels = speech_sample.shape[0] if rir_sample is None else len(rir_sample)
+        num_channels = max(rev_channels, noise_sample.shape[0])
+        memory_bytes = memory_mb * 1024 * 1024
+        memory_bytes -= sum(x.nbytes for x in inputs if x is not None)
+        len_rir = 1 if rir_sample is None else rir_sample.shape[-1]
+        fft_size, block_size = get_block_size(memory_bytes, num_channels, len_rir)
+        spectra = None
+        if rir_sample is not None:
+            engine = get_reverb_engine(rir_cache_mb)
+            rir_stop_sample = get_rir_stop_sample(
+                rir_catalog_path,
+                info["rir_uid"],
+                fs,
+                len(rir_sample),
+                engine.early_rir_sec,
+            )
+            spectra = engine.get_rir_spectra(
+                rir_sample,
+                fs,
+                fft_size,
+                rir_uid=info["rir_uid"],
+                rir_stop_sample=rir_stop_sample,
+            )
+
+        rng = np.random.default_rng(int(uid.split("_")[-1]))
+        offset = noise_offset(len_speech, noise_sample.shape[-1], rng)
+
+        def iter_blocks(noise_scale=1.0):
+            """Yield (start, clean, noisy, noise) blocks before normalization."""
+            for start, (reverberant, early) in stream_reverberation(
+                speech_sample, spectra, fft_size, block_size
+            ):
+                stop = start + reverberant.shape[-1]
+                noise = noise_segment(noise_sample, offset, start, stop, len_speech)
+                noise = to_float(noise, dtype)
+                noise = (noise_scale * noise).astype(dtype, copy=False)
+                noisy = reverberant + noise
+                for aug, params in get_augmentations(info):
+                    assert aug == "packet_loss", aug
+                    duration = params["packet_duration_ms"]
+                    for idx in params["packet_loss_indices"]:
+                        lo = max(idx * duration * fs // 1000, start)
+                        hi = min((idx + 1) * duration * fs // 1000, stop)
+                        if lo < hi:
+                            noisy[:, lo - start : hi - start] = 0
+                yield start, early, noisy, noise
+
+        noise_energy = None
+        if noise_power == "index" and noise_sample.shape[-1] >= len_speech:
+            noise_energy = get_noise_energy(noise_bank_dir, info["noise_uid"], fs)
+
+        # pass 1: power of the non-silent (reverberant) speech and noise
+        power_speech = NonSilencePower(len_speech, rev_channels)
+        power_noise = NonSilencePower(len_speech, noise_sample.shape[0])
+        for start, (reverberant, _) in stream_reverberation(
+            speech_sample, spectra, fft_size, block_size
+        ):
+            stop = start + reverberant.shape[-1]
+            power_speech.update(start, reverberant)
+            if noise_energy is None:
+                noise = noise_segment(noise_sample, offset, start, stop, len_speech)
+                power_noise.update(start, to_float(noise, dtype))
+        if noise_energy is None:
+            power_noise = power_noise.power()
+        else:
+            power_noise = indexed_power(noise_energy, offset, len_speech)
+        noise_scale = (
+            10 ** (-snr / 20)
+            * np.sqrt(power_speech.power())
+            / np.sqrt(max(power_noise, 1e-10))
+        )
+
+        # pass 2: peak amplitude for the normalization
+        peak = 0.0
+        for _, *blocks in iter_blocks(noise_scale):
+            peak = max(peak, *(np.max(np.abs(block)) for block in blocks))
+        scale = float(0.9 / peak)
+
+    # pass 3: write the normalized outputs
+    with timer("save"), ExitStack() as stack:
+        files = None
+        for _, *blocks in iter_blocks(noise_scale):
+            if files is None:
+                files = [
+                    stack.enter_context(
+                        sf.SoundFile(path, "w", samplerate=fs, channels=len(block))
+                    )
+                    for path, block in zip(output_paths, blocks)
+                ]
+            for f, block in zip(files, blocks):
+                block = block * scale
+                f.write(block[0] if len(block) == 1 else block.T)
 
 
 if __name__ == "__main__":
     parser = get_parser()
+    # parallel workers by default (parameter generation defaults to --nj 1)
+    parser.set_defaults(nj=8)
     group = parser.add_argument_group(description="New arguments")
     group.add_argument(
         "--meta_tsv",
         type=str,
         required=True,
-        help="Path to the tsv file containing meta information for simulation",
+        help="Path to the meta file (meta.tsv or meta.parquet) containing "
+        "meta information for simulation",
     )
     group.add_argument(
-        "--nj",
+        "--nsplits",
         type=int,
-        default=8,
-        help="Number of parallel workers to speed up simulation",
+        default=1,
+        help="Total number of computing nodes to speed up simulation. Rows are "
+        "split deterministically into shards of similar estimated cost",
+    )
+    group.add_argument(
+        "--job",
+        type=int,
+        default=1,
+        help="Index of the current node (starting from 1). A manifest is written "
+        "to {output_dir}/manifests when all rows of the shard are simulated",
+    )
+    group.add_argument(
+        "--verify_manifests",
+        type=str2bool,
+        default=False,
+        help="Only check that the manifests of all --nsplits jobs exist and match "
+        "the meta file (exits with an error otherwise)",
+    )
+    group.add_argument(
+        "--resume",
+        type=str2bool,
+        default=False,
+        help="Record the completely written output files in a journal "
+        "({output_dir}/journal), skip the rows whose outputs are recorded in the "
+        "journal of a previous run with --resume, and regenerate missing or "
+        "partially written ones (only for --output_format files)",
+    )
+    group.add_argument(
+        "--resume_checksum",
+        type=str2bool,
+        default=False,
+        help="Verify the CRC32 checksum of each output file when resuming "
+        "(reads all outputs) instead of only comparing the file size",
     )
     group.add_argument(
         "--chunksize",
@@ -530,6 +1491,144 @@ if __name__ == "__main__":
         default=1000,
         help="Chunk size used in process_map",
     )
+    group.add_argument(
+        "--wind_noise_backend",
+        type=str,
+        default=None,
+        choices=["native", "ffmpeg"],
+        help="Implementation of the sidechain compressor used for wind noise:\n"
+        "native (in-process NumPy/numba) or ffmpeg (external subprocess)\n"
+        "(default: native if numba is installed, otherwise ffmpeg)",
+    )
+    group.add_argument(
+        "--resample_backend",
+        type=str,
+        default="librosa",
+        choices=["librosa", "cached", "soxr"],
+        help="Implementation of the resampling in bandwidth limitation:\n"
+        "librosa (librosa.resample), cached (same filters as librosa, designed\n"
+        "once per worker) or soxr (faster, but not identical to librosa)",
+    )
+    group.add_argument(
+        "--rir_cache_mb",
+        type=float,
+        default=256.0,
+        help="Memory budget in MB of the RIR spectra cached in each worker "
+        "for reverberation (0 to disable caching)",
+    )
+    group.add_argument(
+        "--schedule",
+        type=str,
+        default="sequential",
+        choices=["sequential", "grouped"],
+        help="Order in which meta rows are distributed to workers:\n"
+        "sequential (file order) or grouped (rows sharing the same "
+        "noise/RIR are batched together to improve cache hits)",
+    )
+    group.add_argument(
+        "--noise_bank",
+        type=str,
+        default=None,
+        help="Directory of the memory-mapped noise bank built by "
+        "simulation/noise_bank.py (if not provided, noise files are decoded "
+        "individually)",
+    )
+    group.add_argument(
+        "--noise_power",
+        type=str,
+        default="exact",
+        choices=["exact", "index"],
+        help="Power of the noise segment used for the SNR scaling:\n"
+        "exact (detect_non_silence on the segment) or index (estimated from the\n"
+        "energy index of --noise_bank without reading the segment, aligned to\n"
+        "hops of 512 samples)",
+    )
+    group.add_argument(
+        "--rir_catalog",
+        type=str,
+        default=None,
+        help="RIR catalog built by simulation/rir_catalog.py, from which the end "
+        "of the early RIR is read instead of being estimated for each sample",
+    )
+    group.add_argument(
+        "--audio_cache_mb",
+        type=float,
+        default=0.0,
+        help="Memory budget in MB of the decoded noise/RIR audio cache in each\n"
+        "worker (0 to disable caching). The budget is per worker, so the total\n"
+        "memory is up to --nj times as much (e.g., 16 GB for 256 MB with --nj 64)",
+    )
+    group.add_argument(
+        "--output_format",
+        type=str,
+        default="files",
+        choices=["files", "wds"],
+        help="How simulated samples are stored:\n"
+        "files (one audio file per path in the meta file) or wds (samples of "
+        "each worker are streamed into rotating WebDataset tar shards in "
+        "{output_dir}/wds, with an index mapping each id to (shard, offset))",
+    )
+    group.add_argument(
+        "--wds_shard_size_mb",
+        type=float,
+        default=1000.0,
+        help="Target size in MB of each tar shard (only used for --output_format wds)",
+    )
+    group.add_argument(
+        "--async_write_threads",
+        type=int,
+        default=0,
+        help="Number of background threads in each worker that write the "
+        "simulated audio files while the next sample is processed "
+        "(0 to write synchronously; only used for --output_format files)",
+    )
+    group.add_argument(
+        "--async_write_mb",
+        type=float,
+        default=256.0,
+        help="Memory budget in MB of the audio queued for writing in each worker",
+    )
+    group.add_argument(
+        "--prefetch_depth",
+        type=int,
+        default=0,
+        help="Number of rows whose speech/noise/RIR audio is read ahead in "
+        "background threads of each worker (0 to disable prefetching)",
+    )
+    group.add_argument(
+        "--prefetch_mb",
+        type=float,
+        default=512.0,
+        help="Memory budget in MB of the prefetched audio in each worker",
+    )
+    group.add_argument(
+        "--prefetch_threads",
+        type=int,
+        default=2,
+        help="Number of reader threads in each worker used for prefetching",
+    )
+    group.add_argument(
+        "--stream_memory_mb",
+        type=float,
+        default=0.0,
+        help="Peak memory in MB per worker for simulating a single sample. Longer "
+        "samples with additive noise, reverberation and packet loss only are "
+        "simulated block by block (0 to always simulate in memory)",
+    )
+    group.add_argument(
+        "--dtype",
+        type=str,
+        default="float64",
+        choices=["float64", "float32"],
+        help="Floating-point type used from decoding to writing the audio",
+    )
+    group.add_argument(
+        "--profile_tsv",
+        type=str,
+        default=None,
+        help="If provided, the wall time of each processing stage of each sample "
+        "is written to this TSV file and summarized at the end",
+    )
     args = parser.parse_args()
     print(args)
 
@@ -0,0 +1,232 @@
+"""Building blocks of the bounded-memory (block-streaming) simulation.
+
+Long utterances are processed in blocks instead of materializing several
+full-length copies of the signal:
+    - reverberation uses overlap-add convolution with the cached RIR spectra
+    - the noise segment is indexed block by block (incl. wrap-around repetition)
+    - the speech/noise power on non-silent frames is accumulated from per-hop
+      energies, which reproduces `espnet2.train.preprocessor.detect_non_silence`
+      (and allows estimating the power of noise segments from the hop energies
+      precomputed in the noise bank)
+"""
+
+import numpy as np
+import scipy.fft
+
+# default parameters of espnet2.train.preprocessor.detect_non_silence
+NON_SILENCE_THRESHOLD = 0.01
+FRAME_LENGTH = 1024
+FRAME_SHIFT = 512
+
+
+class NonSilencePower:
+    """Accumulate the mean power of the non-silent part of a signal block by block.
+
+    The result equals `(x[detect_non_silence(x)] ** 2).mean()` (with the default
+    parameters), which needs the whole signal since the threshold is relative to
+    the mean frame power. As frames are two hops long, only the energy of each
+    hop of FRAME_SHIFT samples has to be kept.
+    """
+
+    def __init__(self, length, num_channels):
+        self.length = length
+        num_hops = -(-length // FRAME_SHIFT)
+        self.hop_energy = np.zeros((num_channels, num_hops))
+
+    def update(self, start, block):
+        """Add a block (Channel, Time) starting at sample `start`.
+
+        `start` must be a multiple of FRAME_SHIFT.
+        """
+        assert start % FRAME_SHIFT == 0, start
+        num_hops = -(-block.shape[-1] // FRAME_SHIFT)
+        hop = start // FRAME_SHIFT
+        self.hop_energy[:, hop : hop + num_hops] += get_hop_energy(block)
+
+    def power(self):
+        return non_silence_power(self.hop_energy, self.length)
+
+
+def non_silence_power(energy, length):
+    """Return the mean power of the non-silent part of a signal from hop energies.
+
+    Args:
+        energy (np.ndarray): energy of each hop of FRAME_SHIFT samples of the
+            signal (Channel, ceil(length / FRAME_SHIFT)), the last hop zero-padded
+        length (int): number of samples of the signal
+    Returns:
+        power (float): same as `(x[detect_non_silence(x)] ** 2).mean()`
+    """
+    num_channels = energy.shape[0]
+    if length < FRAME_LENGTH:
+        return energy.sum() / (num_channels * length)
+    # frames of FRAME_LENGTH samples with a shift of FRAME_SHIFT (zero-padded)
+    num_frames = energy.shape[-1] - 1
+    frame_power = (energy[:, :-1] + energy[:, 1:]) / FRAME_LENGTH
+    mean_power = frame_power.mean(axis=-1, keepdims=True)
+    if np.all(mean_power == 0):
+        return energy.sum() / (num_channels * length)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        detect = frame_power / mean_power > NON_SILENCE_THRESHOLD
+    # the samples after the last full hop follow the decision of the last frame
+    tail_length = length - num_frames * FRAME_SHIFT
+    total = energy[:, :-1][detect].sum() + energy[:, -1][detect[:, -1]].sum()
+    count = detect.sum() * FRAME_SHIFT + detect[:, -1].sum() * tail_length
+    return total / count
+
+
+def get_hop_energy(x):
+    """Return the energy of each hop of FRAME_SHIFT samples (Channel, Time)."""
+    num_hops = -(-x.shape[-1] // FRAME_SHIFT)
+    pad = num_hops * FRAME_SHIFT - x.shape[-1]
+    energy = np.pad(x, [(0, 0), (0, pad)]) ** 2
+    return energy.reshape(x.shape[0], num_hops, FRAME_SHIFT).sum(axis=-1)
+
+
+def indexed_power(hop_energy, offset, length):
+    """Estimate the non-silent power of a segment from the hop energies of a signal.
+
+    Only `ceil(length / FRAME_SHIFT)` precomputed hop energies are read instead
+    of all samples of the segment `x[:, offset : offset + length]`. The segment is
+    aligned to the nearest hop boundary of the signal, so the result equals
+    that of `detect_non_silence` on the segment only if `offset` is a multiple of
+    FRAME_SHIFT and the segment ends at a hop boundary or at the end of `x`.
+
+    Args:
+        hop_energy (np.ndarray): hop energies of the full signal (Channel, Hops),
+            e.g., from the energy index of the noise bank
+        offset (int): start of the segment in samples
+        length (int): number of samples of the segment
+    Returns:
+        power (float): mean power of the non-silent part of the segment
+    """
+    num_hops = -(-length // FRAME_SHIFT)
+    start = min(round(offset / FRAME_SHIFT), hop_energy.shape[-1] - num_hops)
+    return non_silence_power(hop_energy[:, start : start + num_hops], length)
+
+
+def noise_offset(len_speech, len_noise, rng):
+    """Draw the offset of the noise segment in the same way as `mix_noise`."""
+    if len_noise < len_speech:
+        return rng.integers(0, len_speech - len_noise)
+    elif len_noise > len_speech:
+        return rng.integers(0, len_noise - len_speech)
+    return 0
+
+
+def noise_segment(noise_sample, offset, start, stop, len_speech):
+    """Return samples [start, stop) of the noise segment used by `mix_noise`.
+
+    Shorter noise is repeated (wrap-around padding starting at `offset`),
+    longer noise is cropped from `offset`.
+    """
+    len_noise = noise_sample.shape[-1]
+    if len_noise < len_speech:
+        return noise_sample[:, (np.arange(start, stop) - offset) % len_noise]
+    elif len_noise > len_speech:
+        return noise_sample[:, offset + start : offset + stop]
+    return noise_sample[:, start:stop]
+
+
+def stream_reverberation(speech_sample, spectra, fft_size, block_size):
+    """Convolve the speech with the full and early RIRs by overlap-add.
+
+    Args:
+        speech_sample (np.ndarray): a single speech sample (1, Time)
+        spectra (np.ndarray): spectra of the full and early RIRs computed with
+            `fft_size` (2, Channel, fft_size // 2 + 1), or None without RIR
+        fft_size (int): FFT size, at least block_size + RIR length - 1
+        block_size (int): number of samples per block
+    Yields:
+        start (int): index of the first sample of the block
+        block (np.ndarray): reverberant and early-reverberant speech of the block
+            (2, Channel, block_size), truncated to the speech length
+    """
+    len_speech = speech_sample.shape[-1]
+    if spectra is None:
+        for start in range(0, len_speech, block_size):
+            block = speech_sample[:, start : start + block_size]
+            yield start, np.stack([block, block])
+        return
+
+    overlap = fft_size - block_size
+    tail = np.zeros(spectra.shape[:-1] + (overlap,), dtype=speech_sample.dtype)
+    for start in range(0, len_speech, block_size):
+        x = speech_sample[:, start : start + block_size]
+        y = scipy.fft.irfft(scipy.fft.rfft(x, n=fft_size) * spectra, n=fft_size)
+        y[..., :overlap] += tail
+        length = x.shape[-1]
+        tail = y[..., length : length + overlap]
+        yield start, y[..., :length]
+
+
+def get_block_size(memory_bytes, num_channels, len_rir=1):
+    """Choose the FFT size and block size fitting into `memory_bytes`.
+
+    Each FFT bin needs the speech spectrum, the stacked RIR spectra, their
+    product and the inverse transform, plus the mixed outputs of the block.
+
+    Returns:
+        fft_size (int): FFT size (power of 2)
+        block_size (int): number of samples per block (multiple of FRAME_SHIFT)
+    """
+    bytes_per_sample = 8 + 80 * num_channels
+    fft_size = 1 << int(np.ceil(np.log2(len_rir - 1 + FRAME_SHIFT)))
+    while (fft_size * 2) * bytes_per_sample <= memory_bytes:
+        fft_size *= 2
+    block_size = (fft_size - len_rir + 1) // FRAME_SHIFT * FRAME_SHIFT
+    return fft_size, block_size
+
+
+if __name__ == "__main__":
+    # Compare the block-streaming simulation against the in-memory simulation
+    import argparse
+    import tempfile
+    from pathlib import Path
+
+    import soundfile as sf
+    from simulate_data_from_param import (
+        save_audio,
+        simulate_one_sample,
+        stream_one_sample,
+    )
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fs", type=int, default=48000)
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--memory_mb", type=float, default=32.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = int(args.fs * args.duration)
+    t = np.arange(n) / args.fs
+    speech = 0.3 * np.sin(2 * np.pi * 200 * t)[None] * (np.sin(2 * np.pi * t) > 0)
+    noise = 0.1 * rng.standard_normal((1, int(args.fs * 7.3)))
+    rir = rng.standard_normal((1, args.fs // 2)) * np.exp(
+        -np.arange(args.fs // 2) / 3000
+    )
+    rir[0, 0] = 1.0
+    info = {
+        "id": "fileid_1",
+        "fs": str(args.fs),
+        "snr_dB": "5.0",
+        "length": str(n),
+        "noise_uid": "noise",
+        "rir_uid": "rir",
+        "augmentation": "packet_loss(packet_loss_indices=[5, 6, 100],"
+        "packet_duration_ms=20)",
+    }
+    inputs = (speech, noise, rir)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        outputs = simulate_one_sample(info, inputs=inputs)
+        for name, audio in zip(("clean", "noisy", "noise"), outputs):
+            save_audio(audio, tmp / f"{name}_ref.wav", args.fs)
+        memory_mb = args.memory_mb + sum(x.nbytes for x in inputs) / 1024 / 1024
+        paths = [tmp / f"{name}.wav" for name in ("clean", "noisy", "noise")]
+        stream_one_sample(info, paths, memory_mb=memory_mb, inputs=inputs)
+        for name in ("clean", "noisy", "noise"):
+            ref = sf.read(tmp / f"{name}_ref.wav", dtype="int16")[0].astype(int)
+            out = sf.read(tmp / f"{name}.wav", dtype="int16")[0].astype(int)
+            print(f"{name}: max abs diff {np.max(np.abs(ref - out))} LSB")
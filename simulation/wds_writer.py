@@ -0,0 +1,95 @@
+import io
+import json
+import os
+import tarfile
+import time
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+import soundfile as sf
+
+
+class ShardWriter:
+    """Write simulated samples into rotating WebDataset tar shards.
+
+    Each sample is stored as `{key}.noisy.{ext}`, `{key}.clean.{ext}`
+    (optionally `{key}.noise.{ext}`) and `{key}.meta.json` members, which can be
+    read with `webdataset.WebDataset` like the shards made by utils/prepare_wds.py.
+    Each worker process writes its own shards, named after the run, its host name
+    and its process ID. Shards are created exclusively, so that a name collision
+    (e.g., a reused process ID in the same run) fails instead of overwriting the
+    shard of another worker.
+    """
+
+    def __init__(self, output_dir, shard_size_mb=1000.0, run_id=None):
+        """Initialize the writer.
+
+        Args:
+            output_dir (str): directory of the tar shards
+            shard_size_mb (float): target size of each tar shard in MB
+            run_id (str): [optional] ID of the run (or job) prepended to the shard
+                names, so that shards of different runs in `output_dir` differ
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(shard_size_mb * 1024 * 1024)
+        self.prefix = f"{os.uname().nodename}-{os.getpid()}"
+        if run_id is not None:
+            self.prefix = f"{run_id}-{self.prefix}"
+        self.shard_idx = -1
+        self.tar = None
+        # make sure the last shard is closed when the worker process exits
+        Finalize(self, self.close, exitpriority=10)
+
+    @property
+    def shard_name(self):
+        return f"{self.prefix}-{self.shard_idx:04d}.tar"
+
+    def open_next(self):
+        self.close()
+        self.shard_idx += 1
+        self.tar = tarfile.open(self.output_dir / self.shard_name, "x")
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+    def add_member(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = time.time()
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def write(self, key, audios, fs, meta, audio_format="flac"):
+        """Write a sample into the current shard.
+
+        Args:
+            key (str): unique key of the sample (e.g., fileid_1)
+            audios (dict): name -> audio signal (Channel, Time), e.g., noisy/clean
+            fs (int): sampling rate in Hz
+            meta (dict): meta information stored as `{key}.meta.json`
+            audio_format (str): audio format of the audio members
+        Returns:
+            shard_name (str): name of the tar shard containing the sample
+            offset (int): byte offset of the first member of the sample in the shard
+        """
+        if self.tar is None or self.tar.offset >= self.max_bytes:
+            self.open_next()
+        offset = self.tar.offset
+        for name, audio in audios.items():
+            if audio.ndim != 1:
+                audio = audio[0] if audio.shape[0] == 1 else audio.T
+            buffer = io.BytesIO()
+            sf.write(buffer, audio, samplerate=fs, format=audio_format.upper())
+            self.add_member(f"{key}.{name}.{audio_format}", buffer.getvalue())
+        self.add_member(f"{key}.meta.json", json.dumps(meta).encode("utf-8"))
+        return self.shard_name, offset
+
+
+def write_shard_index(index, path):
+    """Write the (id, shard, offset) of all samples into a TSV file."""
+    with open(path, "w") as f:
+        f.write("id\tshard\toffset\n")
+        for uid, shard_name, offset in index:
+            f.write(f"{uid}\t{shard_name}\t{offset}\n")
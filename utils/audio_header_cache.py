@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import soundfile as sf
+from tqdm import tqdm
+
+HEADERS = ("uid", "path", "frames", "samplerate", "channels", "mtime", "size")
+
+
+def read_audio_header(audio_path):
+    """Read the header information of an audio file.
+
+    Args:
+        audio_path (str): path to the audio file
+    Returns:
+        info (dict): frames, samplerate, channels, mtime and size of the file
+    """
+    stat = os.stat(audio_path)
+    with sf.SoundFile(audio_path) as af:
+        frames, samplerate, channels = af.frames, af.samplerate, af.channels
+    if not audio_path.endswith(".wav"):
+        # Sometimes the acutal loaded audio's length differs from af.frames
+        frames = sf.read(audio_path)[0].shape[0]
+    return {
+        "frames": frames,
+        "samplerate": samplerate,
+        "channels": channels,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+class AudioHeaderCache:
+    """Persistent cache of audio headers stored as a TSV file.
+
+    Each line holds (uid, path, frames, samplerate, channels, mtime, size).
+    An entry is only re-read when the path, mtime or size of the file changed.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = Path(cache_path)
+        self.entries = {}
+        if self.cache_path.exists():
+            with open(self.cache_path, "r") as f:
+                headers = next(f).strip().split("\t")
+                for line in f:
+                    dic = dict(zip(headers, line.rstrip("\n").split("\t")))
+                    for k in ("frames", "samplerate", "channels", "mtime", "size"):
+                        dic[k] = int(dic[k])
+                    self.entries[dic.pop("uid")] = dic
+
+    def __getitem__(self, uid):
+        return self.entries[uid]
+
+    def is_valid(self, uid, audio_path):
+        if uid not in self.entries or self.entries[uid]["path"] != audio_path:
+            return False
+        try:
+            stat = os.stat(audio_path)
+        except FileNotFoundError:
+            return False
+        entry = self.entries[uid]
+        return entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    def update(self, samples, nj=8, save=True):
+        """Read the headers of new or modified files and save the cache.
+
+        Args:
+            samples (list): list of (uid, audio_path) tuples
+            nj (int): number of parallel workers for reading headers
+            save (bool): whether to save the cache file if entries were re-read
+        Returns:
+            num_updated (int): number of re-read entries
+        """
+        stale = [(uid, path) for uid, path in samples if not self.is_valid(uid, path)]
+        if len(stale) == 0:
+            return 0
+        with ProcessPoolExecutor(max_workers=nj) as executor:
+            infos = executor.map(
+                read_audio_header, [path for _, path in stale], chunksize=64
+            )
+            for (uid, path), info in tqdm(
+                zip(stale, infos), total=len(stale), desc="reading audio headers"
+            ):
+                self.entries[uid] = {"path": path, **info}
+        if save:
+            self.save()
+        return len(stale)
+
+    def save(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write("\t".join(HEADERS) + "\n")
+            for uid, entry in self.entries.items():
+                f.write("\t".join([uid] + [str(entry[k]) for k in HEADERS[1:]]) + "\n")
+        os.replace(tmp_path, self.cache_path)
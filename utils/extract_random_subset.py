@@ -2,24 +2,38 @@ import argparse
 import random
 
 import soundfile as sf
+from audio_header_cache import AudioHeaderCache
 from espnet2.utils import config_argparse
 from tqdm import tqdm
 
 
-def select_audio(scp_file, num_data):
+def select_audio(scp_file, num_data, header_cache=None, nj=8):
     # read scp file
     with open(scp_file, "r") as f:
         lines = f.readlines()
     random.shuffle(lines)
 
+    # headers are read lazily in batches (in parallel) as the selection proceeds
+    batch_size = 64 * nj
+    num_updated = 0
+
     selected_lines = []
     for i, line in enumerate(tqdm(lines)):
         utt_id, fs, audio_path = line.strip().split()
 
         # get length of audio_file
-        with sf.SoundFile(audio_path) as audio_file:
-            assert int(fs) == audio_file.samplerate, (fs, audio_file.samplerate)
-            audio_duration = len(audio_file) / audio_file.samplerate
+        if header_cache is not None:
+            if i % batch_size == 0:
+                # (uid, audio_path) of the next batch of samples
+                samples = [x.strip().split()[::2] for x in lines[i : i + batch_size]]
+                num_updated += header_cache.update(samples, nj=nj, save=False)
+            info = header_cache[utt_id]
+            assert int(fs) == info["samplerate"], (fs, info["samplerate"])
+            audio_duration = info["frames"] / info["samplerate"]
+        else:
+            with sf.SoundFile(audio_path) as audio_file:
+                assert int(fs) == audio_file.samplerate, (fs, audio_file.samplerate)
+                audio_duration = len(audio_file) / audio_file.samplerate
 
         if audio_duration < 2.0 or audio_duration > 15.0:
             continue
@@ -30,6 +44,8 @@ def select_audio(scp_file, num_data):
         if len(selected_lines) == num_data:
             break
 
+    if num_updated > 0:
+        header_cache.save()
     return selected_lines
 
 
@@ -68,6 +84,19 @@ def get_parser(parser=None):
         "--outfile", type=str, required=True, help="Path to the output json file"
     )
     group.add_argument("--seed", type=int, default=0, help="Random seed")
+    group.add_argument(
+        "--audio_header_cache",
+        type=str,
+        default=None,
+        help="Path to a persistent cache of audio lengths (TSV) shared with "
+        "simulation/generate_data_param.py",
+    )
+    group.add_argument(
+        "--nj",
+        type=int,
+        default=8,
+        help="Number of parallel workers for reading audio headers",
+    )
 
     parser.set_defaults(required=["speech_scps", "num_data_per_dataset"])
     return parser
@@ -83,9 +112,15 @@ if __name__ == "__main__":
     # ensure reproducibility
     random.seed(args.seed)
 
+    header_cache = None
+    if args.audio_header_cache is not None:
+        header_cache = AudioHeaderCache(args.audio_header_cache)
+
     selected_audios = []
     for speech_scp, num_data in zip(args.speech_scps, args.num_data_per_dataset):
-        selected_audios += select_audio(speech_scp, num_data)
+        selected_audios += select_audio(
+            speech_scp, num_data, header_cache=header_cache, nj=args.nj
+        )
 
     with open(args.outfile, "w") as f_out:
         f_out.writelines(selected_audios)